@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Prueba de escalado de conexiones del chat del problema 3.
+
+Por cada escalón levanta el servidor (servidor.py con un hilo por cliente, o
+servidor_epoll.py con un solo hilo y selectors), conecta N clientes inactivos
+que solo envían su nombre y mide: tiempo hasta que todos recibieron la
+confirmación, memoria (RSS) e hilos del servidor, y cuánto tarda un mensaje
+en llegar a los otros N-1 clientes (y a cuántos llega).
+
+    python problema3/benchmark.py --server epoll --clients 1000,5000,10000
+    python problema3/benchmark.py --server threads --clients 1000,5000
+"""
+
+import argparse
+import os
+import resource
+import selectors
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+HOST = 'localhost'
+CONFIRM = "ya estás conectado!".encode()
+SERVERS = {
+    "threads": "servidor.py",
+    "epoll": "servidor_epoll.py",
+}
+
+
+def raise_fd_limit():
+    """Sube el límite de descriptores al máximo (lo heredan los servidores hijos)."""
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def free_port():
+    """Devuelve un puerto TCP libre."""
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind, port):
+    """Lanza el servidor elegido como proceso aparte (sus logs van a /dev/null)."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), SERVERS[kind])
+    proc = subprocess.Popen([sys.executable, path, str(port)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            probe = socket.create_connection((HOST, port))
+        except OSError:
+            time.sleep(0.05)
+            continue
+        # Nombre, confirmación y cierre: el servidor lo da de baja al leer EOF
+        probe.sendall(b"probe")
+        probe.recv(1024)
+        probe.close()
+        return proc
+    proc.kill()
+    raise RuntimeError("El servidor no arrancó")
+
+
+def server_stats(pid):
+    """RSS en MB e hilos del proceso, leídos de /proc (Linux)."""
+    stats = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            stats[key] = value.split()
+    return int(stats["VmRSS"][0]) / 1024, int(stats["Threads"][0])
+
+
+class Reader(threading.Thread):
+    """
+    Hilo que vacía todos los sockets de los clientes: cuenta los bytes de cada
+    uno (para saber quién ya recibió la confirmación) y detecta la llegada del
+    mensaje de prueba aunque quede partido entre dos recv.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.sel = selectors.DefaultSelector()
+        self.received = {}   # {socket: bytes recibidos}
+        self.tail = {}       # {socket: últimos bytes, para buscar el marcador}
+        self.pending = []    # sockets nuevos a registrar desde este hilo
+        self.marker = None
+        self.reached = set()
+        self.last_data = time.monotonic()
+        self.lock = threading.Lock()
+        self.running = True
+
+    def add(self, sock):
+        sock.setblocking(False)
+        with self.lock:
+            self.pending.append(sock)
+
+    def confirmed(self):
+        return sum(1 for n in list(self.received.values()) if n >= len(CONFIRM))
+
+    def run(self):
+        while self.running:
+            with self.lock:
+                pending, self.pending = self.pending, []
+            for sock in pending:
+                self.received[sock] = 0
+                self.tail[sock] = b""
+                self.sel.register(sock, selectors.EVENT_READ)
+            if not self.received:
+                time.sleep(0.01)
+                continue
+            for key, _ in self.sel.select(timeout=0.05):
+                sock = key.fileobj
+                try:
+                    data = sock.recv(1 << 16)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    data = b""
+                if not data:
+                    self.sel.unregister(sock)
+                    continue
+                self.last_data = time.monotonic()
+                self.received[sock] += len(data)
+                if self.marker is not None:
+                    window = self.tail[sock] + data
+                    if self.marker in window:
+                        self.reached.add(sock)
+                    self.tail[sock] = window[-len(self.marker):]
+
+    def close(self):
+        self.running = False
+        self.join()
+        for sock in list(self.received) + self.pending:
+            sock.close()
+        self.sel.close()
+
+
+def run_step(kind, n, timeout):
+    """Un escalón: servidor nuevo, n clientes inactivos y un mensaje a todos."""
+    port = free_port()
+    proc = start_server(kind, port)
+    reader = Reader()
+    reader.start()
+    socks = []
+    failed = 0
+    try:
+        t0 = time.perf_counter()
+        for i in range(n):
+            try:
+                s = socket.create_connection((HOST, port), timeout=5)
+                s.sendall(f"c{i}".encode())
+            except OSError:
+                failed += 1
+                continue
+            socks.append(s)
+            reader.add(s)
+
+        deadline = time.monotonic() + timeout
+        while reader.confirmed() < len(socks) and time.monotonic() < deadline and proc.poll() is None:
+            time.sleep(0.05)
+        connect_time = time.perf_counter() - t0
+        confirmed = reader.confirmed()
+
+        # Esperar a que terminen de llegar los avisos de "se ha unido"
+        while time.monotonic() - reader.last_data < 0.5 and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+        alive = proc.poll() is None
+        rss, threads = server_stats(proc.pid) if alive else (0.0, 0)
+
+        # Un cliente habla y se mide cuánto tarda en llegar a los demás
+        fanout_ms, reached = float("nan"), 0
+        if alive and socks:
+            reader.marker = f"ping-{time.monotonic_ns()}".encode()
+            t1 = time.perf_counter()
+            socks[0].send(reader.marker)
+            target = len(socks) - 1
+            while len(reader.reached) < target and time.monotonic() < deadline + 10:
+                time.sleep(0.001)
+            fanout_ms = (time.perf_counter() - t1) * 1000
+            reached = len(reader.reached)
+        return connect_time, confirmed, failed, rss, threads, fanout_ms, reached, alive
+    finally:
+        reader.close()
+        proc.kill()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=sorted(SERVERS), default="epoll")
+    parser.add_argument("--clients", type=lambda s: [int(x) for x in s.split(",")],
+                        default=[1000, 5000, 10000], help="escalones de clientes inactivos")
+    parser.add_argument("--timeout", type=float, default=60, help="segundos máximos por escalón")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    print(f"servidor {SERVERS[args.server]}, límite de descriptores {limit}")
+    print("  clientes  conexión s  confirmados  fallidos   RSS MB   hilos  fan-out ms  entregado")
+    for n in args.clients:
+        connect_time, confirmed, failed, rss, threads, fanout_ms, reached, alive = \
+            run_step(args.server, n, args.timeout)
+        note = "" if alive else "  (el servidor terminó)"
+        print(f"  {n:8d} {connect_time:11.2f} {confirmed:12d} {failed:9d} {rss:8.1f} {threads:7d} "
+              f"{fanout_ms:11.1f} {reached:6d}/{max(n - failed - 1, 0)}{note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,29 @@ Objetivo: Crear un servidor de chat que maneje múltiples clientes simultáneame
 """
 
 import socket
+import sys
 import threading
 
 # Definir la dirección y puerto del servidor
 HOST = 'localhost'
-PORT = 9000
+PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 9000
 
 # Lista para mantener todos los sockets de clientes conectados
 clients = []
+# Protege 'clients': los hilos de cada cliente agregan, quitan y recorren la lista
+clients_lock = threading.Lock()
+
+
+def remove_client(client_socket):
+    """
+    Quita un cliente de la lista de conectados (si sigue en ella).
+
+    Args:
+        client_socket: Socket del cliente
+    """
+    with clients_lock:
+        if client_socket in clients:
+            clients.remove(client_socket)
 
 def handle_client(client_socket, client_name):
     """
@@ -29,6 +44,8 @@ def handle_client(client_socket, client_name):
             
             # Si no se reciben datos, el cliente se desconectó
             if not message:
+                remove_client(client_socket)
+                client_socket.close()
                 break
                 
             # Formatear el mensaje con el nombre del cliente
@@ -41,10 +58,9 @@ def handle_client(client_socket, client_name):
             broadcast(message, client_socket)
     
     
-        except ConnectionResetError:
+        except OSError:
             # Manejar desconexión inesperada del cliente
-            if client_socket in clients:
-                clients.remove(client_socket)
+            remove_client(client_socket)
             client_socket.close()
             break
 
@@ -56,27 +72,32 @@ def broadcast(message, sender_socket):
         message: Mensaje a enviar (string)
         sender_socket: Socket del cliente que envió el mensaje original
     """
-    for client in clients:
+    # Se recorre una copia: otros hilos pueden modificar la lista mientras se envía
+    with clients_lock:
+        targets = list(clients)
+    data = message.encode()
+    for client in targets:
         if client != sender_socket:
             # Enviar el mensaje codificado a bytes a cada cliente
             try:
-                client.send(message.encode())
-            except:
-                if client in clients:
-                    clients.remove(client)
+                client.sendall(data)
+            except OSError:
+                remove_client(client)
 
 
 # Crear un socket TCP/IP
 # AF_INET: socket de familia IPv4
 # SOCK_STREAM: socket de tipo TCP (orientado a conexión)
 server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
 # Enlazar el socket a la dirección y puerto especificados
 server.bind((HOST, PORT))
 
 # Poner el socket en modo escucha
-# El parámetro define el número máximo de conexiones en cola
-server.listen(5)
+# El parámetro define el número máximo de conexiones en cola; con 5, una ráfaga
+# de clientes desborda la cola y cada conexión descartada reintenta al segundo
+server.listen(socket.SOMAXCONN)
 
 print("Servidor a la espera de conexiones ...")
 
@@ -94,7 +115,8 @@ while True:
 
 
     # Agregar el socket del cliente a la lista de clientes conectados
-    clients.append(client)
+    with clients_lock:
+        clients.append(client)
     
     # Enviar mensaje de confirmación de conexión al cliente
     client.send("ya estás conectado!".encode())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Problema 3: Chat simple con múltiples clientes - Servidor con selectors (epoll)
+Objetivo: Atender todas las conexiones desde un solo hilo con un bucle de eventos,
+con el mismo protocolo que servidor.py (primero el nombre, después los mensajes)
+
+Uso: python servidor_epoll.py [puerto]
+"""
+
+import resource
+import selectors
+import socket
+import sys
+
+# Definir la dirección y puerto del servidor
+HOST = 'localhost'
+PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 9000
+BUFFER = 1024
+
+# Bytes pendientes de envío por cliente; si un cliente no lee y se supera,
+# se lo desconecta en lugar de acumular memoria sin límite
+MAX_PENDING = 1024 * 1024
+
+# DefaultSelector usa epoll en Linux (kqueue en BSD/macOS)
+sel = selectors.DefaultSelector()
+
+# Estado de cada conexión: {socket: {"name": str o None, "out": bytearray, "events": máscara}}
+# Solo el hilo del bucle de eventos lo toca, así que no hace falta lock
+clients = {}
+
+# Conexiones con datos nuevos en su buffer de salida; se vacían una vez por
+# vuelta del bucle, así varios mensajes seguidos salen en un solo send
+dirty = set()
+
+
+def raise_fd_limit():
+    """Sube el límite de descriptores abiertos al máximo permitido (un socket por cliente)."""
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def accept_clients(server):
+    """
+    Acepta todas las conexiones pendientes en la cola de escucha.
+
+    Args:
+        server: Socket del servidor (no bloqueante)
+    """
+    while True:
+        try:
+            client, addr = server.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            # Sin descriptores libres (EMFILE): se reintenta en la próxima vuelta
+            print(f"No se pudo aceptar: {e}")
+            return
+        client.setblocking(False)
+        clients[client] = {"name": None, "out": bytearray(), "events": selectors.EVENT_READ}
+        sel.register(client, selectors.EVENT_READ)
+        print(f"Conexión realizada por {addr}")
+
+
+def handle_read(client_socket):
+    """
+    Lee lo que haya llegado de un cliente: el primer envío es su nombre y
+    los siguientes son mensajes que se retransmiten a los demás.
+
+    Args:
+        client_socket: Socket del cliente listo para lectura
+    """
+    try:
+        message = client_socket.recv(BUFFER)
+    except (BlockingIOError, InterruptedError):
+        return
+    except OSError:
+        message = b""
+
+    # Si no se reciben datos, el cliente se desconectó
+    if not message:
+        close_client(client_socket)
+        return
+
+    state = clients[client_socket]
+    if state["name"] is None:
+        state["name"] = message.decode(errors="replace")
+        send_to(client_socket, "ya estás conectado!".encode())
+        broadcast(f"{state['name']} se ha unido al Chat.", client_socket)
+    else:
+        message = f"{state['name']}: {message.decode(errors='replace')}"
+        print(message)
+        broadcast(message, client_socket)
+
+
+def send_to(client_socket, data):
+    """
+    Agrega datos al buffer de salida de un cliente; se envían al final de la vuelta.
+
+    Args:
+        client_socket: Socket del cliente destino
+        data: Bytes a enviar
+    """
+    clients[client_socket]["out"] += data
+    dirty.add(client_socket)
+
+
+def broadcast(message, sender_socket):
+    """
+    Envía un mensaje a todos los clientes con nombre excepto al remitente.
+
+    Args:
+        message: Mensaje a enviar (string)
+        sender_socket: Socket del cliente que envió el mensaje original
+    """
+    # Se codifica una sola vez para todos los destinatarios
+    data = message.encode()
+    for client, state in clients.items():
+        if client is not sender_socket and state["name"] is not None:
+            state["out"] += data
+            dirty.add(client)
+
+
+def handle_write(client_socket):
+    """
+    Envía todo lo que acepte el kernel del buffer de salida de un cliente y
+    pide EVENT_WRITE solo mientras quede algo pendiente. El límite MAX_PENDING
+    se aplica a lo que queda después de enviar, así un cliente que va leyendo
+    no se desconecta por un pico momentáneo.
+
+    Args:
+        client_socket: Socket del cliente
+    """
+    state = clients[client_socket]
+    if state["out"]:
+        try:
+            sent = client_socket.send(state["out"])
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            close_client(client_socket)
+            return
+        del state["out"][:sent]
+
+    if len(state["out"]) > MAX_PENDING:
+        print(f"Cliente {state['name']} no lee: se desconecta")
+        close_client(client_socket)
+        return
+
+    events = selectors.EVENT_READ
+    if state["out"]:
+        events |= selectors.EVENT_WRITE
+    if events != state["events"]:
+        sel.modify(client_socket, events)
+        state["events"] = events
+
+
+def flush_dirty():
+    """Intenta enviar en el momento los buffers que recibieron datos en esta vuelta."""
+    for client in dirty:
+        if client in clients:
+            handle_write(client)
+    dirty.clear()
+
+
+def close_client(client_socket):
+    """
+    Saca a un cliente del selector y de la tabla de clientes y cierra su socket.
+
+    Args:
+        client_socket: Socket del cliente
+    """
+    if clients.pop(client_socket, None) is None:
+        return
+    sel.unregister(client_socket)
+    client_socket.close()
+
+
+def main():
+    raise_fd_limit()
+
+    # Crear un socket TCP/IP no bloqueante
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((HOST, PORT))
+    # Cola de escucha amplia: con miles de clientes llegando a la vez
+    server.listen(socket.SOMAXCONN)
+    server.setblocking(False)
+    sel.register(server, selectors.EVENT_READ)
+
+    print("Servidor a la espera de conexiones ...")
+
+    # Bucle de eventos: un solo hilo atiende accept, lecturas y escrituras
+    while True:
+        for key, mask in sel.select():
+            sock = key.fileobj
+            if sock is server:
+                accept_clients(server)
+                continue
+            if mask & selectors.EVENT_READ and sock in clients:
+                handle_read(sock)
+            if mask & selectors.EVENT_WRITE and sock in clients:
+                handle_write(sock)
+        flush_dirty()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+Benchmarks del servidor de archivos (problema5).
+Levanta `run_server` en loopback con un directorio temporal y mide throughput.
+
+Uso:
+    python problema5/benchmark.py sendfile [--size MB] [--rounds N]
+    python problema5/benchmark.py parallel [--size MB] [--conns 1,2,4,8]
+    python problema5/benchmark.py compress [--size MB] [--links 10,100,1000]
+    python problema5/benchmark.py recv [--size MB] [--mem-size MB]
+    python problema5/benchmark.py suite [--buffers 4096,65536] [--sizes 1,16] [--clients 1,8,32]
+                                        [--mode threads|asyncio] [--out resultados.json]
+    python problema5/benchmark.py compare base.json nuevo.json [--threshold 10]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import servidor
+import servidor_async
+import cliente
+
+
+# -------------------- UTILIDADES --------------------
+
+def free_port():
+    """Pide al sistema un puerto libre en loopback."""
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def start_server(base_dir, mode="threads"):
+    """
+    Arranca el servidor en un hilo daemon sobre 'base_dir' y espera a que escuche.
+    mode: "threads" (servidor.run_server) o "asyncio" (servidor_async.run_async_server).
+    """
+    servidor.BASE_DIR = base_dir
+    servidor.PORT = free_port()
+    cliente.PORT = servidor.PORT
+    if mode == "asyncio":
+        servidor_async.PORT = servidor.PORT
+        target = servidor_async.run_async_server
+    else:
+        target = servidor.run_server
+    threading.Thread(target=target, daemon=True).start()
+
+    for _ in range(100):
+        try:
+            quit_conn(socket.create_connection((servidor.HOST, servidor.PORT)))
+            return servidor.PORT
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("El servidor no arrancó")
+
+
+def make_file(path, size):
+    """Crea un archivo de 'size' bytes con contenido pseudoaleatorio."""
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            n = min(1024 * 1024, remaining)
+            f.write(os.urandom(n))
+            remaining -= n
+
+
+def quit_conn(conn):
+    """Cierra la sesión con QUIT para que el servidor no lo registre como error."""
+    conn.sendall(b"QUIT\r\n")
+    cliente.recv_line(conn)
+    conn.close()
+
+
+def drain_download(conn, remote_name):
+    """Descarga 'remote_name' descartando los bytes. Retorna el tamaño recibido."""
+    conn.sendall(f"DOWNLOAD {remote_name}\r\n".encode())
+    line = cliente.recv_line(conn)
+    if not line.startswith("OK"):
+        raise RuntimeError(line)
+    size = int(cliente.recv_line(conn).split(" ", 1)[1])
+    buf = bytearray(256 * 1024)
+    remaining = size
+    while remaining > 0:
+        n = conn.recv_into(buf, min(len(buf), remaining))
+        if not n:
+            raise ConnectionError("Conexión cerrada durante descarga")
+        remaining -= n
+    return size
+
+
+# -------------------- BENCHMARKS --------------------
+
+def bench_sendfile(args):
+    """Compara DOWNLOAD con sendfile contra el loop clásico de chunks."""
+    size = args.size * 1024 * 1024
+    with tempfile.TemporaryDirectory() as base_dir:
+        start_server(base_dir)
+        make_file(os.path.join(base_dir, "bench.bin"), size)
+
+        print(f"DOWNLOAD de {args.size} MB x {args.rounds} (BUFFER={servidor.BUFFER})")
+        for mode in (False, True):
+            servidor.USE_SENDFILE = mode
+            conn = socket.create_connection((servidor.HOST, servidor.PORT))
+            drain_download(conn, "bench.bin")  # calentar page cache
+
+            cpu0, t0 = time.process_time(), time.perf_counter()
+            for _ in range(args.rounds):
+                drain_download(conn, "bench.bin")
+            elapsed = time.perf_counter() - t0
+            cpu = time.process_time() - cpu0
+            quit_conn(conn)
+
+            mb = args.size * args.rounds
+            name = "sendfile" if mode else "loop"
+            print(f"  {name:8s} {mb / elapsed:10.1f} MB/s   CPU {cpu / mb * 1024:6.2f} s/GB")
+
+
+def timed(fn, *args):
+    """Ejecuta fn(*args) y retorna los segundos que tardó."""
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0
+
+
+def bench_parallel(args):
+    """Compara do_upload/do_download con sus versiones en N conexiones paralelas."""
+    size = args.size * 1024 * 1024
+    with tempfile.TemporaryDirectory() as base_dir, tempfile.TemporaryDirectory() as work:
+        start_server(base_dir)
+        src = os.path.join(work, "src.bin")
+        dst = os.path.join(work, "dst.bin")
+        make_file(src, size)
+        conn = socket.create_connection((servidor.HOST, servidor.PORT))
+
+        def reset(name):
+            os.remove(os.path.join(base_dir, name))
+
+        up = timed(cliente.do_upload, conn, src, "single.bin")
+        down = timed(cliente.do_download, conn, "single.bin", dst)
+        print(f"\n{args.size} MB    subida        descarga")
+        print(f"  1 stream  {args.size / up:8.1f} MB/s  {args.size / down:8.1f} MB/s  (do_upload/do_download)")
+
+        for n in args.conns:
+            up_n = timed(cliente.do_parallel_upload, conn, src, "par.bin", n)
+            down_n = timed(cliente.do_parallel_download, conn, "par.bin", dst, n)
+            reset("par.bin")
+            print(f"  {n:2d} conns  {args.size / up_n:8.1f} MB/s  {args.size / down_n:8.1f} MB/s"
+                  f"  (x{up / up_n:.2f} / x{down / down_n:.2f})")
+        quit_conn(conn)
+
+
+def make_text_file(path, size):
+    """Crea un archivo tipo CSV/log (muy compresible) de aproximadamente 'size' bytes."""
+    with open(path, "wb") as f:
+        written, i = 0, 0
+        while written < size:
+            line = f"{i},2024-01-{i % 28 + 1:02d}T12:{i % 60:02d}:00,INFO,user{i % 97},{i * 3.7:.2f}\n".encode()
+            f.write(line)
+            written += len(line)
+            i += 1
+
+
+def compress_stats(path, codec):
+    """Comprime 'path' en streaming con el codec dado. Retorna (bytes_comprimidos, segundos_cpu)."""
+    c = cliente.CODECS[codec][0]()
+    out = 0
+    cpu0 = time.process_time()
+    with open(path, "rb") as f:
+        while chunk := f.read(cliente.COMPRESS_CHUNK):
+            out += len(c.compress(chunk))
+    out += len(c.flush())
+    return out, time.process_time() - cpu0
+
+
+def bench_compress(args):
+    """
+    Estima cuándo conviene comprimir: tiempo en un enlace de L Mbit/s sin
+    comprimir (size/L) contra comprimido en streaming (máx. entre CPU de
+    compresión y bytes comprimidos/L, porque ambas etapas se solapan).
+    """
+    size = args.size * 1024 * 1024
+    with tempfile.TemporaryDirectory() as work:
+        for kind, maker in (("texto", make_text_file), ("aleatorio", make_file)):
+            path = os.path.join(work, kind)
+            maker(path, size)
+            real = os.path.getsize(path)
+            print(f"\n{kind} ({real / 1e6:.1f} MB)")
+            print("  codec  ratio   CPU s  " + "  ".join(f"{l:>6d}Mb/s" for l in args.links))
+            for codec in cliente.CODECS:
+                out, cpu = compress_stats(path, codec)
+                gains = []
+                for link in args.links:
+                    bps = link * 1e6 / 8
+                    raw_t = real / bps
+                    comp_t = max(cpu, out / bps)
+                    gains.append(f"{raw_t / comp_t:9.2f}x")
+                print(f"  {codec:5s} {real / out:6.1f}  {cpu:6.2f}   " + "  ".join(gains))
+
+
+# -------------------- RECEPCIÓN EN EL CLIENTE --------------------
+
+def legacy_read_memory(conn, size, path):
+    """Lectura anterior a recv_into: concatena bytes (copia cuadrática)."""
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(min(cliente.BUFFER, size - len(data)))
+        if not chunk:
+            raise ConnectionError("Conexión cerrada")
+        data += chunk
+    return data
+
+
+def legacy_read_file(conn, size, path):
+    """Lectura anterior a recv_into: un objeto bytes nuevo por cada recv de BUFFER."""
+    remaining = size
+    with open(path, "wb") as f:
+        while remaining > 0:
+            chunk = conn.recv(min(cliente.BUFFER, remaining))
+            if not chunk:
+                raise ConnectionError("Conexión cerrada")
+            f.write(chunk)
+            remaining -= len(chunk)
+
+
+def engine_read(use_mmap, to_file):
+    """read_exact del cliente con el motor indicado."""
+    def read(conn, size, path):
+        cliente.USE_MMAP = use_mmap
+        return cliente.read_exact(conn, size, path if to_file else None)
+    return read
+
+
+def measure_recv(reader, size, path, trace):
+    """Envía 'size' bytes por un socketpair y retorna (segundos, pico de memoria trazada)."""
+    a, b = socket.socketpair()
+    payload = memoryview(bytes(size))
+    sender = threading.Thread(target=a.sendall, args=(payload,), daemon=True)
+    if trace:
+        tracemalloc.start()
+    sender.start()
+    t0 = time.perf_counter()
+    reader(b, size, path)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1] if trace else 0
+    if trace:
+        tracemalloc.stop()
+    sender.join()
+    a.close()
+    b.close()
+    return elapsed, peak
+
+
+def bench_recv(args):
+    """
+    Compara los caminos de recepción del cliente sobre un socketpair (sin
+    servidor): la concatenación de bytes y el recv+write anteriores contra
+    recv_into en un bytearray preasignado o en el archivo mapeado con mmap.
+    El pico de memoria se mide con tracemalloc en una segunda pasada.
+    """
+    cases = [
+        ("memoria", "bytes +=", legacy_read_memory, args.mem_size),
+        ("memoria", "recv_into", engine_read(True, False), args.mem_size),
+        ("archivo", "recv+write", legacy_read_file, args.size),
+        ("archivo", "bytearray", engine_read(False, True), args.size),
+        ("archivo", "mmap", engine_read(True, True), args.size),
+    ]
+    use_mmap = cliente.USE_MMAP
+    with tempfile.TemporaryDirectory() as work:
+        path = os.path.join(work, "out.bin")
+        print("  destino  motor        MB    MB/s   pico KB")
+        for dest, name, reader, mb in cases:
+            size = int(mb * 1024 * 1024)
+            elapsed, _ = measure_recv(reader, size, path, trace=False)
+            _, peak = measure_recv(reader, size, path, trace=True)
+            print(f"  {dest:8s} {name:10s} {mb:5g} {mb / elapsed:8.1f} {peak / 1024:9.0f}")
+    cliente.USE_MMAP = use_mmap
+
+
+# -------------------- SUITE DE THROUGHPUT --------------------
+
+class TimedConn:
+    """Envuelve un socket y registra el primer envío y el primer byte recibido (TTFB)."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.t_send = None
+        self.t_first = None
+
+    def _mark(self):
+        if self.t_first is None:
+            self.t_first = time.perf_counter()
+
+    def sendall(self, data):
+        if self.t_send is None:
+            self.t_send = time.perf_counter()
+        return self.sock.sendall(data)
+
+    def sendfile(self, f, offset=0, count=None):
+        return self.sock.sendfile(f, offset, count)
+
+    def recv(self, n):
+        data = self.sock.recv(n)
+        self._mark()
+        return data
+
+    def recv_into(self, buf, nbytes=0):
+        n = self.sock.recv_into(buf, nbytes)
+        self._mark()
+        return n
+
+    def close(self):
+        self.sock.close()
+
+    @property
+    def ttfb(self):
+        return self.t_first - self.t_send
+
+
+def server_process(base_dir, port, mode, buffer, pipe):
+    """Proceso hijo: corre el servidor y responde su tiempo de CPU cuando se le pide."""
+    sys.stdout = open(os.devnull, "w")
+    servidor.BASE_DIR = base_dir
+    servidor.PORT = servidor_async.PORT = port
+    servidor.BUFFER = buffer
+    target = servidor_async.run_async_server if mode == "asyncio" else servidor.run_server
+    threading.Thread(target=target, daemon=True).start()
+    while pipe.recv() == "cpu":
+        pipe.send(time.process_time())
+
+
+def percentile(values, p):
+    """Percentil por rango más cercano (values no vacío)."""
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[k]
+
+
+def run_sessions(op, src, clients, tag):
+    """Lanza 'clients' sesiones concurrentes de do_upload/do_download. Retorna (segundos, ttfbs)."""
+    ttfbs = []
+    errors = []
+
+    def session(i):
+        try:
+            conn = TimedConn(socket.create_connection((cliente.HOST, cliente.PORT)))
+            if op == "upload":
+                cliente.do_upload(conn, src, f"{tag}-{i}.bin")
+            else:
+                cliente.do_download(conn, "bench.bin", os.devnull)
+            ttfbs.append(conn.ttfb)
+            quit_conn(conn)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(clients)]
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    elapsed = time.perf_counter() - t0
+    if errors:
+        raise RuntimeError(f"{len(errors)} sesiones fallaron: {errors[0]}")
+    return elapsed, ttfbs
+
+
+def git_commit():
+    """Commit actual del repositorio (o None fuera de git)."""
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench_suite(args):
+    """Matriz BUFFER x tamaño x clientes para UPLOAD y DOWNLOAD; guarda JSON."""
+    results = []
+    for buffer in args.buffers:
+        with tempfile.TemporaryDirectory() as base_dir, tempfile.TemporaryDirectory() as work:
+            port = free_port()
+            parent, child = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=server_process,
+                                           args=(base_dir, port, args.mode, buffer, child), daemon=True)
+            proc.start()
+            cliente.PORT = port
+            for _ in range(100):
+                try:
+                    quit_conn(socket.create_connection((cliente.HOST, port)))
+                    break
+                except OSError:
+                    time.sleep(0.05)
+
+            for size_mb in args.sizes:
+                size = int(size_mb * 1024 * 1024)
+                src = os.path.join(work, "src.bin")
+                make_file(src, size)
+                make_file(os.path.join(base_dir, "bench.bin"), size)
+                servidor_cpu = lambda: (parent.send("cpu"), parent.recv())[1]
+
+                for clients in args.clients:
+                    for op in ("upload", "download"):
+                        cpu0 = servidor_cpu()
+                        elapsed, ttfbs = run_sessions(op, src, clients, f"up-{size_mb}-{clients}")
+                        cpu = servidor_cpu() - cpu0
+                        gb = size * clients / 1024 ** 3
+                        row = {
+                            "op": op, "mode": args.mode, "buffer": buffer,
+                            "size_mb": size_mb, "clients": clients,
+                            "mb_s": round(size * clients / 1024 ** 2 / elapsed, 2),
+                            "ttfb_p50_ms": round(percentile(ttfbs, 50) * 1000, 3),
+                            "ttfb_p99_ms": round(percentile(ttfbs, 99) * 1000, 3),
+                            "server_cpu_s_per_gb": round(cpu / gb, 3),
+                        }
+                        results.append(row)
+                        print(f"{op:8s} buf={buffer:<6d} {size_mb:>6g}MB x{clients:<4d} "
+                              f"{row['mb_s']:9.1f} MB/s  ttfb p50={row['ttfb_p50_ms']:.2f}ms "
+                              f"p99={row['ttfb_p99_ms']:.2f}ms  cpu={row['server_cpu_s_per_gb']:.2f}s/GB")
+
+                for name in os.listdir(base_dir):
+                    if name.startswith("up-"):
+                        os.remove(os.path.join(base_dir, name))
+
+            parent.send("stop")
+            proc.join(5)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados guardados en {args.out}")
+
+
+def bench_compare(args):
+    """Compara dos reportes de 'suite' y marca las caídas de MB/s mayores a --threshold %."""
+    def load(path):
+        with open(path) as f:
+            report = json.load(f)
+        key = lambda r: (r["op"], r["mode"], r["buffer"], r["size_mb"], r["clients"])
+        return report, {key(r): r for r in report["results"]}
+
+    base, base_rows = load(args.base)
+    new, new_rows = load(args.new)
+    print(f"{base.get('commit')} -> {new.get('commit')}")
+    regressions = 0
+    for key in sorted(base_rows.keys() & new_rows.keys()):
+        old_mb, new_mb = base_rows[key]["mb_s"], new_rows[key]["mb_s"]
+        delta = (new_mb - old_mb) / old_mb * 100 if old_mb else 0.0
+        mark = "  REGRESION" if delta < -args.threshold else ""
+        regressions += bool(mark)
+        op, mode, buffer, size_mb, clients = key
+        print(f"{op:8s} {mode:7s} buf={buffer:<6d} {size_mb:>6g}MB x{clients:<4d} "
+              f"{old_mb:9.1f} -> {new_mb:9.1f} MB/s ({delta:+.1f}%){mark}")
+    sys.exit(1 if regressions else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("sendfile", help="sendfile vs loop de chunks en DOWNLOAD")
+    p.add_argument("--size", type=int, default=256, help="tamaño del archivo en MB")
+    p.add_argument("--rounds", type=int, default=5)
+    p.set_defaults(func=bench_sendfile)
+
+    p = sub.add_parser("parallel", help="1 stream vs N conexiones paralelas")
+    p.add_argument("--size", type=int, default=256, help="tamaño del archivo en MB")
+    p.add_argument("--conns", type=lambda v: [int(x) for x in v.split(",")], default=[2, 4, 8])
+    p.set_defaults(func=bench_parallel)
+
+    p = sub.add_parser("compress", help="cuándo paga la compresión según la velocidad del enlace")
+    p.add_argument("--size", type=int, default=64, help="tamaño del archivo en MB")
+    p.add_argument("--links", type=lambda v: [int(x) for x in v.split(",")], default=[10, 100, 1000])
+    p.set_defaults(func=bench_compress)
+
+    p = sub.add_parser("recv", help="recv_into/mmap vs lecturas con copias en el cliente")
+    p.add_argument("--size", type=float, default=256, help="MB recibidos a archivo")
+    p.add_argument("--mem-size", type=float, default=4,
+                   help="MB recibidos en memoria (la concatenación es cuadrática)")
+    p.set_defaults(func=bench_recv)
+
+    ints = lambda v: [int(x) for x in v.split(",")]
+    p = sub.add_parser("suite", help="matriz BUFFER x tamaño x clientes con salida JSON")
+    p.add_argument("--buffers", type=ints, default=[4096, 65536])
+    p.add_argument("--sizes", type=lambda v: [float(x) for x in v.split(",")], default=[1, 16],
+                   help="tamaños de archivo en MB")
+    p.add_argument("--clients", type=ints, default=[1, 8, 32])
+    p.add_argument("--mode", choices=["threads", "asyncio"], default="threads")
+    p.add_argument("--out", default="bench_results.json")
+    p.set_defaults(func=bench_suite)
+
+    p = sub.add_parser("compare", help="compara dos JSON de 'suite'")
+    p.add_argument("base")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=10.0, help="caída de MB/s (%%) considerada regresión")
+    p.set_defaults(func=bench_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,37 @@ Cliente interactivo para probar LIST / UPLOAD / DOWNLOAD / QUIT
 import socket
 import hashlib
 import os
+import sys
+import threading
+import zlib
+import lzma
+import mmap
 
 HOST = "localhost"
 PORT = 9200
 BUFFER = 4096
 
+# Descargas: recv_into directo al destino, de a RECV_CHUNK bytes por llamada.
+# Por defecto se reutiliza un único bytearray y se escribe desde él; con
+# USE_MMAP el archivo local se mapea y recv_into escribe en el page cache
+# (en disco local no resultó más rápido: ver "benchmark.py recv").
+RECV_CHUNK = 256 * 1024
+USE_MMAP = False
+
+# Número de conexiones para PUPLOAD / PDOWNLOAD
+PARALLEL = 4
+
+# Bytes nuevos que se acumulan antes de enviarlos en un DATA (SYNC)
+DELTA_LITERAL = 64 * 1024
+
+# Compresión opcional (flag ZLIB / LZMA en UPLOAD y DOWNLOAD)
+COMPRESS_LEVEL = 6
+COMPRESS_CHUNK = 64 * 1024
+CODECS = {
+    "ZLIB": (lambda: zlib.compressobj(COMPRESS_LEVEL), zlib.decompressobj),
+    "LZMA": (lambda: lzma.LZMACompressor(preset=COMPRESS_LEVEL), lzma.LZMADecompressor),
+}
+
 
 # -------------------- FUNCIONES AUXILIARES --------------------
 
@@ -35,33 +61,117 @@ def recv_line(conn):
             return data[:-2].decode("utf-8", errors="replace")
 
 
-def read_exact(conn, size, out_path=None):
-    """Lee exactamente 'size' bytes del servidor y opcionalmente los guarda en un archivo."""
-    remaining = size
-    if out_path:
-        with open(out_path, "wb") as f:
-            while remaining > 0:
-                chunk = conn.recv(min(BUFFER, remaining))
-                if not chunk:
-                    raise ConnectionError("Conexión cerrada durante descarga")
-                f.write(chunk)
-                remaining -= len(chunk)
-    else:
-        data = b""
+def recv_into_view(conn, view):
+    """Llena 'view' (memoryview) con recv_into. Retorna los bytes recibidos (menos si se cerró)."""
+    got = 0
+    total = len(view)
+    while got < total:
+        n = conn.recv_into(view[got:got + RECV_CHUNK])
+        if not n:
+            break
+        got += n
+    return got
+
+
+def recv_to_file(conn, f, offset, size):
+    """
+    Recibe 'size' bytes y los escribe en 'f' (abierto en r+b/w+b) desde 'offset'
+    sin crear un objeto bytes por chunk. Si la conexión se corta, el archivo
+    queda truncado a lo recibido para poder retomarlo.
+    """
+    if size == 0:
+        return
+    end = offset + size
+    if not USE_MMAP:
+        buf = bytearray(min(RECV_CHUNK, size))
+        view = memoryview(buf)
+        f.seek(offset)
+        remaining = size
         while remaining > 0:
-            chunk = conn.recv(min(BUFFER, remaining))
-            if not chunk:
-                raise ConnectionError("Conexión cerrada durante lectura")
-            data += chunk
-            remaining -= len(chunk)
-        return data
+            n = conn.recv_into(view, min(len(buf), remaining))
+            if not n:
+                raise ConnectionError("Conexión cerrada durante descarga")
+            f.write(view[:n])
+            remaining -= n
+        return
+
+    old_size = os.fstat(f.fileno()).st_size
+    if old_size < end:
+        f.truncate(end)
+    # mmap exige un offset alineado a ALLOCATIONGRANULARITY
+    start = offset - offset % mmap.ALLOCATIONGRANULARITY
+    with mmap.mmap(f.fileno(), end - start, offset=start) as m:
+        with memoryview(m) as view:
+            got = recv_into_view(conn, view[offset - start:])
+    if got < size:
+        if old_size < end:
+            f.truncate(max(old_size, offset + got))
+        raise ConnectionError("Conexión cerrada durante descarga")
+
+
+def read_exact(conn, size, out_path=None, mode="wb"):
+    """
+    Lee exactamente 'size' bytes del servidor. Con 'out_path' los guarda en el
+    archivo ("ab" agrega al final); si no, los retorna en un bytearray preasignado.
+    """
+    if out_path:
+        append = mode == "ab" and os.path.exists(out_path)
+        with open(out_path, "r+b" if append else "w+b") as f:
+            recv_to_file(conn, f, os.fstat(f.fileno()).st_size, size)
+        return
+
+    data = bytearray(size)
+    with memoryview(data) as view:
+        if recv_into_view(conn, view) < size:
+            raise ConnectionError("Conexión cerrada durante lectura")
+    return data
+
+
+def send_frame(conn, data):
+    """Envía un frame "<len>\r\n<bytes>" (los vacíos se omiten)."""
+    if data:
+        conn.sendall(f"{len(data)}\r\n".encode() + data)
+
+
+def send_compressed(conn, f, codec):
+    """Envía el resto de 'f' como frames comprimidos terminados en "0\r\n"."""
+    c = CODECS[codec][0]()
+    while chunk := f.read(COMPRESS_CHUNK):
+        send_frame(conn, c.compress(chunk))
+    send_frame(conn, c.flush())
+    conn.sendall(b"0\r\n")
+
+
+def recv_decompressed(conn, codec):
+    """Genera el contenido descomprimido de un stream de frames comprimidos."""
+    d = CODECS[codec][1]()
+    while True:
+        n = int(recv_line(conn))
+        if n == 0:
+            break
+        data = read_exact(conn, n)
+        while True:
+            out = d.decompress(data, COMPRESS_CHUNK)
+            if isinstance(d, lzma.LZMADecompressor):
+                data = b""
+                more = not d.needs_input and not d.eof
+            else:
+                data = d.unconsumed_tail
+                more = bool(data)
+            if out:
+                yield out
+            if not more:
+                break
+    if not d.eof:
+        raise ConnectionError("Stream comprimido incompleto")
 
 
 # -------------------- COMANDOS --------------------
 
-def do_list(conn):
-    """Pide la lista de archivos al servidor."""
-    conn.sendall(b"LIST\r\n")
+def do_list(conn, offset=None, limit=None, prefix=None):
+    """Pide la lista de archivos al servidor (opcionalmente paginada y filtrada por prefijo)."""
+    args = [str(a) for a in (offset, limit, prefix) if a is not None]
+    conn.sendall((" ".join(["LIST"] + args) + "\r\n").encode())
     line = recv_line(conn)
     print("Servidor:", line)
 
@@ -77,8 +187,13 @@ def do_list(conn):
             print(" -", fname)
 
 
-def do_upload(conn, local_path, remote_name=None):
-    """Sube un archivo al servidor."""
+def do_upload(conn, local_path, remote_name=None, resume=False, compress=None):
+    """
+    Sube un archivo al servidor.
+    Con resume=True retoma una subida interrumpida desde donde quedó el .tmp del servidor.
+    Con compress="ZLIB"/"LZMA" los bytes viajan comprimidos; si el servidor no
+    soporta el codec (ERR 415) se reintenta sin compresión.
+    """
     if not os.path.exists(local_path):
         print("Archivo local no existe")
         return
@@ -90,34 +205,104 @@ def do_upload(conn, local_path, remote_name=None):
     sha = sha256_of_file(local_path)
 
     # Enviar encabezado
-    header = f"UPLOAD {remote_name} {size} {sha}\r\n"
-    conn.sendall(header.encode())
-
-    # Esperar confirmación
+    header = f"UPLOAD {remote_name} {size} {sha}"
+    if resume:
+        header += " CONTINUE"
+    if compress:
+        header += f" {compress}"
+    conn.sendall((header + "\r\n").encode())
+
+    # Esperar confirmación ("OK" u "OK <offset>" si se retoma).
+    # "EXISTS" indica que el servidor ya tenía el contenido y no hay que enviar nada.
     line = recv_line(conn)
+    if compress and line.startswith("ERR 415"):
+        print(f"Servidor no soporta {compress}, se envía sin compresión")
+        return do_upload(conn, local_path, remote_name, resume)
     if not line.startswith("OK"):
         print("Servidor:", line)
         return
+    offset = int(line.split()[1]) if resume else 0
+    if offset:
+        print(f"Retomando desde el byte {offset}")
 
-    # Enviar el archivo en chunks
+    # Enviar el archivo en chunks (o en frames comprimidos)
     with open(local_path, "rb") as f:
-        while chunk := f.read(BUFFER):
-            conn.sendall(chunk)
+        f.seek(offset)
+        if compress:
+            send_compressed(conn, f, compress)
+        else:
+            while chunk := f.read(BUFFER):
+                conn.sendall(chunk)
 
     # Leer confirmación final
     final = recv_line(conn)
     print("Servidor:", final)
 
 
-def do_download(conn, remote_name, local_path=None):
-    """Descarga un archivo del servidor."""
+def do_upload_stream(conn, source, remote_name, size=None, compress=None):
+    """
+    Sube en una sola pasada lo que se lee de 'source' (archivo abierto o pipe):
+    calcula el sha256 mientras envía y lo manda al final ("SHA256 <hex>").
+    Si no se conoce el tamaño (size=None) se anuncia "*" y los datos van en frames.
+    """
+    header = f"UPLOAD {remote_name} {'*' if size is None else size} -"
+    if compress:
+        header += f" {compress}"
+    conn.sendall((header + "\r\n").encode())
+
+    line = recv_line(conn)
+    if compress and line.startswith("ERR 415"):
+        print(f"Servidor no soporta {compress}, se envía sin compresión")
+        return do_upload_stream(conn, source, remote_name, size)
+    if not line.startswith("OK"):
+        print("Servidor:", line)
+        return
+
+    h = hashlib.sha256()
+    c = CODECS[compress][0]() if compress else None
+    while chunk := source.read(COMPRESS_CHUNK if c or size is None else BUFFER):
+        h.update(chunk)
+        if c:
+            send_frame(conn, c.compress(chunk))
+        elif size is None:
+            send_frame(conn, chunk)
+        else:
+            conn.sendall(chunk)
+    if c:
+        send_frame(conn, c.flush())
+    if c or size is None:
+        conn.sendall(b"0\r\n")
+    conn.sendall(f"SHA256 {h.hexdigest()}\r\n".encode())
+
+    print("Servidor:", recv_line(conn))
+
+
+def do_download(conn, remote_name, local_path=None, offset=0, length=None, resume=False, compress=None):
+    """
+    Descarga un archivo (o el rango [offset, offset+length)) del servidor.
+    Con resume=True continúa una descarga parcial desde el tamaño del archivo local.
+    Con compress="ZLIB"/"LZMA" se reciben frames comprimidos y se verifica el
+    sha256 del contenido descomprimido que envía el servidor al final.
+    """
     if not local_path:
         local_path = remote_name
 
-    header = f"DOWNLOAD {remote_name}\r\n"
-    conn.sendall(header.encode())
+    if resume and os.path.exists(local_path):
+        offset = os.path.getsize(local_path)
+
+    header = f"DOWNLOAD {remote_name}"
+    if offset or length is not None:
+        header += f" {offset}"
+    if length is not None:
+        header += f" {length}"
+    if compress:
+        header += f" {compress}"
+    conn.sendall((header + "\r\n").encode())
 
     line = recv_line(conn)
+    if compress and line.startswith("ERR 415"):
+        print(f"Servidor no soporta {compress}, se descarga sin compresión")
+        return do_download(conn, remote_name, local_path, offset, length, resume)
     if not line.startswith("OK"):
         print("Servidor:", line)
         return
@@ -126,43 +311,383 @@ def do_download(conn, remote_name, local_path=None):
     _, size_s = size_line.split(" ", 1)
     size = int(size_s)
 
-    read_exact(conn, size, out_path=local_path)
-    print(f"Descargado en {local_path} ({size} bytes)")
+    if not compress:
+        read_exact(conn, size, out_path=local_path, mode="ab" if resume else "wb")
+        print(f"Descargado en {local_path} ({size} bytes desde {offset})")
+        return
+
+    h = hashlib.sha256()
+    received = 0
+    with open(local_path, "ab" if resume else "wb") as f:
+        for chunk in recv_decompressed(conn, compress):
+            f.write(chunk)
+            h.update(chunk)
+            received += len(chunk)
+    _, sha = recv_line(conn).split(" ", 1)
+    if received != size or h.hexdigest() != sha:
+        print("Error: el contenido descargado no coincide con el sha256 del servidor")
+        return
+    print(f"Descargado en {local_path} ({size} bytes desde {offset}, {compress})")
+
+
+def do_delete(conn, remote_name):
+    """Borra un archivo del servidor."""
+    conn.sendall(f"DELETE {remote_name}\r\n".encode())
+    print("Servidor:", recv_line(conn))
+
+
+def do_stats(conn):
+    """Muestra el uso de ancho de banda y las transferencias activas del servidor."""
+    conn.sendall(b"STATS\r\n")
+    line = recv_line(conn)
+    print("Servidor:", line)
+    if line.startswith("OK"):
+        for _ in range(int(line.split()[1])):
+            print(" -", recv_line(conn))
+
+
+def do_stat(conn, remote_name):
+    """Pregunta el tamaño de un archivo remoto (STAT). Retorna None si no existe."""
+    conn.sendall(f"STAT {remote_name}\r\n".encode())
+    line = recv_line(conn)
+    if not line.startswith("OK"):
+        print("Servidor:", line)
+        return None
+    return int(line.split()[1])
+
+
+# -------------------- SUBIDA DELTA (estilo rsync) --------------------
+
+def roll_adler32(weak, out_byte, in_byte, block):
+    """Desplaza un byte la ventana de un adler32: quita 'out_byte' y agrega 'in_byte'."""
+    a = weak & 0xFFFF
+    b = weak >> 16
+    a = (a - out_byte + in_byte) % 65521
+    b = (b - block * out_byte + a - 1) % 65521
+    return (b << 16) | a
+
+
+def do_delta_upload(conn, local_path, remote_name=None):
+    """
+    Actualiza un archivo remoto enviando solo lo que cambió (DELTA).
+    El servidor manda una firma por bloque; aquí se recorre el archivo local con
+    un adler32 rodante buscando esos bloques en cualquier posición. Los bloques
+    encontrados viajan como COPY y el resto como DATA. Si el servidor no tiene
+    una versión previa se hace un UPLOAD normal.
+    """
+    if not os.path.exists(local_path):
+        print("Archivo local no existe")
+        return
+
+    if not remote_name:
+        remote_name = os.path.basename(local_path)
+
+    size = os.path.getsize(local_path)
+    sha = sha256_of_file(local_path)
+    conn.sendall(f"DELTA {remote_name} {size} {sha}\r\n".encode())
+
+    line = recv_line(conn)
+    if line.startswith("ERR 404"):
+        print("El servidor no tiene version previa, se sube completo")
+        return do_upload(conn, local_path, remote_name)
+    if not line.startswith("OK"):
+        print("Servidor:", line)
+        return
+
+    _, block_s, n_s, old_size_s = line.split()
+    block, n, old_size = int(block_s), int(n_s), int(old_size_s)
+    # El servidor no envía nada más hasta el END, así que leer con buffer es seguro
+    table = {}
+    with conn.makefile("rb") as r:
+        for i in range(n):
+            weak, strong = r.readline().split()
+            table.setdefault(int(weak), []).append((i, strong.decode()))
+    tail = old_size - (n - 1) * block if n else 0
+
+    out = []
+    copy = None          # [primer bloque, cantidad] pendiente de enviar
+    literal = 0
+
+    def flush_copy():
+        nonlocal copy
+        if copy:
+            out.append(f"COPY {copy[0]} {copy[1]}\r\n".encode())
+            copy = None
+
+    def emit_data(data):
+        nonlocal literal
+        if data:
+            flush_copy()
+            out.append(f"DATA {len(data)}\r\n".encode())
+            out.append(data)
+            literal += len(data)
+        if sum(map(len, out)) >= DELTA_LITERAL:
+            conn.sendall(b"".join(out))
+            out.clear()
+
+    def emit_copy(i):
+        nonlocal copy
+        if copy and copy[0] + copy[1] == i:
+            copy[1] += 1
+        else:
+            flush_copy()
+            copy = [i, 1]
+
+    def match(data, pos, w, weak):
+        strong = None
+        for i, s in table.get(weak, ()):
+            if (tail if i == n - 1 else block) != w:
+                continue
+            if strong is None:
+                strong = hashlib.blake2b(data[pos:pos + w], digest_size=16).hexdigest()
+            if s == strong:
+                return i
+        return None
+
+    with open(local_path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        try:
+            start = pos = 0
+            weak = None
+            while pos + block <= size:
+                if weak is None:
+                    weak = zlib.adler32(data[pos:pos + block])
+                i = match(data, pos, block, weak)
+                if i is not None:
+                    emit_data(data[start:pos])
+                    emit_copy(i)
+                    pos += block
+                    start = pos
+                    weak = None
+                    continue
+                if pos + block < size:
+                    weak = roll_adler32(weak, data[pos], data[pos + block], block)
+                pos += 1
+                if pos - start >= DELTA_LITERAL:
+                    emit_data(data[start:pos])
+                    start = pos
+
+            # El último bloque del servidor puede ser más corto que 'block'
+            tail_pos = size - tail
+            if n and 0 < tail < block and tail_pos >= start and \
+                    match(data, tail_pos, tail, zlib.adler32(data[tail_pos:size])) == n - 1:
+                emit_data(data[start:tail_pos])
+                emit_copy(n - 1)
+                start = size
+            emit_data(data[start:size])
+        finally:
+            if size:
+                data.close()
+
+    flush_copy()
+    out.append(b"END\r\n")
+    conn.sendall(b"".join(out))
+    print("Servidor:", recv_line(conn))
+    print(f"DELTA: {literal} de {size} bytes enviados")
+
+
+# -------------------- TRANSFERENCIAS EN PARALELO --------------------
+
+def split_ranges(size, n):
+    """Divide [0, size) en hasta n rangos contiguos (offset, length)."""
+    if size == 0:
+        return [(0, 0)]
+    n = max(1, min(n, size))
+    step = -(-size // n)
+    return [(off, min(step, size - off)) for off in range(0, size, step)]
+
+
+def run_parallel(worker, ranges):
+    """Ejecuta worker(offset, length) en un hilo por rango. Retorna la lista de errores."""
+    errors = []
+
+    def target(offset, length):
+        try:
+            worker(offset, length)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=target, args=r) for r in ranges]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+def upload_part(local_path, remote_name, size, offset, length):
+    """Sube un rango del archivo local por una conexión propia."""
+    with socket.create_connection((HOST, PORT)) as conn:
+        conn.sendall(f"UPLOADPART {remote_name} {size} {offset} {length}\r\n".encode())
+        line = recv_line(conn)
+        if not line.startswith("OK"):
+            raise RuntimeError(line)
+        with open(local_path, "rb") as f:
+            if length:
+                conn.sendfile(f, offset, length)
+        line = recv_line(conn)
+        if not line.startswith("OK"):
+            raise RuntimeError(line)
+        conn.sendall(b"QUIT\r\n")
+        recv_line(conn)
+
+
+def download_part(remote_name, local_path, offset, length):
+    """Descarga un rango del archivo remoto y lo escribe en su posición del archivo local."""
+    with socket.create_connection((HOST, PORT)) as conn:
+        conn.sendall(f"DOWNLOAD {remote_name} {offset} {length}\r\n".encode())
+        line = recv_line(conn)
+        if not line.startswith("OK"):
+            raise RuntimeError(line)
+        count = int(recv_line(conn).split(" ", 1)[1])
+        with open(local_path, "r+b") as f:
+            recv_to_file(conn, f, offset, count)
+        conn.sendall(b"QUIT\r\n")
+        recv_line(conn)
+
+
+def do_parallel_upload(conn, local_path, remote_name=None, n=PARALLEL):
+    """Sube un archivo en n rangos por conexiones paralelas y cierra con COMMIT."""
+    if not os.path.exists(local_path):
+        print("Archivo local no existe")
+        return
+
+    if not remote_name:
+        remote_name = os.path.basename(local_path)
+
+    size = os.path.getsize(local_path)
+    sha = sha256_of_file(local_path)
+
+    errors = run_parallel(lambda off, length: upload_part(local_path, remote_name, size, off, length),
+                          split_ranges(size, n))
+    if errors:
+        print("Error subiendo partes:", errors[0])
+        return
+
+    conn.sendall(f"COMMIT {remote_name} {size} {sha}\r\n".encode())
+    print("Servidor:", recv_line(conn))
+
+
+def do_parallel_download(conn, remote_name, local_path=None, n=PARALLEL):
+    """Descarga un archivo en n rangos por conexiones paralelas."""
+    if not local_path:
+        local_path = remote_name
+
+    size = do_stat(conn, remote_name)
+    if size is None:
+        return
+
+    # Preasignar el archivo local para que cada hilo escriba en su posición
+    with open(local_path, "wb") as f:
+        f.truncate(size)
+
+    errors = run_parallel(lambda off, length: download_part(remote_name, local_path, off, length),
+                          split_ranges(size, n))
+    if errors:
+        print("Error descargando partes:", errors[0])
+        return
+    print(f"Descargado en {local_path} ({size} bytes, {n} conexiones)")
 
 
 # -------------------- CLIENTE INTERACTIVO --------------------
 
+def read_command():
+    """
+    Lee un comando de stdin con el mismo lector binario que usa 'STREAM -':
+    input() lee por adelantado en su propio buffer y esos bytes se perderían.
+    Devuelve None al llegar al fin de la entrada.
+    """
+    print("> ", end="", flush=True)
+    line = sys.stdin.buffer.readline()
+    if not line:
+        return None
+    return line.decode(errors="replace").strip()
+
+
 def interactive():
     """Loop interactivo del cliente."""
     print(f"Conectando a {HOST}:{PORT} ...")
     conn = socket.create_connection((HOST, PORT))
     try:
         while True:
-            cmd = input("> ").strip()
+            cmd = read_command()
+            if cmd is None:
+                # Fin de la entrada (pipe o Ctrl-D): se cierra la sesión como con QUIT
+                cmd = "QUIT"
             if not cmd:
                 continue
             parts = cmd.split()
             c = parts[0].upper()
 
+            # Flags de compresión opcionales en cualquier posición (UPLOAD/DOWNLOAD)
+            codecs = [p.upper() for p in parts[1:] if p.upper() in CODECS]
+            parts = [p for p in parts if p.upper() not in CODECS]
+            compress = codecs[0] if codecs else None
+
             if c == "QUIT":
                 conn.sendall(b"QUIT\r\n")
                 print(recv_line(conn))
                 break
             elif c == "LIST":
-                do_list(conn)
+                do_list(conn, *parts[1:4])
             elif c == "UPLOAD":
                 if len(parts) < 2:
-                    print("Uso: UPLOAD <local_path> [remote_name]")
+                    print("Uso: UPLOAD <local_path> [remote_name] [ZLIB|LZMA]")
                 else:
-                    do_upload(conn, parts[1], parts[2] if len(parts) > 2 else None)
+                    do_upload(conn, parts[1], parts[2] if len(parts) > 2 else None, compress=compress)
             elif c == "DOWNLOAD":
                 if len(parts) < 2:
-                    print("Uso: DOWNLOAD <remote_name> [local_path]")
+                    print("Uso: DOWNLOAD <remote_name> [local_path] [ZLIB|LZMA]")
+                else:
+                    do_download(conn, parts[1], parts[2] if len(parts) > 2 else None, compress=compress)
+            elif c == "CONTINUE":
+                if len(parts) < 2:
+                    print("Uso: CONTINUE <local_path> [remote_name]")
+                else:
+                    do_upload(conn, parts[1], parts[2] if len(parts) > 2 else None, resume=True)
+            elif c == "RESUME":
+                if len(parts) < 2:
+                    print("Uso: RESUME <remote_name> [local_path]")
+                else:
+                    do_download(conn, parts[1], parts[2] if len(parts) > 2 else None, resume=True)
+            elif c == "STREAM":
+                if len(parts) < 2 or (parts[1] == "-" and len(parts) < 3):
+                    print("Uso: STREAM <local_path|-> [remote_name] [ZLIB|LZMA]  ('-' lee de stdin)")
+                elif parts[1] == "-":
+                    do_upload_stream(conn, sys.stdin.buffer, parts[2], compress=compress)
+                elif not os.path.exists(parts[1]):
+                    print("Archivo local no existe")
+                else:
+                    remote = parts[2] if len(parts) > 2 else os.path.basename(parts[1])
+                    with open(parts[1], "rb") as f:
+                        do_upload_stream(conn, f, remote, os.path.getsize(parts[1]), compress)
+            elif c == "SYNC":
+                if len(parts) < 2:
+                    print("Uso: SYNC <local_path> [remote_name]")
+                else:
+                    do_delta_upload(conn, parts[1], parts[2] if len(parts) > 2 else None)
+            elif c == "STATS":
+                do_stats(conn)
+            elif c == "DELETE":
+                if len(parts) < 2:
+                    print("Uso: DELETE <remote_name>")
+                else:
+                    do_delete(conn, parts[1])
+            elif c == "PUPLOAD":
+                if len(parts) < 2:
+                    print("Uso: PUPLOAD <local_path> [remote_name] [conexiones]")
+                else:
+                    n = int(parts[3]) if len(parts) > 3 else PARALLEL
+                    do_parallel_upload(conn, parts[1], parts[2] if len(parts) > 2 else None, n)
+            elif c == "PDOWNLOAD":
+                if len(parts) < 2:
+                    print("Uso: PDOWNLOAD <remote_name> [local_path] [conexiones]")
                 else:
-                    do_download(conn, parts[1], parts[2] if len(parts) > 2 else None)
+                    n = int(parts[3]) if len(parts) > 3 else PARALLEL
+                    do_parallel_download(conn, parts[1], parts[2] if len(parts) > 2 else None, n)
             else:
-                print("Comandos: LIST, UPLOAD, DOWNLOAD, QUIT")
-    except KeyboardInterrupt:
+                print("Comandos: LIST, UPLOAD, STREAM, SYNC, DOWNLOAD, CONTINUE, RESUME, PUPLOAD, PDOWNLOAD, DELETE, STATS, QUIT")
+    except (KeyboardInterrupt, EOFError):
         print("Saliendo...")
     finally:
         conn.close()
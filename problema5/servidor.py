@@ -4,12 +4,22 @@ Servidor para transferencia de archivos (UPLOAD / DOWNLOAD / LIST)
 - Maneja varios clientes con threads
 - Protocolo basado en líneas terminadas en \r\n
 - Soporta LIST, UPLOAD, DOWNLOAD y QUIT
+- UPLOADPART / COMMIT / STAT para transferencias en paralelo por rangos
+- DELETE y almacenamiento deduplicado por sha256 opcional (DEDUP)
+- Límites de ancho de banda por transferencia y global, con reparto justo (STATS)
+- DELTA para actualizar archivos enviando solo los bloques que cambiaron
 """
 
 import socket
 import threading
 import os
 import hashlib
+import json
+import shutil
+import time
+import bisect
+import zlib
+import lzma
 
 # Dirección y puerto donde escucha el servidor
 HOST = "localhost"
@@ -24,6 +34,46 @@ BUFFER = 4096
 # Límite máximo de archivo (1 GB por defecto)
 MAX_FILE_SIZE = 1 * 1024 * 1024 * 1024
 
+# Usar sendfile (zero-copy) en DOWNLOAD cuando la plataforma lo soporte
+USE_SENDFILE = True
+
+# Compresión opcional por flag en UPLOAD/DOWNLOAD (streaming, chunk a chunk)
+COMPRESS_LEVEL = 6                 # nivel zlib / preset lzma
+COMPRESS_CHUNK = 64 * 1024         # bytes sin comprimir por bloque
+MAX_FRAME = 1024 * 1024            # tamaño máximo de un frame comprimido
+CODECS = {
+    "ZLIB": (lambda: zlib.compressobj(COMPRESS_LEVEL), zlib.decompressobj),
+    "LZMA": (lambda: lzma.LZMACompressor(preset=COMPRESS_LEVEL), lzma.LZMADecompressor),
+}
+
+# Tamaño de bloque para DELTA (firmas adler32 + blake2b por bloque, estilo rsync)
+DELTA_BLOCK = 8192
+
+# Control de ancho de banda (bytes/s, 0 = sin límite)
+RATE_LIMIT_CONN = 0              # tope por transferencia
+RATE_LIMIT_GLOBAL = 0            # tope total, repartido en partes iguales entre transferencias activas
+RATE_BURST = 256 * 1024          # ráfaga permitida (archivos chicos salen sin esperar)
+SHAPING_CHUNK = 64 * 1024        # tamaño de cada envío cuando hay límites activos
+transfers = {}                   # {id: {"op", "file", "addr", "bytes", "start", "bucket"}}
+transfer_totals = {"upload": 0, "download": 0}
+shaping_lock = threading.Lock()
+next_transfer_id = 0
+
+# Protege la creación/preasignación de .tmp compartidos por subidas en paralelo
+parts_lock = threading.Lock()
+
+# Almacenamiento deduplicado por contenido (sha256) dentro de BASE_DIR/.blobs
+DEDUP = False
+BLOBS_DIRNAME = ".blobs"
+blob_index = None        # {"names": {nombre: sha256}, "refs": {sha256: n}}
+blob_lock = threading.Lock()
+
+# Índice en memoria de metadatos para LIST/STAT: {nombre: {"size", "mtime", "sha256"}}
+INDEX_REFRESH = 30       # segundos entre re-escaneos del directorio
+file_index = {}
+index_names = None       # nombres ordenados (se recalcula al cambiar el índice)
+index_lock = threading.Lock()
+
 # Crear la carpeta de almacenamiento si no existe
 os.makedirs(BASE_DIR, exist_ok=True)
 
@@ -37,6 +87,8 @@ def secure_join(base_dir, filename):
     """
     if "\x00" in filename or filename.startswith("/") or ".." in filename:
         raise ValueError("Nombre de archivo inválido")
+    if filename.replace("\\", "/").split("/")[0] == BLOBS_DIRNAME:
+        raise ValueError("Nombre reservado")
 
     candidate = os.path.normpath(os.path.join(base_dir, filename))
     if not candidate.startswith(base_dir + os.sep):
@@ -73,36 +125,545 @@ def read_exact(conn, size):
     return b"".join(chunks)
 
 
+def send_frame(conn, data):
+    """Envía un frame "<len>\r\n<bytes>" (los vacíos se omiten; "0\r\n" cierra el stream)."""
+    if data:
+        conn.sendall(f"{len(data)}\r\n".encode() + data)
+
+
+def recv_frames(conn):
+    """Genera los frames de un stream "<len>\r\n<bytes>" hasta el frame "0"."""
+    while True:
+        n = int(recv_line(conn))
+        if n == 0:
+            return
+        if n < 0 or n > MAX_FRAME:
+            raise ValueError("Frame demasiado grande")
+        yield read_exact(conn, n)
+
+
+def inflate(d, data):
+    """Descomprime 'data' en pedazos de a lo sumo COMPRESS_CHUNK bytes."""
+    while True:
+        out = d.decompress(data, COMPRESS_CHUNK)
+        if isinstance(d, lzma.LZMADecompressor):
+            data = b""
+            more = not d.needs_input and not d.eof
+        else:
+            data = d.unconsumed_tail
+            more = bool(data)
+        if out:
+            yield out
+        if not more:
+            return
+
+
+def recv_body(conn, size, codec=None):
+    """
+    Genera los 'size' bytes de un cuerpo enviado por el cliente.
+    - Sin codec y con tamaño conocido: bytes crudos leídos del socket.
+    - Con codec: frames comprimidos que se descomprimen al vuelo, sin
+      mantener nunca el archivo completo en memoria.
+    - Con size=None (tamaño desconocido, p. ej. un pipe): frames, crudos o
+      comprimidos, hasta el frame "0" y con tope MAX_FILE_SIZE.
+    """
+    if codec is None and size is not None:
+        remaining = size
+        while remaining > 0:
+            chunk = conn.recv(min(BUFFER, remaining))
+            if not chunk:
+                raise ConnectionError("Conexión cerrada durante subida")
+            remaining -= len(chunk)
+            yield chunk
+        return
+
+    d = CODECS[codec][1]() if codec else None
+    remaining = MAX_FILE_SIZE if size is None else size
+    for frame in recv_frames(conn):
+        for chunk in (inflate(d, frame) if d else (frame,)):
+            remaining -= len(chunk)
+            if remaining < 0:
+                raise ValueError("Datos exceden el tamaño anunciado")
+            yield chunk
+    if (size is not None and remaining) or (d and not d.eof):
+        raise ValueError("Stream incompleto")
+
+
+def send_compressed(conn, f, offset, count, codec, transfer=None):
+    """Envía 'count' bytes de 'f' desde 'offset' como frames comprimidos. Retorna su sha256."""
+    c = CODECS[codec][0]()
+    hasher = hashlib.sha256()
+    f.seek(offset)
+    remaining = count
+    while remaining > 0:
+        chunk = f.read(min(COMPRESS_CHUNK, remaining))
+        if not chunk:
+            break
+        hasher.update(chunk)
+        remaining -= len(chunk)
+        data = c.compress(chunk)
+        send_frame(conn, data)
+        if transfer:
+            throttle(transfer, len(data))
+    send_frame(conn, c.flush())
+    conn.sendall(b"0\r\n")
+    return hasher.hexdigest()
+
+
+def send_file(conn, f, offset=0, count=None, transfer=None):
+    """
+    Envía 'count' bytes del archivo abierto 'f' a partir de 'offset'.
+    - Con USE_SENDFILE y os.sendfile disponible, el kernel copia directo
+      del page cache al socket (sin pasar los bytes por Python).
+    - Si no, usa el loop clásico de lectura en chunks de BUFFER.
+    - Con límites de ancho de banda y una 'transfer' registrada, envía en
+      tramos de SHAPING_CHUNK y espera lo que indique su token bucket.
+    Retorna el número de bytes enviados.
+    """
+    if count == 0:
+        return 0
+    use_sendfile = USE_SENDFILE and hasattr(os, "sendfile")
+    shaped = transfer is not None and shaping_enabled()
+    if use_sendfile and not shaped:
+        sent = conn.sendfile(f, offset, count)
+        if transfer is not None:
+            transfer_count(transfer, sent)
+        return sent
+
+    step = SHAPING_CHUNK if shaped else BUFFER
+    f.seek(offset)
+    sent = 0
+    while count is None or sent < count:
+        to_send = step if count is None else min(step, count - sent)
+        if use_sendfile:
+            n = conn.sendfile(f, offset + sent, to_send)
+        else:
+            chunk = f.read(to_send)
+            conn.sendall(chunk)
+            n = len(chunk)
+        if not n:
+            break
+        sent += n
+        if shaped:
+            throttle(transfer, n)
+    return sent
+
+
+def write_at(fd, data, offset):
+    """Escritura posicional: usa os.pwrite si existe, si no lseek + write sobre el fd propio."""
+    if hasattr(os, "pwrite"):
+        return os.pwrite(fd, data, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.write(fd, data)
+
+
+def preallocate(tmp_path, size):
+    """
+    Crea (si hace falta) el .tmp con el tamaño final, para que varias conexiones
+    escriban sus rangos en posiciones fijas del mismo archivo.
+    """
+    with parts_lock:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+                if hasattr(os, "posix_fallocate") and size > 0:
+                    os.posix_fallocate(fd, 0, size)
+        finally:
+            os.close(fd)
+
+
+def finalize_upload(tmp_path, dest, filename, size, sha256_hex):
+    """Publica un .tmp ya verificado con su nombre definitivo."""
+    if DEDUP:
+        store_blob(tmp_path, dest, filename, sha256_hex)
+    else:
+        os.replace(tmp_path, dest)
+    index_update(filename, sha256_hex.lower())
+    print(f"[UPLOAD] Guardado {filename} ({size} bytes)")
+
+
+# -------------------- ALMACENAMIENTO DEDUPLICADO --------------------
+# Cada contenido se guarda una sola vez en BASE_DIR/.blobs/<sha[:2]>/<sha>.
+# Los nombres visibles en BASE_DIR son hard links al blob, así LIST/DOWNLOAD
+# no cambian. refs.json guarda nombre -> sha256 y el conteo de referencias.
+
+def blobs_dir():
+    return os.path.join(BASE_DIR, BLOBS_DIRNAME)
+
+
+def blob_path(sha256_hex):
+    return os.path.join(blobs_dir(), sha256_hex[:2], sha256_hex)
+
+
+def load_blob_index():
+    """Carga refs.json la primera vez (llamar con blob_lock tomado)."""
+    global blob_index
+    if blob_index is None:
+        path = os.path.join(blobs_dir(), "refs.json")
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                blob_index = json.load(f)
+        else:
+            blob_index = {"names": {}, "refs": {}}
+    return blob_index
+
+
+def save_blob_index():
+    """Escribe refs.json de forma atómica (llamar con blob_lock tomado)."""
+    os.makedirs(blobs_dir(), exist_ok=True)
+    path = os.path.join(blobs_dir(), "refs.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(blob_index, f)
+    os.replace(path + ".tmp", path)
+
+
+def link_blob(blob, dest):
+    """Expone el blob con el nombre pedido (hard link; copia si el FS no lo permite)."""
+    try:
+        os.link(blob, dest)
+    except OSError:
+        shutil.copyfile(blob, dest)
+
+
+def add_ref(filename, sha256_hex):
+    index = load_blob_index()
+    index["names"][filename] = sha256_hex
+    index["refs"][sha256_hex] = index["refs"].get(sha256_hex, 0) + 1
+    save_blob_index()
+
+
+def store_blob(tmp_path, dest, filename, sha256_hex):
+    """Mueve un .tmp verificado al blob de su sha256 (o lo descarta si ya existe)."""
+    sha256_hex = sha256_hex.lower()
+    blob = blob_path(sha256_hex)
+    with blob_lock:
+        if os.path.exists(blob):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.rename(tmp_path, blob)
+        link_blob(blob, dest)
+        add_ref(filename, sha256_hex)
+
+
+def link_existing_blob(dest, filename, sha256_hex, size):
+    """
+    Si ya existe un blob con ese sha256 y tamaño, lo enlaza como 'filename'
+    sin recibir bytes. Retorna True si se pudo deduplicar.
+    """
+    sha256_hex = sha256_hex.lower()
+    if len(sha256_hex) != 64 or any(c not in "0123456789abcdef" for c in sha256_hex):
+        return False
+    blob = blob_path(sha256_hex)
+    with blob_lock:
+        if not os.path.isfile(blob) or os.path.getsize(blob) != size:
+            return False
+        link_blob(blob, dest)
+        add_ref(filename, sha256_hex)
+    return True
+
+
+def release_blob(filename):
+    """Quita la referencia de 'filename' y borra el blob cuando nadie más lo usa."""
+    with blob_lock:
+        index = load_blob_index()
+        sha256_hex = index["names"].pop(filename, None)
+        if sha256_hex is None:
+            return
+        refs = index["refs"].get(sha256_hex, 1) - 1
+        if refs > 0:
+            index["refs"][sha256_hex] = refs
+        else:
+            index["refs"].pop(sha256_hex, None)
+            blob = blob_path(sha256_hex)
+            try:
+                os.remove(blob)
+            except FileNotFoundError:
+                pass
+            # El subdirectorio <sha[:2]> se borra si quedó vacío (falla si no)
+            try:
+                os.rmdir(os.path.dirname(blob))
+            except OSError:
+                pass
+        save_blob_index()
+
+
+# -------------------- CONTROL DE ANCHO DE BANDA --------------------
+# Cada transferencia activa tiene su token bucket. Su tasa es el mínimo entre
+# RATE_LIMIT_CONN y RATE_LIMIT_GLOBAL / transferencias activas, y se recalcula
+# cuando alguna empieza o termina: el total no pasa del límite global y el
+# ancho de banda se reparte en partes iguales. La ráfaga RATE_BURST deja que
+# los archivos chicos terminen sin esperar detrás de los grandes.
+
+class TokenBucket:
+    """Token bucket: take(n) consume n bytes y retorna los segundos a esperar."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill()
+            self.rate = rate
+
+    def take(self, n):
+        with self.lock:
+            if not self.rate:
+                return 0.0
+            self._refill()
+            self.tokens -= n
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+def shaping_enabled():
+    return bool(RATE_LIMIT_CONN or RATE_LIMIT_GLOBAL)
+
+
+def fair_rate():
+    """Tasa que le toca a cada transferencia activa (llamar con shaping_lock tomado)."""
+    rates = []
+    if RATE_LIMIT_CONN:
+        rates.append(RATE_LIMIT_CONN)
+    if RATE_LIMIT_GLOBAL and transfers:
+        rates.append(RATE_LIMIT_GLOBAL / len(transfers))
+    return min(rates) if rates else 0
+
+
+def transfer_start(addr, op, filename):
+    """Registra una transferencia y reparte de nuevo el ancho de banda."""
+    global next_transfer_id
+    with shaping_lock:
+        next_transfer_id += 1
+        transfer = {"id": next_transfer_id, "op": op, "file": filename, "addr": addr,
+                    "bytes": 0, "start": time.monotonic(), "bucket": TokenBucket(0, RATE_BURST)}
+        transfers[transfer["id"]] = transfer
+        rate = fair_rate()
+        for t in transfers.values():
+            t["bucket"].set_rate(rate)
+    return transfer
+
+
+def transfer_end(transfer):
+    with shaping_lock:
+        transfers.pop(transfer["id"], None)
+        rate = fair_rate()
+        for t in transfers.values():
+            t["bucket"].set_rate(rate)
+
+
+def transfer_count(transfer, n):
+    """Suma n bytes a la transferencia y al total global (haya o no límites)."""
+    with shaping_lock:
+        transfer["bytes"] += n
+        transfer_totals[transfer["op"]] += n
+
+
+def transfer_wait(transfer, n):
+    """Contabiliza n bytes y retorna cuántos segundos hay que esperar."""
+    transfer_count(transfer, n)
+    return transfer["bucket"].take(n)
+
+
+def throttle(transfer, n):
+    wait = transfer_wait(transfer, n)
+    if wait:
+        time.sleep(wait)
+
+
+# -------------------- ÍNDICE DE METADATOS --------------------
+# LIST y STAT se responden desde memoria. El índice se actualiza en cada
+# subida/borrado y un hilo lo reconcilia con el disco cada INDEX_REFRESH s.
+
+def is_listed(name):
+    return not name.endswith(".tmp")
+
+
+def index_rescan():
+    """Re-escanea BASE_DIR conservando el sha256 de los archivos que no cambiaron."""
+    global file_index, index_names
+    fresh = {}
+    with os.scandir(BASE_DIR) as it:
+        for entry in it:
+            if not entry.is_file() or not is_listed(entry.name):
+                continue
+            st = entry.stat()
+            fresh[entry.name] = {"size": st.st_size, "mtime": int(st.st_mtime), "sha256": None}
+
+    with index_lock:
+        for name, meta in fresh.items():
+            old = file_index.get(name)
+            if old and old["size"] == meta["size"] and old["mtime"] == meta["mtime"]:
+                meta["sha256"] = old["sha256"]
+        file_index = fresh
+        index_names = None
+
+
+def index_update(filename, sha256_hex=None):
+    """Registra (o refresca) un archivo en el índice tras subirlo."""
+    global index_names
+    st = os.stat(os.path.join(BASE_DIR, filename))
+    with index_lock:
+        if filename not in file_index:
+            index_names = None
+        file_index[filename] = {"size": st.st_size, "mtime": int(st.st_mtime), "sha256": sha256_hex}
+
+
+def index_remove(filename):
+    global index_names
+    with index_lock:
+        if file_index.pop(filename, None) is not None:
+            index_names = None
+
+
+def index_lookup(filename):
+    """Retorna una copia de los metadatos de 'filename' o None."""
+    with index_lock:
+        meta = file_index.get(filename)
+        return dict(meta) if meta else None
+
+
+def index_sha256(filename):
+    """sha256 del archivo, calculándolo (fuera del lock) solo la primera vez."""
+    meta = index_lookup(filename)
+    if meta is None:
+        return None
+    if meta["sha256"] is None:
+        hasher = hashlib.sha256()
+        try:
+            with open(os.path.join(BASE_DIR, filename), "rb") as f:
+                while chunk := f.read(1024 * 1024):
+                    hasher.update(chunk)
+        except FileNotFoundError:
+            index_remove(filename)
+            return None
+        meta["sha256"] = hasher.hexdigest()
+        with index_lock:
+            current = file_index.get(filename)
+            if current and current["mtime"] == meta["mtime"] and current["size"] == meta["size"]:
+                current["sha256"] = meta["sha256"]
+    return meta["sha256"]
+
+
+def index_page(prefix="", offset=0, limit=None):
+    """Retorna (total_que_coinciden, nombres_de_la_pagina) en orden alfabético."""
+    global index_names
+    with index_lock:
+        if index_names is None:
+            index_names = sorted(file_index)
+        names = index_names
+
+    start = bisect.bisect_left(names, prefix)
+    end = bisect.bisect_left(names, prefix + "\U0010ffff") if prefix else len(names)
+    page_end = end if limit is None else min(end, start + offset + limit)
+    return end - start, names[start + offset:page_end]
+
+
+def index_refresher():
+    """Hilo que reconcilia periódicamente el índice con el directorio."""
+    while True:
+        time.sleep(INDEX_REFRESH)
+        try:
+            index_rescan()
+        except OSError as e:
+            print(f"[!] Error re-escaneando {BASE_DIR}: {e}")
+
+
+# -------------------- SUBIDA DELTA (estilo rsync) --------------------
+# El servidor envía una firma por bloque de su copia: adler32 (que el cliente
+# puede calcular "rodando" byte a byte) y blake2b para confirmar. El cliente
+# responde con COPY de bloques que ya existen y DATA con los bytes nuevos.
+
+def block_signatures(path, block):
+    """Retorna las líneas "<adler32> <blake2b>" de cada bloque del archivo."""
+    sigs = []
+    with open(path, "rb") as f:
+        while chunk := f.read(block):
+            sigs.append(f"{zlib.adler32(chunk)} {hashlib.blake2b(chunk, digest_size=16).hexdigest()}")
+    return sigs
+
+
+def replace_upload(tmp_path, dest, filename, size, sha256_hex):
+    """Como finalize_upload, pero sustituyendo un archivo que ya existe."""
+    if DEDUP:
+        os.remove(dest)
+        index_remove(filename)
+        release_blob(filename)
+    finalize_upload(tmp_path, dest, filename, size, sha256_hex)
+
+
 # -------------------- HANDLERS DE COMANDOS --------------------
 
-def handle_list(conn):
-    """Responde con la lista de archivos en el servidor."""
-    files = [f for f in os.listdir(BASE_DIR) if os.path.isfile(os.path.join(BASE_DIR, f))]
-    conn.sendall(f"OK {len(files)} files\r\n".encode())
-    for f in files:
-        conn.sendall((f + "\r\n").encode())
+def handle_list(conn, parts):
+    """
+    Responde con la lista de archivos en el servidor (desde el índice en memoria):
+    Cliente envía -> LIST [offset [limit [prefix]]]
+    Servidor responde -> OK <n> files <total> seguido de n nombres, en un solo envío.
+    """
+    try:
+        offset = int(parts[1]) if len(parts) > 1 else 0
+        limit = int(parts[2]) if len(parts) > 2 else None
+    except ValueError:
+        conn.sendall(b"ERR 400 Paginacion invalida\r\n")
+        return
+    prefix = parts[3] if len(parts) > 3 else ""
+    if offset < 0 or (limit is not None and limit < 0):
+        conn.sendall(b"ERR 400 Paginacion invalida\r\n")
+        return
+
+    total, files = index_page(prefix, offset, limit)
+    lines = [f"OK {len(files)} files {total}"] + files
+    conn.sendall(("\r\n".join(lines) + "\r\n").encode())
 
 
 def handle_upload(conn, parts):
     """
     Maneja la subida de un archivo:
-    Cliente envía -> UPLOAD <filename> <size> <sha256>
+    Cliente envía -> UPLOAD <filename> <size> <sha256> [CONTINUE] [ZLIB|LZMA]
     Luego, tras "OK", envía los bytes del archivo.
+    Con CONTINUE se retoma el .tmp de una subida interrumpida: el servidor
+    responde "OK <offset>" y el cliente envía solo los bytes desde <offset>.
+    Con ZLIB/LZMA los bytes llegan como frames comprimidos; el sha256 se
+    verifica sobre el contenido descomprimido. Un codec desconocido se
+    rechaza con ERR 415 para que el cliente reintente sin compresión.
+    Con <sha256> = "-" el cliente envía el hash al final ("SHA256 <hex>")
+    y puede anunciar <size> = "*" si no lo conoce (los datos van en frames).
     """
-    if len(parts) != 4:
+    if len(parts) < 4:
         conn.sendall(b"ERR 400 Formato UPLOAD incorrecto\r\n")
         return
 
-    _, filename, size_s, sha256_hex = parts
+    _, filename, size_s, sha256_hex = parts[:4]
+    opts = [p.upper() for p in parts[4:]]
+    resume = "CONTINUE" in opts
+    codecs = [o for o in opts if o in CODECS]
+    if len(codecs) > 1 or any(o != "CONTINUE" and o not in CODECS for o in opts):
+        conn.sendall(b"ERR 415 Opcion o compresion no soportada\r\n")
+        return
+    codec = codecs[0] if codecs else None
+    trailer = sha256_hex == "-"
     try:
-        size = int(size_s)
+        size = None if trailer and size_s == "*" else int(size_s)
     except:
         conn.sendall(b"ERR 400 Tamano invalido\r\n")
         return
 
-    if size < 0 or size > MAX_FILE_SIZE:
+    if size is not None and (size < 0 or size > MAX_FILE_SIZE):
         conn.sendall(b"ERR 413 Archivo demasiado grande\r\n")
         return
+    if size is None and resume:
+        conn.sendall(b"ERR 400 CONTINUE requiere tamano conocido\r\n")
+        return
 
     try:
         dest = secure_join(BASE_DIR, filename)
@@ -114,23 +675,46 @@ def handle_upload(conn, parts):
         conn.sendall(b"ERR 409 El archivo ya existe\r\n")
         return
 
-    # Confirmar que estamos listos para recibir
-    conn.sendall(b"OK\r\n")
+    # Contenido ya almacenado: se enlaza sin transferir los bytes
+    if DEDUP and not trailer and link_existing_blob(dest, filename, sha256_hex, size):
+        index_update(filename, sha256_hex.lower())
+        conn.sendall(b"EXISTS 208 Contenido ya almacenado, no se envian bytes\r\n")
+        print(f"[UPLOAD] Deduplicado {filename} ({size} bytes)")
+        return
 
     # Guardar archivo en .tmp hasta confirmar checksum
     tmp_path = dest + ".tmp"
     hasher = hashlib.sha256()
+    offset = 0
+
+    if resume and os.path.exists(tmp_path):
+        offset = os.path.getsize(tmp_path)
+        if offset > size:
+            offset = 0
+        else:
+            # Reconstruir el estado del hash con lo que ya está en disco
+            with open(tmp_path, "rb") as f:
+                while chunk := f.read(BUFFER):
+                    hasher.update(chunk)
 
+    # Confirmar que estamos listos para recibir (y desde dónde si se retoma)
+    conn.sendall(f"OK {offset}\r\n".encode() if resume else b"OK\r\n")
+
+    received = offset
+    transfer = transfer_start(conn.getpeername(), "upload", filename)
     try:
-        with open(tmp_path, "wb") as f:
-            remaining = size
-            while remaining > 0:
-                chunk = conn.recv(min(BUFFER, remaining))
-                if not chunk:
-                    raise ConnectionError("Conexión cerrada durante subida")
+        with open(tmp_path, "ab" if offset else "wb") as f:
+            for chunk in recv_body(conn, None if size is None else size - offset, codec):
                 f.write(chunk)
                 hasher.update(chunk)
-                remaining -= len(chunk)
+                received += len(chunk)
+                throttle(transfer, len(chunk))
+        if trailer:
+            line = recv_line(conn)
+            sha256_hex = line[len("SHA256 "):] if line.startswith("SHA256 ") else ""
+    except ConnectionError:
+        # Se conserva el .tmp parcial para poder retomarlo con CONTINUE
+        raise
     except Exception as e:
         try:
             os.remove(tmp_path)
@@ -138,6 +722,8 @@ def handle_upload(conn, parts):
             pass
         conn.sendall(f"ERR 500 {str(e)}\r\n".encode())
         return
+    finally:
+        transfer_end(transfer)
 
     # Validar checksum
     if hasher.hexdigest() != sha256_hex.lower():
@@ -146,22 +732,321 @@ def handle_upload(conn, parts):
         return
 
     # Confirmar éxito
-    os.rename(tmp_path, dest)
+    finalize_upload(tmp_path, dest, filename, received, sha256_hex)
     conn.sendall(b"OK Archivo guardado\r\n")
-    print(f"[UPLOAD] Guardado {filename} ({size} bytes)")
+
+
+def handle_delta(conn, parts):
+    """
+    Actualiza un archivo existente enviando solo lo que cambió:
+    Cliente envía -> DELTA <filename> <size> <sha256>
+    Servidor responde -> OK <block> <n> <size_actual> y n líneas "<adler32> <blake2b>"
+    Cliente envía una secuencia de:
+        COPY <bloque> <cantidad>   (bloques que el servidor ya tiene)
+        DATA <len> + <len> bytes   (bytes nuevos)
+        END
+    El servidor reconstruye el archivo en .tmp, verifica el sha256 y lo reemplaza.
+    """
+    if len(parts) != 4:
+        conn.sendall(b"ERR 400 Formato DELTA incorrecto\r\n")
+        return
+
+    _, filename, size_s, sha256_hex = parts
+    try:
+        size = int(size_s)
+    except ValueError:
+        conn.sendall(b"ERR 400 Tamano invalido\r\n")
+        return
+
+    if size < 0 or size > MAX_FILE_SIZE:
+        conn.sendall(b"ERR 413 Archivo demasiado grande\r\n")
+        return
+
+    try:
+        dest = secure_join(BASE_DIR, filename)
+    except ValueError:
+        conn.sendall(b"ERR 400 Nombre de archivo invalido\r\n")
+        return
+
+    if not os.path.isfile(dest):
+        conn.sendall(b"ERR 404 No hay version previa del archivo\r\n")
+        return
+
+    block = DELTA_BLOCK
+    sigs = block_signatures(dest, block)
+    conn.sendall(("\r\n".join([f"OK {block} {len(sigs)} {os.path.getsize(dest)}"] + sigs) + "\r\n").encode())
+
+    tmp_path = dest + ".tmp"
+    hasher = hashlib.sha256()
+    written = 0
+    literal = 0
+    transfer = transfer_start(conn.getpeername(), "upload", filename)
+    try:
+        with open(dest, "rb") as old, open(tmp_path, "wb") as out:
+            while True:
+                op = recv_line(conn).split()
+                if op == ["END"]:
+                    break
+                if len(op) == 3 and op[0] == "COPY":
+                    index, count = int(op[1]), int(op[2])
+                    if index < 0 or count < 0 or index + count > len(sigs):
+                        raise ValueError("Bloque fuera de rango")
+                    old.seek(index * block)
+                    remaining = count * block
+                    while remaining > 0:
+                        chunk = old.read(min(1024 * 1024, remaining))
+                        if not chunk:
+                            break
+                        out.write(chunk)
+                        hasher.update(chunk)
+                        written += len(chunk)
+                        remaining -= len(chunk)
+                elif len(op) == 2 and op[0] == "DATA":
+                    n = int(op[1])
+                    if n < 0 or n > MAX_FRAME:
+                        raise ValueError("Bloque de datos demasiado grande")
+                    chunk = read_exact(conn, n)
+                    out.write(chunk)
+                    hasher.update(chunk)
+                    written += n
+                    literal += n
+                    throttle(transfer, n)
+                else:
+                    raise ValueError("Operacion DELTA desconocida")
+                if written > size:
+                    raise ValueError("Datos exceden el tamaño anunciado")
+    except ConnectionError:
+        os.remove(tmp_path)
+        raise
+    except Exception as e:
+        os.remove(tmp_path)
+        conn.sendall(f"ERR 500 {e}\r\n".encode())
+        return
+    finally:
+        transfer_end(transfer)
+
+    if written != size or hasher.hexdigest() != sha256_hex.lower():
+        os.remove(tmp_path)
+        conn.sendall(b"ERR 422 checksum no coincide\r\n")
+        return
+
+    replace_upload(tmp_path, dest, filename, size, sha256_hex)
+    conn.sendall(f"OK Archivo actualizado ({literal} bytes nuevos)\r\n".encode())
+
+
+def handle_upload_part(conn, parts):
+    """
+    Recibe un rango de un archivo subido por varias conexiones en paralelo:
+    Cliente envía -> UPLOADPART <filename> <size> <offset> <length>
+    Tras "OK" envía los <length> bytes, que se escriben en <offset> del .tmp
+    preasignado con <size> bytes. Al terminar todas las partes se usa COMMIT.
+    """
+    if len(parts) != 5:
+        conn.sendall(b"ERR 400 Formato UPLOADPART incorrecto\r\n")
+        return
+
+    _, filename, size_s, offset_s, length_s = parts
+    try:
+        size, offset, length = int(size_s), int(offset_s), int(length_s)
+    except ValueError:
+        conn.sendall(b"ERR 400 Rango invalido\r\n")
+        return
+
+    if size < 0 or size > MAX_FILE_SIZE:
+        conn.sendall(b"ERR 413 Archivo demasiado grande\r\n")
+        return
+    if offset < 0 or length < 0 or offset + length > size:
+        conn.sendall(b"ERR 416 Rango fuera del archivo\r\n")
+        return
+
+    try:
+        dest = secure_join(BASE_DIR, filename)
+    except ValueError:
+        conn.sendall(b"ERR 400 Nombre de archivo invalido\r\n")
+        return
+
+    if os.path.exists(dest):
+        conn.sendall(b"ERR 409 El archivo ya existe\r\n")
+        return
+
+    tmp_path = dest + ".tmp"
+    preallocate(tmp_path, size)
+    conn.sendall(b"OK\r\n")
+
+    fd = os.open(tmp_path, os.O_WRONLY)
+    transfer = transfer_start(conn.getpeername(), "upload", filename)
+    try:
+        pos = offset
+        remaining = length
+        while remaining > 0:
+            chunk = conn.recv(min(BUFFER, remaining))
+            if not chunk:
+                raise ConnectionError("Conexión cerrada durante subida de parte")
+            write_at(fd, chunk, pos)
+            pos += len(chunk)
+            remaining -= len(chunk)
+            throttle(transfer, len(chunk))
+    finally:
+        os.close(fd)
+        transfer_end(transfer)
+
+    conn.sendall(b"OK Parte recibida\r\n")
+
+
+def handle_commit(conn, parts):
+    """
+    Cierra una subida por partes:
+    Cliente envía -> COMMIT <filename> <size> <sha256>
+    El servidor verifica el sha256 del archivo completo y lo publica.
+    """
+    if len(parts) != 4:
+        conn.sendall(b"ERR 400 Formato COMMIT incorrecto\r\n")
+        return
+
+    _, filename, size_s, sha256_hex = parts
+    try:
+        size = int(size_s)
+        dest = secure_join(BASE_DIR, filename)
+    except ValueError:
+        conn.sendall(b"ERR 400 Parametros COMMIT invalidos\r\n")
+        return
+
+    tmp_path = dest + ".tmp"
+    if not os.path.exists(tmp_path) or os.path.getsize(tmp_path) != size:
+        conn.sendall(b"ERR 404 No hay partes para ese archivo\r\n")
+        return
+    if os.path.exists(dest):
+        conn.sendall(b"ERR 409 El archivo ya existe\r\n")
+        return
+
+    hasher = hashlib.sha256()
+    with open(tmp_path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            hasher.update(chunk)
+
+    if hasher.hexdigest() != sha256_hex.lower():
+        os.remove(tmp_path)
+        conn.sendall(b"ERR 422 checksum no coincide\r\n")
+        return
+
+    finalize_upload(tmp_path, dest, filename, size, sha256_hex)
+    conn.sendall(b"OK Archivo guardado\r\n")
+
+
+def handle_delete(conn, parts):
+    """
+    Borra un archivo:
+    Cliente envía -> DELETE <filename>
+    Con DEDUP el blob solo se elimina cuando no quedan nombres que lo usen.
+    """
+    if len(parts) != 2:
+        conn.sendall(b"ERR 400 Formato DELETE incorrecto\r\n")
+        return
+
+    filename = parts[1]
+    try:
+        path = secure_join(BASE_DIR, filename)
+    except ValueError:
+        conn.sendall(b"ERR 400 Nombre de archivo invalido\r\n")
+        return
+
+    if not os.path.isfile(path):
+        conn.sendall(b"ERR 404 Archivo no encontrado\r\n")
+        return
+
+    os.remove(path)
+    index_remove(filename)
+    if DEDUP:
+        release_blob(filename)
+    conn.sendall(b"OK Archivo eliminado\r\n")
+    print(f"[DELETE] Eliminado {filename}")
+
+
+def handle_stats(conn, parts):
+    """
+    Muestra el uso de ancho de banda:
+    Cliente envía -> STATS
+    Servidor responde -> OK <n> transfers up=<bytes> down=<bytes> conn_limit=<B/s> global_limit=<B/s>
+    seguido de una línea por transferencia activa: <id> <op> <archivo> <ip:puerto> <bytes> <B/s> <límite B/s>
+    """
+    now = time.monotonic()
+    with shaping_lock:
+        lines = [f"OK {len(transfers)} transfers up={transfer_totals['upload']} "
+                 f"down={transfer_totals['download']} conn_limit={RATE_LIMIT_CONN} "
+                 f"global_limit={RATE_LIMIT_GLOBAL}"]
+        for t in transfers.values():
+            elapsed = max(now - t["start"], 1e-6)
+            addr = f"{t['addr'][0]}:{t['addr'][1]}"
+            lines.append(f"{t['id']} {t['op']} {t['file']} {addr} {t['bytes']} "
+                         f"{int(t['bytes'] / elapsed)} {int(t['bucket'].rate)}")
+    conn.sendall(("\r\n".join(lines) + "\r\n").encode())
+
+
+def handle_stat(conn, parts):
+    """
+    Devuelve los metadatos de un archivo:
+    Cliente envía -> STAT <filename> [HASH]
+    Servidor responde -> OK <size> <mtime> <sha256>
+    Sin HASH el sha256 es el que ya estaba en el índice (guardado al subir el
+    archivo), o "-" si no se conoce: STAT nunca lee el archivo entero. Con HASH
+    se calcula si hace falta.
+    """
+    if len(parts) not in (2, 3) or (len(parts) == 3 and parts[2].upper() != "HASH"):
+        conn.sendall(b"ERR 400 Formato STAT incorrecto\r\n")
+        return
+
+    try:
+        path = secure_join(BASE_DIR, parts[1])
+    except ValueError:
+        conn.sendall(b"ERR 400 Nombre de archivo invalido\r\n")
+        return
+
+    meta = index_lookup(parts[1])
+    if meta is None and os.path.isfile(path) and is_listed(parts[1]):
+        # Archivo que apareció en disco antes del próximo re-escaneo
+        index_update(parts[1])
+        meta = index_lookup(parts[1])
+    if meta is None:
+        conn.sendall(b"ERR 404 Archivo no encontrado\r\n")
+        return
+    sha = meta["sha256"] or "-"
+    if len(parts) == 3:
+        sha = index_sha256(parts[1])
+        if sha is None:
+            conn.sendall(b"ERR 404 Archivo no encontrado\r\n")
+            return
+
+    conn.sendall(f"OK {meta['size']} {meta['mtime']} {sha}\r\n".encode())
 
 
 def handle_download(conn, parts):
     """
     Maneja la descarga de un archivo:
-    Cliente envía -> DOWNLOAD <filename>
-    Servidor responde con "OK" y luego "SIZE <size>" seguido de los bytes.
+    Cliente envía -> DOWNLOAD <filename> [offset [length]] [ZLIB|LZMA]
+    Servidor responde con "OK" y luego "SIZE <n>" seguido de los n bytes
+    del rango pedido (por defecto desde offset hasta el final).
+    Con ZLIB/LZMA los n bytes van como frames comprimidos seguidos de
+    "SHA256 <hex>" del contenido sin comprimir.
     """
-    if len(parts) != 2:
+    codec = None
+    if len(parts) > 2 and not parts[-1].lstrip("-").isdigit():
+        codec = parts[-1].upper()
+        parts = parts[:-1]
+        if codec not in CODECS:
+            conn.sendall(b"ERR 415 Compresion no soportada\r\n")
+            return
+
+    if len(parts) not in (2, 3, 4):
         conn.sendall(b"ERR 400 Formato DOWNLOAD incorrecto\r\n")
         return
 
-    _, filename = parts
+    filename = parts[1]
+    try:
+        offset = int(parts[2]) if len(parts) > 2 else 0
+        length = int(parts[3]) if len(parts) > 3 else None
+    except ValueError:
+        conn.sendall(b"ERR 400 Rango invalido\r\n")
+        return
     try:
         path = secure_join(BASE_DIR, filename)
     except ValueError:
@@ -173,15 +1058,27 @@ def handle_download(conn, parts):
         return
 
     size = os.path.getsize(path)
+    if offset < 0 or offset > size or (length is not None and length < 0):
+        conn.sendall(b"ERR 416 Rango fuera del archivo\r\n")
+        return
+
+    count = size - offset if length is None else min(length, size - offset)
     conn.sendall(b"OK\r\n")
-    conn.sendall(f"SIZE {size}\r\n".encode())
+    conn.sendall(f"SIZE {count}\r\n".encode())
 
-    # Enviar en chunks
-    with open(path, "rb") as f:
-        while chunk := f.read(BUFFER):
-            conn.sendall(chunk)
+    # Enviar el contenido (comprimido, o con sendfile/chunks según disponibilidad)
+    transfer = transfer_start(conn.getpeername(), "download", filename)
+    try:
+        with open(path, "rb") as f:
+            if codec:
+                sha = send_compressed(conn, f, offset, count, codec, transfer)
+                conn.sendall(f"SHA256 {sha}\r\n".encode())
+            else:
+                send_file(conn, f, offset, count, transfer)
+    finally:
+        transfer_end(transfer)
 
-    print(f"[DOWNLOAD] Enviado {filename} ({size} bytes)")
+    print(f"[DOWNLOAD] Enviado {filename} ({count} bytes desde {offset})")
 
 
 # -------------------- GESTIÓN DE CLIENTES --------------------
@@ -199,11 +1096,23 @@ def client_thread(conn, addr):
             print(f"[{addr}] CMD: {line}")
 
             if cmd == "LIST":
-                handle_list(conn)
+                handle_list(conn, parts)
             elif cmd == "UPLOAD":
                 handle_upload(conn, parts)
             elif cmd == "DOWNLOAD":
                 handle_download(conn, parts)
+            elif cmd == "DELTA":
+                handle_delta(conn, parts)
+            elif cmd == "UPLOADPART":
+                handle_upload_part(conn, parts)
+            elif cmd == "COMMIT":
+                handle_commit(conn, parts)
+            elif cmd == "STAT":
+                handle_stat(conn, parts)
+            elif cmd == "DELETE":
+                handle_delete(conn, parts)
+            elif cmd == "STATS":
+                handle_stats(conn, parts)
             elif cmd == "QUIT":
                 conn.sendall(b"OK Bye\r\n")
                 break
@@ -224,6 +1133,9 @@ def run_server():
     srv.listen(8)
     print(f"Servidor escuchando en {HOST}:{PORT}")
 
+    index_rescan()
+    threading.Thread(target=index_refresher, daemon=True).start()
+
     try:
         while True:
             conn, addr = srv.accept()
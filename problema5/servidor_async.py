@@ -0,0 +1,603 @@
+#!/usr/bin/env python3
+"""
+Servidor de archivos con asyncio (mismo protocolo que servidor.py)
+- Un solo hilo con event loop en lugar de un hilo por conexión
+- Limita las conexiones (MAX_CONNECTIONS) y las transferencias simultáneas (MAX_TRANSFERS)
+- Aplica backpressure: espera a drain() antes de seguir leyendo del disco, y
+  StreamReader deja de leer del socket cuando su buffer se llena
+- LIST / STAT / DELETE / COMMIT / STATS reutilizan los handlers de servidor.py en un
+  hilo del pool; UPLOAD / DOWNLOAD / UPLOADPART están escritos con streams
+- Lo que puede tardar (comprimir/descomprimir, escribir en disco, hashear y
+  guardar refs.json) corre en el pool de hilos, de a bloques de COMPRESS_CHUNK,
+  para no frenar el event loop mientras se atiende a los demás clientes
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+
+import servidor
+from servidor import CODECS, secure_join
+
+HOST = servidor.HOST
+PORT = servidor.PORT
+
+# Máximo de conexiones abiertas; las demás reciben ERR 503
+MAX_CONNECTIONS = 1000
+
+# Máximo de transferencias (UPLOAD/DOWNLOAD/UPLOADPART) moviendo bytes a la vez
+MAX_TRANSFERS = 64
+
+# Bytes que se acumulan en el buffer de escritura antes de que drain() espere
+WRITE_HIGH_WATER = 256 * 1024
+
+# Límite del buffer de lectura (y largo máximo de una línea de comando)
+READ_LIMIT = 64 * 1024
+
+transfer_slots = None  # asyncio.Semaphore(MAX_TRANSFERS), se crea en serve()
+active = 0           # conexiones abiertas
+
+
+# -------------------- FUNCIONES AUXILIARES --------------------
+
+class Reply:
+    """Objeto con sendall() que acumula la respuesta de un handler síncrono."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def sendall(self, data):
+        self.chunks.append(bytes(data))
+
+
+async def send(writer, data):
+    """Escribe y espera a que el buffer de salida baje (backpressure)."""
+    writer.write(data)
+    await writer.drain()
+
+
+async def recv_line(reader):
+    """Lee una línea terminada en '\r\n' y la retorna como string."""
+    try:
+        data = await reader.readuntil(b"\r\n")
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("Conexión cerrada leyendo línea")
+    except asyncio.LimitOverrunError:
+        raise ConnectionError("Línea demasiado larga")
+    return data[:-2].decode("utf-8", errors="replace")
+
+
+async def recv_body(reader, size, codec=None):
+    """Versión asíncrona de servidor.recv_body (bytes crudos o frames)."""
+    if codec is None and size is not None:
+        remaining = size
+        while remaining > 0:
+            chunk = await reader.read(min(servidor.BUFFER, remaining))
+            if not chunk:
+                raise ConnectionError("Conexión cerrada durante subida")
+            remaining -= len(chunk)
+            yield chunk
+        return
+
+    d = CODECS[codec][1]() if codec else None
+    remaining = servidor.MAX_FILE_SIZE if size is None else size
+    while True:
+        n = int(await recv_line(reader))
+        if n == 0:
+            break
+        if n < 0 or n > servidor.MAX_FRAME:
+            raise ValueError("Frame demasiado grande")
+        try:
+            frame = await reader.readexactly(n)
+        except asyncio.IncompleteReadError:
+            raise ConnectionError("Conexión cerrada durante subida")
+        chunks = await asyncio.to_thread(inflate_frame, d, frame, remaining) if d else (frame,)
+        for chunk in chunks:
+            remaining -= len(chunk)
+            if remaining < 0:
+                raise ValueError("Datos exceden el tamaño anunciado")
+            yield chunk
+    if (size is not None and remaining) or (d and not d.eof):
+        raise ValueError("Stream incompleto")
+
+
+def inflate_frame(d, frame, limit):
+    """
+    Descomprime un frame entero (se llama en un hilo). Deja de descomprimir al
+    pasar 'limit' bytes: quien lo llama detecta el exceso y corta la subida.
+    """
+    chunks = []
+    total = 0
+    for chunk in servidor.inflate(d, frame):
+        chunks.append(chunk)
+        total += len(chunk)
+        if total > limit:
+            break
+    return chunks
+
+
+def write_block(f, hasher, data):
+    """Escribe un bloque en 'f' y lo suma al sha256 (se llama en un hilo)."""
+    f.write(data)
+    hasher.update(data)
+
+
+def compress_block(f, c, hasher, n):
+    """
+    Lee hasta n bytes de 'f', los suma al sha256 y los comprime (se llama en un
+    hilo). Retorna (bytes leídos, datos comprimidos).
+    """
+    chunk = f.read(n)
+    if not chunk:
+        return 0, b""
+    hasher.update(chunk)
+    return len(chunk), c.compress(chunk)
+
+
+def copy_blocks(old, out, hasher, start, length):
+    """Copia 'length' bytes de 'old' desde 'start' a 'out' (se llama en un hilo). Retorna los copiados."""
+    old.seek(start)
+    copied = 0
+    while copied < length:
+        chunk = old.read(min(1024 * 1024, length - copied))
+        if not chunk:
+            break
+        out.write(chunk)
+        hasher.update(chunk)
+        copied += len(chunk)
+    return copied
+
+
+def hash_file(path):
+    """Retorna el hasher sha256 con el contenido de 'path' (se llama en un hilo)."""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            hasher.update(chunk)
+    return hasher
+
+
+async def send_compressed(writer, f, offset, count, codec, transfer):
+    """Frames comprimidos + "0" + "SHA256 <hex>" (ver servidor.send_compressed)."""
+    c = CODECS[codec][0]()
+    hasher = hashlib.sha256()
+    f.seek(offset)
+    remaining = count
+    while remaining > 0:
+        n, data = await asyncio.to_thread(compress_block, f, c, hasher,
+                                          min(servidor.COMPRESS_CHUNK, remaining))
+        if not n:
+            break
+        remaining -= n
+        if data:
+            await send(writer, f"{len(data)}\r\n".encode() + data)
+            await throttle(transfer, len(data))
+    data = await asyncio.to_thread(c.flush)
+    if data:
+        writer.write(f"{len(data)}\r\n".encode() + data)
+    await send(writer, f"0\r\nSHA256 {hasher.hexdigest()}\r\n".encode())
+
+
+async def send_file(writer, f, offset, count, transfer):
+    """
+    Envía 'count' bytes de 'f' (ver servidor.send_file). loop.sendfile usa
+    os.sendfile y cae a lecturas si no es posible; con límites de ancho de
+    banda se envía en tramos de SHAPING_CHUNK.
+    """
+    if not count:
+        return
+    loop = asyncio.get_running_loop()
+    shaped = servidor.shaping_enabled()
+    if servidor.USE_SENDFILE and not shaped:
+        sent = await loop.sendfile(writer.transport, f, offset, count)
+        servidor.transfer_count(transfer, sent)
+        return
+
+    step = servidor.SHAPING_CHUNK if shaped else servidor.BUFFER
+    sent = 0
+    f.seek(offset)
+    while sent < count:
+        n = min(step, count - sent)
+        if servidor.USE_SENDFILE:
+            n = await loop.sendfile(writer.transport, f, offset + sent, n)
+        else:
+            chunk = f.read(n)
+            await send(writer, chunk)
+            n = len(chunk)
+        if not n:
+            break
+        sent += n
+        if shaped:
+            await throttle(transfer, n)
+
+
+# -------------------- HANDLERS DE COMANDOS --------------------
+
+async def throttle(transfer, n):
+    """Versión asíncrona de servidor.throttle: espera sin bloquear el event loop."""
+    wait = servidor.transfer_wait(transfer, n)
+    if wait:
+        await asyncio.sleep(wait)
+
+
+async def run_sync_handler(writer, handler, parts):
+    """Ejecuta un handler de servidor.py que solo responde (sin leer del socket) en un hilo."""
+    reply = Reply()
+    await asyncio.to_thread(handler, reply, parts)
+    await send(writer, b"".join(reply.chunks))
+
+
+async def handle_upload(reader, writer, parts):
+    """UPLOAD <filename> <size|*> <sha256|-> [CONTINUE] [ZLIB|LZMA] (ver servidor.handle_upload)."""
+    if len(parts) < 4:
+        await send(writer, b"ERR 400 Formato UPLOAD incorrecto\r\n")
+        return
+
+    _, filename, size_s, sha256_hex = parts[:4]
+    opts = [p.upper() for p in parts[4:]]
+    resume = "CONTINUE" in opts
+    codecs = [o for o in opts if o in CODECS]
+    if len(codecs) > 1 or any(o != "CONTINUE" and o not in CODECS for o in opts):
+        await send(writer, b"ERR 415 Opcion o compresion no soportada\r\n")
+        return
+    codec = codecs[0] if codecs else None
+    trailer = sha256_hex == "-"
+
+    try:
+        size = None if trailer and size_s == "*" else int(size_s)
+    except ValueError:
+        await send(writer, b"ERR 400 Tamano invalido\r\n")
+        return
+
+    if size is not None and (size < 0 or size > servidor.MAX_FILE_SIZE):
+        await send(writer, b"ERR 413 Archivo demasiado grande\r\n")
+        return
+    if size is None and resume:
+        await send(writer, b"ERR 400 CONTINUE requiere tamano conocido\r\n")
+        return
+
+    try:
+        dest = secure_join(servidor.BASE_DIR, filename)
+    except ValueError:
+        await send(writer, b"ERR 400 Nombre de archivo invalido\r\n")
+        return
+
+    if os.path.exists(dest):
+        await send(writer, b"ERR 409 El archivo ya existe\r\n")
+        return
+
+    if servidor.DEDUP and not trailer and \
+            await asyncio.to_thread(servidor.link_existing_blob, dest, filename, sha256_hex, size):
+        servidor.index_update(filename, sha256_hex.lower())
+        await send(writer, b"EXISTS 208 Contenido ya almacenado, no se envian bytes\r\n")
+        print(f"[UPLOAD] Deduplicado {filename} ({size} bytes)")
+        return
+
+    tmp_path = dest + ".tmp"
+    hasher = hashlib.sha256()
+    offset = 0
+    if resume and os.path.exists(tmp_path):
+        offset = os.path.getsize(tmp_path)
+        if offset > size:
+            offset = 0
+        else:
+            hasher = await asyncio.to_thread(hash_file, tmp_path)
+
+    async with transfer_slots:
+        await send(writer, f"OK {offset}\r\n".encode() if resume else b"OK\r\n")
+        received = offset
+        transfer = servidor.transfer_start(writer.get_extra_info("peername"), "upload", filename)
+        try:
+            with open(tmp_path, "ab" if offset else "wb") as f:
+                # Se escribe en el hilo de a bloques de COMPRESS_CHUNK, no por cada recv
+                pending = bytearray()
+                async for chunk in recv_body(reader, None if size is None else size - offset, codec):
+                    pending += chunk
+                    received += len(chunk)
+                    await throttle(transfer, len(chunk))
+                    if len(pending) >= servidor.COMPRESS_CHUNK:
+                        await asyncio.to_thread(write_block, f, hasher, bytes(pending))
+                        pending.clear()
+                if pending:
+                    await asyncio.to_thread(write_block, f, hasher, bytes(pending))
+            if trailer:
+                line = await recv_line(reader)
+                sha256_hex = line[len("SHA256 "):] if line.startswith("SHA256 ") else ""
+        except ConnectionError:
+            # Se conserva el .tmp parcial para poder retomarlo con CONTINUE
+            raise
+        except Exception as e:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            await send(writer, f"ERR 500 {e}\r\n".encode())
+            return
+        finally:
+            servidor.transfer_end(transfer)
+
+    if hasher.hexdigest() != sha256_hex.lower():
+        os.remove(tmp_path)
+        await send(writer, b"ERR 422 checksum no coincide\r\n")
+        return
+
+    await asyncio.to_thread(servidor.finalize_upload, tmp_path, dest, filename, received, sha256_hex)
+    await send(writer, b"OK Archivo guardado\r\n")
+
+
+async def handle_upload_part(reader, writer, parts):
+    """UPLOADPART <filename> <size> <offset> <length> (ver servidor.handle_upload_part)."""
+    if len(parts) != 5:
+        await send(writer, b"ERR 400 Formato UPLOADPART incorrecto\r\n")
+        return
+
+    _, filename, size_s, offset_s, length_s = parts
+    try:
+        size, offset, length = int(size_s), int(offset_s), int(length_s)
+    except ValueError:
+        await send(writer, b"ERR 400 Rango invalido\r\n")
+        return
+
+    if size < 0 or size > servidor.MAX_FILE_SIZE:
+        await send(writer, b"ERR 413 Archivo demasiado grande\r\n")
+        return
+    if offset < 0 or length < 0 or offset + length > size:
+        await send(writer, b"ERR 416 Rango fuera del archivo\r\n")
+        return
+
+    try:
+        dest = secure_join(servidor.BASE_DIR, filename)
+    except ValueError:
+        await send(writer, b"ERR 400 Nombre de archivo invalido\r\n")
+        return
+
+    if os.path.exists(dest):
+        await send(writer, b"ERR 409 El archivo ya existe\r\n")
+        return
+
+    tmp_path = dest + ".tmp"
+    await asyncio.to_thread(servidor.preallocate, tmp_path, size)
+
+    async with transfer_slots:
+        await send(writer, b"OK\r\n")
+        fd = os.open(tmp_path, os.O_WRONLY)
+        transfer = servidor.transfer_start(writer.get_extra_info("peername"), "upload", filename)
+        try:
+            pos = offset
+            pending = bytearray()
+            async for chunk in recv_body(reader, length):
+                pending += chunk
+                await throttle(transfer, len(chunk))
+                if len(pending) >= servidor.COMPRESS_CHUNK:
+                    await asyncio.to_thread(servidor.write_at, fd, bytes(pending), pos)
+                    pos += len(pending)
+                    pending.clear()
+            if pending:
+                await asyncio.to_thread(servidor.write_at, fd, bytes(pending), pos)
+        finally:
+            os.close(fd)
+            servidor.transfer_end(transfer)
+
+    await send(writer, b"OK Parte recibida\r\n")
+
+
+async def handle_delta(reader, writer, parts):
+    """DELTA <filename> <size> <sha256> + COPY/DATA/END (ver servidor.handle_delta)."""
+    if len(parts) != 4:
+        await send(writer, b"ERR 400 Formato DELTA incorrecto\r\n")
+        return
+
+    _, filename, size_s, sha256_hex = parts
+    try:
+        size = int(size_s)
+    except ValueError:
+        await send(writer, b"ERR 400 Tamano invalido\r\n")
+        return
+
+    if size < 0 or size > servidor.MAX_FILE_SIZE:
+        await send(writer, b"ERR 413 Archivo demasiado grande\r\n")
+        return
+
+    try:
+        dest = secure_join(servidor.BASE_DIR, filename)
+    except ValueError:
+        await send(writer, b"ERR 400 Nombre de archivo invalido\r\n")
+        return
+
+    if not os.path.isfile(dest):
+        await send(writer, b"ERR 404 No hay version previa del archivo\r\n")
+        return
+
+    block = servidor.DELTA_BLOCK
+    sigs = await asyncio.to_thread(servidor.block_signatures, dest, block)
+
+    tmp_path = dest + ".tmp"
+    hasher = hashlib.sha256()
+    written = 0
+    literal = 0
+    async with transfer_slots:
+        await send(writer, ("\r\n".join([f"OK {block} {len(sigs)} {os.path.getsize(dest)}"] + sigs) + "\r\n").encode())
+        transfer = servidor.transfer_start(writer.get_extra_info("peername"), "upload", filename)
+        try:
+            with open(dest, "rb") as old, open(tmp_path, "wb") as out:
+                while True:
+                    op = (await recv_line(reader)).split()
+                    if op == ["END"]:
+                        break
+                    if len(op) == 3 and op[0] == "COPY":
+                        index, count = int(op[1]), int(op[2])
+                        if index < 0 or count < 0 or index + count > len(sigs):
+                            raise ValueError("Bloque fuera de rango")
+                        written += await asyncio.to_thread(copy_blocks, old, out, hasher,
+                                                           index * block, count * block)
+                    elif len(op) == 2 and op[0] == "DATA":
+                        n = int(op[1])
+                        if n < 0 or n > servidor.MAX_FRAME:
+                            raise ValueError("Bloque de datos demasiado grande")
+                        try:
+                            chunk = await reader.readexactly(n)
+                        except asyncio.IncompleteReadError:
+                            raise ConnectionError("Conexión cerrada durante subida")
+                        await asyncio.to_thread(write_block, out, hasher, chunk)
+                        written += n
+                        literal += n
+                        await throttle(transfer, n)
+                    else:
+                        raise ValueError("Operacion DELTA desconocida")
+                    if written > size:
+                        raise ValueError("Datos exceden el tamaño anunciado")
+        except ConnectionError:
+            os.remove(tmp_path)
+            raise
+        except Exception as e:
+            os.remove(tmp_path)
+            await send(writer, f"ERR 500 {e}\r\n".encode())
+            return
+        finally:
+            servidor.transfer_end(transfer)
+
+    if written != size or hasher.hexdigest() != sha256_hex.lower():
+        os.remove(tmp_path)
+        await send(writer, b"ERR 422 checksum no coincide\r\n")
+        return
+
+    await asyncio.to_thread(servidor.replace_upload, tmp_path, dest, filename, size, sha256_hex)
+    await send(writer, f"OK Archivo actualizado ({literal} bytes nuevos)\r\n".encode())
+
+
+async def handle_download(reader, writer, parts):
+    """DOWNLOAD <filename> [offset [length]] [ZLIB|LZMA] (ver servidor.handle_download)."""
+    codec = None
+    if len(parts) > 2 and not parts[-1].lstrip("-").isdigit():
+        codec = parts[-1].upper()
+        parts = parts[:-1]
+        if codec not in CODECS:
+            await send(writer, b"ERR 415 Compresion no soportada\r\n")
+            return
+
+    if len(parts) not in (2, 3, 4):
+        await send(writer, b"ERR 400 Formato DOWNLOAD incorrecto\r\n")
+        return
+
+    filename = parts[1]
+    try:
+        offset = int(parts[2]) if len(parts) > 2 else 0
+        length = int(parts[3]) if len(parts) > 3 else None
+    except ValueError:
+        await send(writer, b"ERR 400 Rango invalido\r\n")
+        return
+
+    try:
+        path = secure_join(servidor.BASE_DIR, filename)
+    except ValueError:
+        await send(writer, b"ERR 400 Nombre de archivo invalido\r\n")
+        return
+
+    if not os.path.exists(path):
+        await send(writer, b"ERR 404 Archivo no encontrado\r\n")
+        return
+
+    size = os.path.getsize(path)
+    if offset < 0 or offset > size or (length is not None and length < 0):
+        await send(writer, b"ERR 416 Rango fuera del archivo\r\n")
+        return
+
+    count = size - offset if length is None else min(length, size - offset)
+    async with transfer_slots:
+        await send(writer, f"OK\r\nSIZE {count}\r\n".encode())
+        transfer = servidor.transfer_start(writer.get_extra_info("peername"), "download", filename)
+        try:
+            with open(path, "rb") as f:
+                if codec:
+                    await send_compressed(writer, f, offset, count, codec, transfer)
+                else:
+                    await send_file(writer, f, offset, count, transfer)
+        finally:
+            servidor.transfer_end(transfer)
+
+    print(f"[DOWNLOAD] Enviado {filename} ({count} bytes desde {offset})")
+
+
+# -------------------- GESTIÓN DE CLIENTES --------------------
+
+SYNC_COMMANDS = {
+    "LIST": servidor.handle_list,
+    "STAT": servidor.handle_stat,
+    "DELETE": servidor.handle_delete,
+    "COMMIT": servidor.handle_commit,
+    "STATS": servidor.handle_stats,
+}
+
+STREAM_COMMANDS = {
+    "UPLOAD": handle_upload,
+    "UPLOADPART": handle_upload_part,
+    "DELTA": handle_delta,
+    "DOWNLOAD": handle_download,
+}
+
+
+async def client_task(reader, writer):
+    """Atiende las peticiones de un cliente (equivalente a servidor.client_thread)."""
+    global active
+    addr = writer.get_extra_info("peername")
+    writer.transport.set_write_buffer_limits(high=WRITE_HIGH_WATER)
+
+    if active >= MAX_CONNECTIONS:
+        writer.write(b"ERR 503 Servidor ocupado\r\n")
+        writer.close()
+        return
+
+    active += 1
+    print(f"[+] Conexión desde {addr}")
+    try:
+        while True:
+            line = await recv_line(reader)
+            parts = line.strip().split()
+            if not parts:
+                await send(writer, b"ERR 400 Comando desconocido\r\n")
+                continue
+            cmd = parts[0].upper()
+            print(f"[{addr}] CMD: {line}")
+
+            if cmd in SYNC_COMMANDS:
+                await run_sync_handler(writer, SYNC_COMMANDS[cmd], parts)
+            elif cmd in STREAM_COMMANDS:
+                await STREAM_COMMANDS[cmd](reader, writer, parts)
+            elif cmd == "QUIT":
+                await send(writer, b"OK Bye\r\n")
+                break
+            else:
+                await send(writer, b"ERR 400 Comando desconocido\r\n")
+    except Exception as e:
+        print(f"[!] Error con {addr}: {e}")
+    finally:
+        active -= 1
+        writer.close()
+        print(f"[-] Desconectado {addr}")
+
+
+async def serve():
+    global transfer_slots
+    transfer_slots = asyncio.Semaphore(MAX_TRANSFERS)
+
+    servidor.index_rescan()
+    threading.Thread(target=servidor.index_refresher, daemon=True).start()
+
+    srv = await asyncio.start_server(client_task, HOST, PORT, limit=READ_LIMIT,
+                                     reuse_address=True, backlog=1024)
+    print(f"Servidor asyncio escuchando en {HOST}:{PORT}")
+    async with srv:
+        await srv.serve_forever()
+
+
+def run_async_server():
+    """Arranca el servidor asyncio."""
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("Servidor detenido")
+
+
+if __name__ == "__main__":
+    run_async_server()
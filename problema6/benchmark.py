@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Benchmarks del servidor de chat (problema6).
+No abre sockets: usa conexiones falsas que solo cuentan bytes, así se mide el
+costo del servidor (locks, índices, armado de mensajes) sin el de la red.
+
+Uso:
+    python problema6/benchmark.py fanout [--users 5000] [--rooms 200] [--sizes 1,10,100,1000]
+    python problema6/benchmark.py churn [--users 5000] [--rooms 200] [--ops 2000]
+    python problema6/benchmark.py scale [--workers 1,2,4] [--rooms 8] [--per-room 20] [--seconds 5]
+    python problema6/benchmark.py load [--sizes 10,100,500] [--rooms-per-size 2] [--rate 20] [--seconds 10]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import selectors
+import socket
+import sys
+import tempfile
+import time
+
+import servidor
+import servidor_multi
+
+
+# -------------------- UTILIDADES --------------------
+
+class FakeConn:
+    """Conexión falsa: sendall solo acumula los bytes enviados."""
+
+    def __init__(self):
+        self.sent = 0
+
+    def sendall(self, data):
+        self.sent += len(data)
+
+
+def poblar(users, rooms, sizes):
+    """
+    Reinicia el estado del servidor con 'users' clientes falsos. Las salas
+    "sala_<n>" (n en 'sizes') tienen exactamente n miembros; el resto de los
+    usuarios se reparte entre 'rooms' salas de relleno.
+    Retorna {n: conn de un miembro de sala_<n>}.
+    """
+    servidor.salas = {"general": {"usuarios": set()}}
+    servidor.miembros = {"general": set()}
+    servidor.clientes.clear()
+    servidor.por_nombre.clear()
+    servidor.journal.clear()
+
+    asignadas = []
+    for n in sizes:
+        asignadas += [f"sala_{n}"] * n
+    relleno = [f"relleno_{i % rooms}" for i in range(max(0, users - len(asignadas)))]
+
+    remitentes = {}
+    for i, sala in enumerate(asignadas + relleno):
+        if sala not in servidor.salas:
+            servidor.salas[sala] = {"usuarios": set()}
+            servidor.miembros[sala] = set()
+        conn = FakeConn()
+        servidor.registrar(conn, f"user{i}")
+        servidor.mover(conn, sala)
+        if sala.startswith("sala_"):
+            remitentes.setdefault(int(sala[5:]), conn)
+    return remitentes
+
+
+def broadcast_scan(sala, remitente, mensaje):
+    """broadcast anterior al índice de miembros: recorre todos los clientes."""
+    with servidor.lock:
+        for c, info in servidor.clientes.items():
+            if info["sala"] == sala and c != remitente:
+                try:
+                    servidor.enviar(c, f"[{info['sala']}] {servidor.clientes[remitente]['nombre']}: {mensaje}")
+                except:
+                    pass
+
+
+def medir(fn, *args, rounds):
+    """Microsegundos promedio por llamada."""
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn(*args)
+    return (time.perf_counter() - t0) / rounds * 1e6
+
+
+# -------------------- FAN-OUT POR SALA --------------------
+
+def bench_fanout(args):
+    """Costo de un broadcast según el tamaño de la sala, con y sin índice."""
+    remitentes = poblar(args.users, args.rooms, args.sizes)
+    total = len(servidor.clientes)
+    print(f"{total} usuarios en {len(servidor.salas)} salas")
+    print("  miembros   scan µs   indice µs   µs/miembro (indice)")
+    for n in args.sizes:
+        conn = remitentes[n]
+        sala = servidor.clientes[conn]["sala"]
+        scan = medir(broadcast_scan, sala, conn, "hola", rounds=args.rounds)
+        idx = medir(servidor.broadcast, sala, conn, "hola", rounds=args.rounds)
+        print(f"  {n:8d} {scan:9.1f} {idx:11.1f} {idx / n:12.2f}")
+
+    ultimo = f"user{total - 1}"
+    conn = remitentes[args.sizes[0]]
+    idx = medir(servidor.privado, ultimo, conn, "hola", rounds=args.rounds)
+    print(f"  privado a {ultimo}: {idx:.1f} µs")
+
+
+# -------------------- PERSISTENCIA BAJO CHURN --------------------
+
+def guardar_completo(path):
+    """Persistencia anterior al journal: reescribe todo el JSON en cada cambio."""
+    with servidor.lock:
+        data = {k: {"usuarios": list(v["usuarios"])} for k, v in servidor.salas.items()}
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
+
+def bench_churn(args):
+    """
+    Costo de persistir 'ops' cambios de sala (JOIN) con muchos usuarios:
+    reescribir salas.json en cada uno contra agregarlo al journal y volcarlo
+    en lote (el volcado con fsync se cuenta en el total).
+    """
+    poblar(args.users, args.rooms, [])
+    conns = list(servidor.clientes)
+    salas = list(servidor.salas)
+    rnd = random.Random(1)
+    movimientos = [(rnd.choice(conns), rnd.choice(salas)) for _ in range(args.ops)]
+
+    with tempfile.TemporaryDirectory() as work:
+        servidor.JOURNAL_FILE = os.path.join(work, "salas.journal")
+        snapshot = os.path.join(work, "salas.json")
+
+        t0 = time.perf_counter()
+        for conn, sala in movimientos:
+            servidor.mover(conn, sala)
+            guardar_completo(snapshot)
+        completo = time.perf_counter() - t0
+        servidor.journal.clear()
+
+        t0 = time.perf_counter()
+        for conn, sala in movimientos:
+            servidor.mover(conn, sala)
+        servidor.volcar_journal()
+        journal = time.perf_counter() - t0
+
+    print(f"{len(conns)} usuarios en {len(salas)} salas, {args.ops} JOIN")
+    print(f"  salas.json completo  {completo / args.ops * 1e6:10.1f} µs/op")
+    print(f"  journal + volcado    {journal / args.ops * 1e6:10.1f} µs/op")
+
+
+# -------------------- ESCALADO MULTIPROCESO --------------------
+
+def free_port():
+    """Pide al sistema un puerto libre en loopback."""
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def subir_limite_fds():
+    """Sube el límite de descriptores abiertos al máximo permitido (miles de sockets)."""
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def proceso_servidor(port, workers, base_dir, ventana=0):
+    """
+    Proceso hijo: el servidor en un directorio temporal. workers=0 usa el
+    main() con hilos; si no, servidor_multi con ese número de workers.
+    'ventana' es el BATCH_WINDOW de los hilos escritores.
+    """
+    os.chdir(base_dir)
+    sys.stdout = open(os.devnull, "w")  # los logs por conexión ensucian la tabla
+    subir_limite_fds()
+    servidor.PORT = port
+    servidor.BATCH_WINDOW = ventana
+    if workers:
+        servidor_multi.run_multi(workers)
+    else:
+        servidor.main()
+
+
+def esperar_servidor(port):
+    """Espera a que el servidor acepte conexiones."""
+    for _ in range(100):
+        try:
+            socket.create_connection(("localhost", port)).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("El servidor no arrancó")
+
+
+def generador(port, salas, por_sala, segundos, resultados):
+    """
+    Proceso de carga: conecta 'por_sala' clientes a cada sala. El primero de cada
+    sala envía mensajes sin pausa (en lotes) y todos cuentan las líneas recibidas.
+    """
+    sel = selectors.DefaultSelector()
+    emisores = []
+    for sala in salas:
+        for i in range(por_sala):
+            c = socket.create_connection(("localhost", port))
+            c.sendall(f"{sala}_{i}\nJOIN {sala}\n".encode())
+            if i == 0:
+                emisores.append(c)
+            else:
+                c.setblocking(False)
+                sel.register(c, selectors.EVENT_READ)
+    time.sleep(1.0)  # que lleguen todos los JOIN antes de medir
+
+    lote = b"".join(f"mensaje {i}\n".encode() for i in range(20))
+    recibidas = 0
+    fin = time.perf_counter() + segundos
+    for key, _ in sel.select(timeout=0):
+        while True:
+            try:
+                if not key.fileobj.recv(65536):
+                    break
+            except BlockingIOError:
+                break
+    while time.perf_counter() < fin:
+        for c in emisores:
+            c.sendall(lote)
+        for key, _ in sel.select(timeout=0):
+            try:
+                recibidas += key.fileobj.recv(65536).count(b"\n")
+            except BlockingIOError:
+                pass
+    resultados.put(recibidas)
+
+
+def bench_scale(args):
+    """
+    Carga con servidor_multi variando la cantidad de workers: mensajes
+    entregados por segundo (suma de lo recibido por todos los clientes).
+    Los generadores corren en procesos aparte para no ser el cuello de botella.
+    """
+    ctx = multiprocessing.get_context("fork")
+    salas = [f"carga{i}" for i in range(args.rooms)]
+    print(f"{args.rooms} salas x {args.per_room} clientes, {args.procs} procesos de carga, {os.cpu_count()} CPUs")
+    print("  workers   mensajes/s")
+    for workers in args.workers:
+        port = free_port()
+        with tempfile.TemporaryDirectory() as base_dir:
+            srv = ctx.Process(target=proceso_servidor, args=(port, workers, base_dir))
+            srv.start()
+            try:
+                esperar_servidor(port)
+                setup = socket.create_connection(("localhost", port))
+                setup.sendall(b"setup\n" + b"".join(f"CREATE {s}\n".encode() for s in salas))
+                time.sleep(0.5)  # que el CREATE llegue a todos los workers
+                setup.close()
+
+                resultados = ctx.Queue()
+                gens = [ctx.Process(target=generador,
+                                    args=(port, salas[i::args.procs], args.per_room, args.seconds, resultados))
+                        for i in range(args.procs)]
+                for g in gens:
+                    g.start()
+                total = sum(resultados.get() for _ in gens)
+                for g in gens:
+                    g.join()
+            finally:
+                srv.terminate()
+                srv.join()
+        print(f"  {workers:7d} {total / args.seconds:12.0f}")
+
+
+# -------------------- LATENCIA DE FAN-OUT --------------------
+
+def percentil(valores, p):
+    """Percentil p (0-100) de una lista ordenada."""
+    return valores[int(p / 100 * (len(valores) - 1))] if valores else 0.0
+
+
+def generador_latencia(port, salas, rate, segundos, resultados):
+    """
+    Proceso de carga: 'salas' es [(sala, tamaño)]. Conecta 'tamaño' clientes por
+    sala (nombre + JOIN). El primero envía 'rate' mensajes/s con la marca
+    time.monotonic_ns() (reloj común a todos los procesos) y los demás anotan
+    cuánto tardó en llegarles cada uno. Envía a 'resultados'
+    ({tamaño: [latencias ms]}, {tamaño: mensajes enviados}).
+    """
+    subir_limite_fds()
+    sel = selectors.DefaultSelector()
+    emisores = []
+    for sala, tam in salas:
+        for i in range(tam):
+            c = socket.create_connection(("localhost", port))
+            c.sendall(f"{sala}_{i}\nJOIN {sala}\n".encode())
+            c.setblocking(False)
+            sel.register(c, selectors.EVENT_READ, {"tam": tam, "buf": bytearray(), "unido": False})
+            if i == 0:
+                emisores.append((c, tam))
+
+    latencias = {tam: [] for _, tam in salas}
+    enviados = {tam: 0 for _, tam in salas}
+
+    def leer(timeout, medir):
+        for key, _ in sel.select(timeout):
+            try:
+                data = key.fileobj.recv(65536)
+            except BlockingIOError:
+                continue
+            if not medir:
+                if b"Te uniste a la sala" in data:
+                    key.data["unido"] = True
+                continue
+            ahora = time.monotonic_ns()
+            buf = key.data["buf"]
+            buf += data
+            *lineas, resto = buf.split(b"\n")
+            key.data["buf"] = bytearray(resto)
+            for linea in lineas:
+                if b": lat " in linea:
+                    enviado = int(linea.rsplit(b" ", 1)[1])
+                    latencias[key.data["tam"]].append((ahora - enviado) / 1e6)
+
+    # Esperar la confirmación del JOIN de todos los clientes (a lo sumo 30 s)
+    fin = time.monotonic() + 30
+    claves = list(sel.get_map().values())
+    while time.monotonic() < fin and not all(k.data["unido"] for k in claves):
+        leer(0.05, False)
+    fin = time.monotonic() + 0.2
+    while time.monotonic() < fin:
+        leer(0.05, False)
+
+    intervalo = 1 / rate
+    inicio = time.monotonic()
+    proximo = inicio
+    fin = inicio + segundos
+    while time.monotonic() < fin + 1.0:  # un segundo extra para los últimos mensajes
+        ahora = time.monotonic()
+        if ahora >= proximo and ahora < fin:
+            for c, tam in emisores:
+                try:
+                    c.sendall(f"lat {time.monotonic_ns()}\n".encode())
+                    enviados[tam] += 1
+                except BlockingIOError:
+                    pass
+            proximo += intervalo
+        leer(max(0.0, min(proximo, fin + 1.0) - time.monotonic()), True)
+    resultados.put((latencias, enviados))
+
+
+def bench_load(args):
+    """
+    Latencia de entrega de punta a punta según el tamaño de la sala. Levanta
+    el servidor (main() con hilos, o servidor_multi con --workers N) y procesos
+    generadores con miles de clientes simulados que hablan el protocolo real.
+    """
+    ctx = multiprocessing.get_context("fork")
+    salas = [(f"lat{tam}_{j}", tam) for tam in args.sizes for j in range(args.rooms_per_size)]
+    total = sum(tam for _, tam in salas)
+    modo = f"servidor_multi x{args.workers}" if args.workers else "main() con hilos"
+    print(f"{total} clientes en {len(salas)} salas, {args.rate} msg/s por sala, {modo}, "
+          f"ventana {args.window * 1000:g} ms")
+
+    port = free_port()
+    latencias = {tam: [] for tam in args.sizes}
+    enviados = {tam: 0 for tam in args.sizes}
+    with tempfile.TemporaryDirectory() as base_dir:
+        srv = ctx.Process(target=proceso_servidor, args=(port, args.workers, base_dir, args.window))
+        srv.start()
+        try:
+            esperar_servidor(port)
+            setup = socket.create_connection(("localhost", port))
+            setup.sendall(b"setup\n" + b"".join(f"CREATE {s}\n".encode() for s, _ in salas))
+            time.sleep(0.5)
+            setup.close()
+
+            resultados = ctx.Queue()
+            gens = [ctx.Process(target=generador_latencia,
+                                args=(port, salas[i::args.procs], args.rate, args.seconds, resultados))
+                    for i in range(min(args.procs, len(salas)))]
+            for g in gens:
+                g.start()
+            for _ in gens:
+                lat, env = resultados.get()
+                for tam in lat:
+                    latencias[tam] += lat[tam]
+                    enviados[tam] += env[tam]
+            for g in gens:
+                g.join()
+        finally:
+            srv.terminate()
+            srv.join()
+
+    print("  tamaño  enviados  entregas/s  entregado   p50 ms   p95 ms   p99 ms   max ms")
+    for tam in args.sizes:
+        valores = sorted(latencias[tam])
+        esperadas = enviados[tam] * (tam - 1)
+        ratio = len(valores) / esperadas * 100 if esperadas else 0.0
+        print(f"  {tam:6d} {enviados[tam]:9d} {len(valores) / args.seconds:11.0f} {ratio:9.1f}% "
+              f"{percentil(valores, 50):8.2f} {percentil(valores, 95):8.2f} "
+              f"{percentil(valores, 99):8.2f} {percentil(valores, 100):8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    ints = lambda v: [int(x) for x in v.split(",")]
+    p = sub.add_parser("fanout", help="costo de broadcast/privado según el tamaño de la sala")
+    p.add_argument("--users", type=int, default=5000)
+    p.add_argument("--rooms", type=int, default=200, help="salas de relleno")
+    p.add_argument("--sizes", type=ints, default=[1, 10, 100, 1000], help="tamaños de sala a medir")
+    p.add_argument("--rounds", type=int, default=200)
+    p.set_defaults(func=bench_fanout)
+
+    p = sub.add_parser("churn", help="reescribir salas.json vs journal con volcado en lote")
+    p.add_argument("--users", type=int, default=5000)
+    p.add_argument("--rooms", type=int, default=200)
+    p.add_argument("--ops", type=int, default=2000)
+    p.set_defaults(func=bench_churn)
+
+    p = sub.add_parser("scale", help="mensajes/s entregados con servidor_multi según los workers")
+    p.add_argument("--workers", type=ints, default=[1, 2, 4])
+    p.add_argument("--rooms", type=int, default=8)
+    p.add_argument("--per-room", type=int, default=20)
+    p.add_argument("--procs", type=int, default=2, help="procesos generadores de carga")
+    p.add_argument("--seconds", type=float, default=5)
+    p.set_defaults(func=bench_scale)
+
+    p = sub.add_parser("load", help="latencia de entrega p50/p95/p99 y throughput por tamaño de sala")
+    p.add_argument("--sizes", type=ints, default=[10, 100, 500], help="tamaños de sala")
+    p.add_argument("--rooms-per-size", type=int, default=2)
+    p.add_argument("--rate", type=float, default=20, help="mensajes/s que envía cada sala")
+    p.add_argument("--seconds", type=float, default=10)
+    p.add_argument("--procs", type=int, default=4, help="procesos generadores de carga")
+    p.add_argument("--workers", type=int, default=0, help="0 = main() con hilos; N = servidor_multi")
+    p.add_argument("--window", type=float, default=0, help="BATCH_WINDOW del servidor en segundos (p. ej. 0.005)")
+    p.set_defaults(func=bench_load)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
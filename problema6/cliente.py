@@ -4,30 +4,64 @@ Cliente interactivo para el chat con salas.
 """
 
 import socket
+import sys
 import threading
 
 HOST = "localhost"
 PORT = 9300
 BUFFER = 4096
+BURST = 64 * 1024  # bytes de mensajes que se juntan en un solo envío (stdin no interactivo)
 
 
 def recibir(conn):
-    """Hilo para escuchar mensajes del servidor"""
-    while True:
-        try:
-            data = conn.recv(BUFFER)
-            if not data:
-                break
-            print(data.decode().strip())
-        except:
+    """Hilo para escuchar mensajes del servidor (uno por línea)"""
+    try:
+        for linea in conn.makefile("r", encoding="utf-8", errors="replace"):
+            print(linea.rstrip("\n"))
+    except:
+        pass
+
+
+def enviar_rafaga(conn, entrada):
+    """
+    Envía todas las líneas de 'entrada' sin esperar respuestas, juntando hasta
+    BURST bytes por sendall: el servidor separa los comandos por línea.
+    """
+    pendiente = []
+    tam = 0
+    for msg in entrada:
+        msg = msg.rstrip("\r\n")
+        if not msg:
+            continue
+        data = (msg + "\n").encode()
+        pendiente.append(data)
+        tam += len(data)
+        if msg.upper() == "QUIT":
             break
+        if tam >= BURST:
+            conn.sendall(b"".join(pendiente))
+            pendiente.clear()
+            tam = 0
+    conn.sendall(b"".join(pendiente))
 
 
 def main():
     conn = socket.create_connection((HOST, PORT))
 
     # Hilo separado para recibir mensajes
-    threading.Thread(target=recibir, args=(conn,), daemon=True).start()
+    receptor = threading.Thread(target=recibir, args=(conn,), daemon=True)
+    receptor.start()
+
+    if not sys.stdin.isatty():
+        # Entrada redirigida (archivo o pipe): se envía en ráfaga y se esperan
+        # las respuestas hasta que el servidor cierre
+        try:
+            enviar_rafaga(conn, sys.stdin)
+            conn.shutdown(socket.SHUT_WR)
+            receptor.join()
+        finally:
+            conn.close()
+        return
 
     try:
         while True:
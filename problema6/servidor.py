@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-Servidor de chat con salas (JOIN, LEAVE, CREATE, LIST, USERS, MSG).
+Servidor de chat con salas (JOIN, LEAVE, CREATE, LIST, USERS, MSG, HISTORY).
 Cada cliente se maneja en un hilo separado.
 """
 
@@ -8,22 +8,63 @@ import socket
 import threading
 import json
 import os
+import queue
+import time
+from collections import deque
 
 HOST = "localhost"
 PORT = 9300
 BUFFER = 4096
+MAX_LINE = 4096  # bytes máximos por comando/mensaje
 STATE_FILE = "salas.json"
 
+# Persistencia write-behind: los cambios de salas se agregan a un journal que un
+# hilo vuelca (con fsync) cada FLUSH_INTERVAL segundos, y cada SNAPSHOT_INTERVAL
+# se compacta en STATE_FILE. Una caída pierde a lo sumo FLUSH_INTERVAL segundos.
+JOURNAL_FILE = "salas.journal"
+FLUSH_INTERVAL = 0.5
+SNAPSHOT_INTERVAL = 60
+
+# Cola de salida por cliente: mensajes pendientes como máximo y qué hacer si
+# se llena (cliente que no lee): "drop_oldest" descarta los más viejos,
+# "disconnect" cierra la conexión.
+OUTBOX_SIZE = 256
+OVERFLOW_POLICY = "drop_oldest"
+
+# Agrupación de escrituras: el hilo escritor junta todo lo que llegue a la cola
+# de un cliente durante BATCH_WINDOW segundos (p. ej. 0.005) y lo manda en un
+# solo sendall. 0 = sin ventana (igual se junta lo que ya estaba encolado).
+BATCH_WINDOW = 0
+
+# Historial en memoria: últimos HISTORY_SIZE mensajes por sala, y no más de
+# HISTORY_TOTAL entre todas. JOIN reenvía los últimos HISTORY_REPLAY y
+# HISTORY pagina hacia atrás de a HISTORY_PAGE.
+HISTORY_SIZE = 200
+HISTORY_TOTAL = 20000
+HISTORY_REPLAY = 20
+HISTORY_PAGE = 50
+
 # ----------------- ESTADO GLOBAL -----------------
 salas = {}       # {"sala1": {"usuarios": set(["Dani", "Ana"])}, ...}
 clientes = {}    # {conn: {"nombre": "Dani", "sala": "sala1"}}
-lock = threading.Lock()  # Para sincronizar acceso a salas/clientes
+miembros = {}    # {"sala1": set([conn, ...])}  índice para el broadcast por sala
+por_nombre = {}  # {"Dani": conn}  índice para los mensajes privados
+salidas = {}     # {conn: {"cola": Queue, "hilo": escritor, "cortada": bool}}
+historial = {}   # {"sala1": deque([(seq, "[sala1] Dani: hola"), ...])}
+ultimo_seq = 0   # seq del último mensaje guardado (global, creciente)
+# Reentrante: JOIN y CREATE llaman a broadcast con el lock tomado
+lock = threading.RLock()  # Para sincronizar acceso a salas/clientes/índices
+journal = []     # eventos pendientes de volcar, como líneas JSON
+journal_lock = threading.Lock()
+# Modo multiproceso (servidor_multi.py): recibe cada evento local (create, join,
+# leave, hello, bye, msg, priv) para reenviarlo a los demás workers. None = un proceso.
+publicar = None
 
 
 # ----------------- PERSISTENCIA -----------------
 def cargar_salas():
-    """Carga las salas desde un archivo JSON si existe"""
-    global salas
+    """Carga el último snapshot (si existe) y le aplica los eventos del journal"""
+    global salas, miembros
     if os.path.exists(STATE_FILE):
         with open(STATE_FILE, "r") as f:
             salas = json.load(f)
@@ -33,28 +74,251 @@ def cargar_salas():
     else:
         salas = {"general": {"usuarios": set()}}  # Sala por defecto
 
+    if os.path.exists(JOURNAL_FILE):
+        with open(JOURNAL_FILE, "r") as f:
+            for linea in f:
+                try:
+                    aplicar_evento(json.loads(linea))
+                except ValueError:
+                    break  # última línea a medio escribir
+    miembros = {sala: set() for sala in salas}
+
+
+def aplicar_evento(evento):
+    """Aplica un evento del journal a 'salas' (reaplicarlo no cambia el resultado)"""
+    sala = salas.setdefault(evento["sala"], {"usuarios": set()})
+    if evento["op"] == "join":
+        sala["usuarios"].add(evento["nombre"])
+    elif evento["op"] == "leave":
+        sala["usuarios"].discard(evento["nombre"])
+
+
+def registrar_evento(op, sala, nombre=None):
+    """Agrega un evento ("create", "join", "leave") al journal; se llama con el lock tomado"""
+    evento = {"op": op, "sala": sala}
+    if nombre is not None:
+        evento["nombre"] = nombre
+    if publicar is not None:
+        publicar(evento)  # en modo multiproceso persiste el proceso principal
+        return
+    with journal_lock:
+        journal.append(json.dumps(evento) + "\n")
+
+
+def volcar_journal():
+    """Escribe los eventos pendientes al final del journal y hace fsync"""
+    with journal_lock:
+        if not journal:
+            return
+        lineas = "".join(journal)
+        journal.clear()
+    with open(JOURNAL_FILE, "a") as f:
+        f.write(lineas)
+        f.flush()
+        os.fsync(f.fileno())
+
 
 def guardar_salas():
-    """Guarda las salas y usuarios en un archivo JSON"""
+    """Escribe un snapshot compacto de las salas y vacía el journal"""
     with lock:
         data = {k: {"usuarios": list(v["usuarios"])} for k, v in salas.items()}
-        with open(STATE_FILE, "w") as f:
-            json.dump(data, f, indent=2)
+        with journal_lock:
+            journal.clear()  # ya están reflejados en el snapshot
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, STATE_FILE)
+    # Si se cae justo aquí, el journal viejo se reaplica sobre el snapshot sin efecto
+    open(JOURNAL_FILE, "w").close()
+
+
+def persistencia():
+    """Hilo de persistencia: único que escribe el journal y los snapshots"""
+    ultimo_snapshot = time.monotonic()
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            volcar_journal()
+            if time.monotonic() - ultimo_snapshot >= SNAPSHOT_INTERVAL:
+                guardar_salas()
+                ultimo_snapshot = time.monotonic()
+        except OSError as e:
+            print(f"Error guardando salas: {e}")
 
 
 # ----------------- FUNCIONES AUXILIARES -----------------
 def enviar(conn, msg):
-    """Envía un mensaje con salto de línea"""
-    conn.sendall((msg + "\n").encode())
+    """Encola un mensaje con salto de línea para el hilo escritor de 'conn'"""
+    enviar_datos(conn, (msg + "\n").encode())
+
+
+def enviar_datos(conn, data):
+    """Como enviar, con el mensaje ya codificado (el broadcast comparte los bytes)"""
+    salida = salidas.get(conn)
+    if salida is None:
+        # Conexión sin escritor propio: se envía directo
+        conn.sendall(data)
+    elif not salida["cortada"]:
+        encolar(conn, salida, data)
+
+
+def cortar(conn, salida):
+    """Cierra la conexión de un cliente que no lee; su hilo lector hace la limpieza"""
+    salida["cortada"] = True
+    try:
+        conn.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def leer_lineas(conn):
+    """
+    Genera los comandos de 'conn', uno por línea terminada en \\n, sin importar
+    cómo TCP agrupe o corte los envíos. Las líneas de más de MAX_LINE bytes se
+    descartan completas y se avisa al cliente.
+    """
+    buf = bytearray()
+    descartando = False
+    while True:
+        data = conn.recv(BUFFER)
+        if not data:
+            return
+        buf += data
+        while (fin := buf.find(b"\n")) >= 0:
+            linea = bytes(buf[:fin])
+            del buf[:fin + 1]
+            if descartando:
+                descartando = False
+            elif fin > MAX_LINE:
+                enviar(conn, "ERR: Línea demasiado larga.")
+            else:
+                yield linea.rstrip(b"\r").decode("utf-8", errors="replace")
+        if len(buf) > MAX_LINE:
+            if not descartando:
+                enviar(conn, "ERR: Línea demasiado larga.")
+            descartando = True
+            buf.clear()
+
+
+def encolar(conn, salida, data, politica=None):
+    """Agrega 'data' a la cola sin bloquear, aplicando OVERFLOW_POLICY si está llena"""
+    politica = politica or OVERFLOW_POLICY
+    cola = salida["cola"]
+    while True:
+        try:
+            cola.put_nowait(data)
+            return
+        except queue.Full:
+            if politica == "disconnect":
+                print(f"Cliente lento desconectado: {conn.getpeername()}")
+                cortar(conn, salida)
+                return
+            try:
+                cola.get_nowait()
+            except queue.Empty:
+                pass
+
+
+def escritor(conn, cola):
+    """
+    Hilo escritor: vacía la cola de salida de 'conn' (None la termina). Junta
+    lo ya encolado más lo que llegue dentro de BATCH_WINDOW en un solo sendall.
+    """
+    try:
+        fin = False
+        while not fin:
+            partes = [cola.get()]
+            limite = time.monotonic() + BATCH_WINDOW
+            while partes[-1] is not None:
+                espera = limite - time.monotonic()
+                try:
+                    partes.append(cola.get(timeout=espera) if espera > 0 else cola.get_nowait())
+                except queue.Empty:
+                    break
+            if partes[-1] is None:
+                partes.pop()
+                fin = True
+            if partes:
+                conn.sendall(b"".join(partes))
+    except OSError:
+        pass
+
+
+def abrir_salida(conn):
+    """Crea la cola de salida de 'conn' y arranca su hilo escritor"""
+    cola = queue.Queue(OUTBOX_SIZE)
+    hilo = threading.Thread(target=escritor, args=(conn, cola), daemon=True)
+    salidas[conn] = {"cola": cola, "hilo": hilo, "cortada": False}
+    hilo.start()
+
+
+def cerrar_salida(conn, timeout=1.0):
+    """Termina el escritor de 'conn' dándole 'timeout' segundos para vaciar la cola"""
+    salida = salidas.pop(conn, None)
+    if salida is None:
+        return
+    encolar(conn, salida, None, politica="drop_oldest")
+    salida["hilo"].join(timeout)
+    if salida["hilo"].is_alive():
+        # Sigue bloqueado en sendall: cortar la conexión para liberarlo
+        cortar(conn, salida)
+
+
+def registrar(conn, nombre):
+    """Da de alta un cliente y lo deja en la sala 'general'"""
+    with lock:
+        clientes[conn] = {"nombre": nombre, "sala": None}
+        if por_nombre.setdefault(nombre, conn) is conn and publicar is not None:
+            publicar({"op": "hello", "nombre": nombre})
+        mover(conn, "general")
 
 
-def broadcast(sala, remitente, mensaje):
-    """Envía un mensaje a todos los usuarios de una sala"""
+def mover(conn, sala):
+    """Cambia de sala a un cliente manteniendo salas y miembros sincronizados"""
+    with lock:
+        info = clientes[conn]
+        old = info["sala"]
+        if old is not None:
+            salas[old]["usuarios"].discard(info["nombre"])
+            miembros[old].discard(conn)
+            registrar_evento("leave", old, info["nombre"])
+        info["sala"] = sala
+        salas[sala]["usuarios"].add(info["nombre"])
+        miembros.setdefault(sala, set()).add(conn)
+        registrar_evento("join", sala, info["nombre"])
+
+
+def desregistrar(conn):
+    """Quita a un cliente de su sala y de los índices. Retorna False si no estaba"""
     with lock:
-        for c, info in clientes.items():
-            if info["sala"] == sala and c != remitente:
+        info = clientes.pop(conn, None)
+        if info is None:
+            return False
+        salas[info["sala"]]["usuarios"].discard(info["nombre"])
+        miembros[info["sala"]].discard(conn)
+        registrar_evento("leave", info["sala"], info["nombre"])
+        if por_nombre.get(info["nombre"]) is conn:
+            del por_nombre[info["nombre"]]
+            if publicar is not None:
+                publicar({"op": "bye", "nombre": info["nombre"]})
+        return True
+
+
+def broadcast(sala, remitente, mensaje, guardar=False):
+    """Envía un mensaje a todos los usuarios de una sala (guardar=True lo agrega al historial)"""
+    with lock:
+        texto = f"[{sala}] {clientes[remitente]['nombre']}: {mensaje}"
+        if guardar:
+            agregar_historial(sala, texto)
+        if publicar is not None:
+            publicar({"op": "msg", "sala": sala, "texto": texto, "guardar": guardar})
+        data = (texto + "\n").encode()  # una sola codificación para toda la sala
+        for c in miembros.get(sala, ()):
+            if c != remitente:
                 try:
-                    enviar(c, f"[{info['sala']}] {clientes[remitente]['nombre']}: {mensaje}")
+                    enviar_datos(c, data)
                 except:
                     pass
 
@@ -62,32 +326,72 @@ def broadcast(sala, remitente, mensaje):
 def privado(destinatario, remitente, mensaje):
     """Envía un mensaje privado a un usuario"""
     with lock:
-        for c, info in clientes.items():
-            if info["nombre"] == destinatario:
-                enviar(c, f"[PRIVADO de {clientes[remitente]['nombre']}] {mensaje}")
-                return True
-    return False
+        c = por_nombre.get(destinatario)
+        texto = f"[PRIVADO de {clientes[remitente]['nombre']}] {mensaje}"
+        if c is None:
+            # En modo multiproceso el destinatario puede estar en otro worker
+            return publicar is not None and publicar({"op": "priv", "nombre": destinatario, "texto": texto})
+        enviar(c, texto)
+        return True
+
+
+# ----------------- HISTORIAL -----------------
+def limite_historial():
+    """Mensajes por sala: HISTORY_SIZE, o menos para que todas juntas no pasen de HISTORY_TOTAL"""
+    return max(1, min(HISTORY_SIZE, HISTORY_TOTAL // max(1, len(salas))))
+
+
+def agregar_historial(sala, texto):
+    """Guarda un mensaje en el historial de la sala descartando los más viejos"""
+    global ultimo_seq
+    with lock:
+        ultimo_seq += 1
+        mensajes = historial.setdefault(sala, deque())
+        mensajes.append((ultimo_seq, texto))
+        limite = limite_historial()
+        while len(mensajes) > limite:
+            mensajes.popleft()
+
+
+def recortar_historial():
+    """Aplica a todas las salas el límite actual (baja cuando se crean salas)"""
+    with lock:
+        limite = limite_historial()
+        for mensajes in historial.values():
+            while len(mensajes) > limite:
+                mensajes.popleft()
+
+
+def enviar_historial(conn, sala, antes=None, n=None):
+    """Envía en un solo mensaje los últimos n (HISTORY_PAGE) mensajes de la sala con seq menor que 'antes'"""
+    n = n or HISTORY_PAGE
+    with lock:
+        previos = [m for m in historial.get(sala, ()) if antes is None or m[0] < antes]
+    if not previos:
+        enviar(conn, f"Sin mensajes anteriores en {sala}.")
+        return
+    pagina = previos[-n:]
+    lineas = [f"Historial de {sala}:"] + [f"#{seq} {texto}" for seq, texto in pagina]
+    if len(previos) > n:
+        lineas.append(f"(más antiguos: HISTORY {pagina[0][0]})")
+    enviar(conn, "\n".join(lineas))
 
 
 # ----------------- HILO POR CLIENTE -----------------
 def manejar_cliente(conn, addr):
+    abrir_salida(conn)
     try:
         enviar(conn, "Bienvenido al chat. Ingresa tu nombre de usuario:")
-        nombre = conn.recv(BUFFER).decode().strip()
+        lineas = leer_lineas(conn)
+        nombre = next(lineas, "").strip()
 
-        with lock:
-            clientes[conn] = {"nombre": nombre, "sala": "general"}
-            salas["general"]["usuarios"].add(nombre)
+        registrar(conn, nombre)
 
         enviar(conn, f"Hola {nombre}! Te uniste a la sala 'general'.")
         broadcast("general", conn, f"⚡ {nombre} se ha unido a la sala.")
 
-        while True:
-            data = conn.recv(BUFFER)
-            if not data:
-                break
-
-            msg = data.decode().strip()
+        for msg in lineas:
+            msg = msg.strip()
             if not msg:
                 continue
 
@@ -100,8 +404,10 @@ def manejar_cliente(conn, addr):
                 with lock:
                     if sala not in salas:
                         salas[sala] = {"usuarios": set()}
+                        miembros[sala] = set()
+                        registrar_evento("create", sala)
+                        recortar_historial()
                         enviar(conn, f"Sala '{sala}' creada.")
-                        guardar_salas()
                     else:
                         enviar(conn, "ERR: Sala ya existe.")
 
@@ -111,20 +417,14 @@ def manejar_cliente(conn, addr):
                     if sala not in salas:
                         enviar(conn, "ERR: Sala no existe.")
                     else:
-                        old = clientes[conn]["sala"]
-                        salas[old]["usuarios"].discard(nombre)
-                        clientes[conn]["sala"] = sala
-                        salas[sala]["usuarios"].add(nombre)
+                        mover(conn, sala)
                         enviar(conn, f"Te uniste a la sala '{sala}'.")
+                        if historial.get(sala):
+                            enviar_historial(conn, sala, n=HISTORY_REPLAY)
                         broadcast(sala, conn, f"⚡ {nombre} entró en la sala.")
-                        guardar_salas()
 
             elif comando == "LEAVE":
-                with lock:
-                    sala = clientes[conn]["sala"]
-                    salas[sala]["usuarios"].discard(nombre)
-                    clientes[conn]["sala"] = "general"
-                    salas["general"]["usuarios"].add(nombre)
+                mover(conn, "general")
                 enviar(conn, "Volviste a la sala 'general'.")
 
             elif comando == "LIST":
@@ -139,6 +439,14 @@ def manejar_cliente(conn, addr):
                     usuarios = ", ".join(salas[sala]["usuarios"])
                     enviar(conn, f"Usuarios en {sala}: {usuarios}")
 
+            elif comando == "HISTORY":
+                try:
+                    antes = int(parts[1]) if len(parts) > 1 else None
+                except ValueError:
+                    enviar(conn, "ERR: Uso: HISTORY [seq]")
+                else:
+                    enviar_historial(conn, clientes[conn]["sala"], antes)
+
             elif comando == "MSG" and len(parts) > 2:
                 destinatario, texto = parts[1], parts[2]
                 if not privado(destinatario, conn, texto):
@@ -151,25 +459,21 @@ def manejar_cliente(conn, addr):
             else:
                 # Mensaje normal → broadcast en sala actual
                 sala = clientes[conn]["sala"]
-                broadcast(sala, conn, msg)
+                broadcast(sala, conn, msg, guardar=True)
 
     except Exception as e:
         print(f"Error con {addr}: {e}")
     finally:
         # Cleanup al salir
-        with lock:
-            if conn in clientes:
-                sala = clientes[conn]["sala"]
-                nombre = clientes[conn]["nombre"]
-                salas[sala]["usuarios"].discard(nombre)
-                del clientes[conn]
-                guardar_salas()
+        desregistrar(conn)
+        cerrar_salida(conn)
         conn.close()
 
 
 # ----------------- MAIN -----------------
 def main():
     cargar_salas()
+    threading.Thread(target=persistencia, daemon=True).start()
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.bind((HOST, PORT))
         s.listen()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Servidor de chat multiproceso.
+WORKERS procesos aceptan conexiones en el mismo puerto con SO_REUSEPORT (el
+kernel reparte los clientes) y cada uno los atiende con servidor.manejar_cliente.
+El proceso principal hace de broker pub/sub por un socket Unix: los avisos de
+una sala solo van a los workers que tienen miembros en ella, los mensajes que
+van al historial llegan a todos (así cualquier worker puede reenviarlo en un
+JOIN), CREATE/JOIN/LEAVE se propagan a todos y el estado se persiste con el
+journal de servidor.py.
+
+Uso:
+    python problema6/servidor_multi.py [workers]
+"""
+
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import sys
+import tempfile
+import threading
+
+import servidor
+
+WORKERS = os.cpu_count() or 1
+LOTE = 256  # eventos como máximo por sendall en el canal con el broker
+
+# ----------------- ESTADO DEL WORKER -----------------
+remotos = {}                  # {"Dani": n}  usuarios conectados en otros workers
+salida_broker = queue.Queue()  # eventos locales pendientes de enviar al broker
+
+# ----------------- ESTADO DEL BROKER -----------------
+canales = {}     # {sock del worker: cola de salida}
+subs = {}        # {"sala1": {sock del worker: miembros en ese worker}}
+nombres = {}     # {"Dani": sock del worker}
+broker_lock = threading.Lock()
+
+
+# ----------------- CANAL WORKER <-> BROKER -----------------
+def canal_escritor(sock, cola):
+    """Vacía 'cola' hacia 'sock' juntando hasta LOTE eventos por envío"""
+    try:
+        while True:
+            partes = [cola.get()]
+            while len(partes) < LOTE:
+                try:
+                    partes.append(cola.get_nowait())
+                except queue.Empty:
+                    break
+            sock.sendall(b"".join(partes))
+    except OSError:
+        pass
+
+
+# ----------------- WORKER -----------------
+def publicar(evento):
+    """servidor.publicar en un worker: encola el evento para el broker"""
+    if evento["op"] == "priv" and not remotos.get(evento["nombre"]):
+        return False
+    salida_broker.put((json.dumps(evento) + "\n").encode())
+    return True
+
+
+def aplicar_remoto(evento):
+    """Aplica en este worker un evento que se originó en otro"""
+    op = evento["op"]
+    with servidor.lock:
+        if op == "create":
+            servidor.salas.setdefault(evento["sala"], {"usuarios": set()})
+            servidor.miembros.setdefault(evento["sala"], set())
+            servidor.recortar_historial()
+        elif op in ("join", "leave"):
+            servidor.aplicar_evento(evento)
+        elif op == "hello":
+            remotos[evento["nombre"]] = remotos.get(evento["nombre"], 0) + 1
+        elif op == "bye":
+            if remotos.get(evento["nombre"], 0) > 1:
+                remotos[evento["nombre"]] -= 1
+            else:
+                remotos.pop(evento["nombre"], None)
+        elif op == "msg":
+            if evento["guardar"]:
+                servidor.agregar_historial(evento["sala"], evento["texto"])
+            data = (evento["texto"] + "\n").encode()
+            for c in servidor.miembros.get(evento["sala"], ()):
+                try:
+                    servidor.enviar_datos(c, data)
+                except:
+                    pass
+        elif op == "priv":
+            c = servidor.por_nombre.get(evento["nombre"])
+            if c is not None:
+                servidor.enviar(c, evento["texto"])
+
+
+def escuchar_broker(sock):
+    """Recibe los eventos del broker; si el broker se cae, el worker termina"""
+    try:
+        for linea in sock.makefile("rb"):
+            aplicar_remoto(json.loads(linea))
+    finally:
+        os._exit(0)
+
+
+def worker(ruta):
+    """Proceso worker: acepta clientes en el puerto compartido y habla con el broker"""
+    broker = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    broker.connect(ruta)
+    servidor.publicar = publicar
+    threading.Thread(target=canal_escritor, args=(broker, salida_broker), daemon=True).start()
+    threading.Thread(target=escuchar_broker, args=(broker,), daemon=True).start()
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        s.bind((servidor.HOST, servidor.PORT))
+        s.listen()
+        try:
+            while True:
+                conn, addr = s.accept()
+                threading.Thread(target=servidor.manejar_cliente, args=(conn, addr), daemon=True).start()
+        except KeyboardInterrupt:
+            pass
+
+
+# ----------------- BROKER -----------------
+def rutear(origen, evento, linea):
+    """Actualiza el estado del broker y reenvía el evento a los workers que lo necesitan"""
+    op = evento["op"]
+    with broker_lock:
+        if op == "msg" and evento["guardar"]:
+            # Todos guardan el historial de todas las salas, tengan o no miembros en ella
+            destinos = [c for c in canales if c is not origen]
+        elif op == "msg":
+            destinos = [c for c, n in subs.get(evento["sala"], {}).items() if n and c is not origen]
+        elif op == "priv":
+            c = nombres.get(evento["nombre"])
+            destinos = [c] if c is not None and c is not origen else []
+        else:
+            destinos = [c for c in canales if c is not origen]
+            if op in ("join", "leave"):
+                cuenta = subs.setdefault(evento["sala"], {})
+                cuenta[origen] = cuenta.get(origen, 0) + (1 if op == "join" else -1)
+            elif op == "hello":
+                nombres.setdefault(evento["nombre"], origen)
+            elif op == "bye" and nombres.get(evento["nombre"]) is origen:
+                del nombres[evento["nombre"]]
+        colas = [canales[c] for c in destinos]
+
+    if op in ("create", "join", "leave"):
+        with servidor.lock:
+            servidor.aplicar_evento(evento)
+            servidor.registrar_evento(op, evento["sala"], evento.get("nombre"))
+    for cola in colas:
+        cola.put(linea)
+
+
+def atender_worker(sock):
+    """Hilo del broker por worker: lee sus eventos y los rutea"""
+    cola = queue.Queue()
+    with broker_lock:
+        canales[sock] = cola
+    threading.Thread(target=canal_escritor, args=(sock, cola), daemon=True).start()
+    try:
+        for linea in sock.makefile("rb"):
+            rutear(sock, json.loads(linea), linea)
+    except OSError:
+        pass  # el worker terminó
+    finally:
+        with broker_lock:
+            del canales[sock]
+            for cuenta in subs.values():
+                cuenta.pop(sock, None)
+        sock.close()
+
+
+# ----------------- MAIN -----------------
+def run_multi(n=WORKERS):
+    """Arranca el broker y n workers sobre servidor.HOST:servidor.PORT"""
+    servidor.cargar_salas()
+    ruta = os.path.join(tempfile.gettempdir(), f"chat-{os.getpid()}.sock")
+    broker = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    broker.bind(ruta)
+    broker.listen()
+
+    # Los workers se crean antes que cualquier hilo del broker para que el
+    # fork no copie locks tomados
+    ctx = multiprocessing.get_context("fork")
+    procesos = [ctx.Process(target=worker, args=(ruta,), daemon=True) for _ in range(n)]
+    for p in procesos:
+        p.start()
+
+    threading.Thread(target=servidor.persistencia, daemon=True).start()
+    # SIGTERM también pasa por el finally (borra el socket Unix)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Servidor escuchando en {servidor.HOST}:{servidor.PORT} con {n} workers")
+    try:
+        for _ in range(n):
+            sock, _ = broker.accept()
+            threading.Thread(target=atender_worker, args=(sock,), daemon=True).start()
+        for p in procesos:
+            p.join()
+    except KeyboardInterrupt:
+        print("Servidor detenido")
+    finally:
+        broker.close()
+        os.remove(ruta)
+
+
+if __name__ == "__main__":
+    run_multi(int(sys.argv[1]) if len(sys.argv) > 1 else WORKERS)
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Benchmarks del proxy HTTP (problema7).
+Levanta un origen HTTP/1.1 local con keep-alive y el proxy en el mismo
+proceso, y mide peticiones reales a través del proxy. 'tunnel' corre el
+proxy y un servidor de eco en procesos aparte para medir su memoria.
+
+Uso:
+    python problema7/benchmark.py pool [--requests 2000] [--size 1024] [--concurrency 4] [--chunked]
+    python problema7/benchmark.py cache [--requests 2000] [--urls 50] [--size 16384] [--max-age 60]
+    python problema7/benchmark.py log [--records 200000] [--threads 4]
+    python problema7/benchmark.py tunnel [--tunnels 1000] [--active 8] [--mb 64]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import resource
+import socket
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import proxy
+
+
+# -------------------- UTILIDADES --------------------
+
+class Origen(BaseHTTPRequestHandler):
+    """
+    Origen de prueba: responde GET /<n>[/<lo que sea>] con n bytes, con
+    Content-Length o chunked (?chunked). Con 'cache_control' agrega ese header
+    y un ETag, y contesta 304 a If-None-Match.
+    """
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # Sin Nagle, como un servidor real: si no, la escritura del cuerpo tras la
+    # cabecera espera el ACK retardado del proxy (~40 ms) en cada respuesta
+    disable_nagle_algorithm = True
+    conexiones = 0
+    peticiones = 0
+    cache_control = None
+
+    def setup(self):
+        super().setup()
+        Origen.conexiones += 1
+
+    def do_GET(self):
+        Origen.peticiones += 1
+        ruta, _, query = self.path.partition("?")
+        if self.cache_control is not None:
+            etag = f'"{ruta}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", self.cache_control)
+                self.end_headers()
+                return
+        body = b"x" * int(ruta.strip("/").split("/")[0] or 0)
+        self.send_response(200)
+        if self.cache_control is not None:
+            self.send_header("Cache-Control", self.cache_control)
+            self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/octet-stream")
+        if query == "chunked":
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(0, len(body), 8192):
+                parte = body[i:i + 8192]
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(parte), parte))
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def free_port():
+    """Devuelve un puerto TCP libre."""
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def levantar():
+    """Arranca el origen y el proxy en hilos; devuelve el puerto del origen."""
+    origen = ThreadingHTTPServer(("localhost", 0), Origen)
+    origen.daemon_threads = True
+    threading.Thread(target=origen.serve_forever, daemon=True).start()
+    proxy.PORT = free_port()
+    threading.Thread(target=proxy.main, daemon=True).start()
+    for _ in range(100):
+        try:
+            socket.create_connection((proxy.HOST, proxy.PORT)).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return origen.server_address[1]
+
+
+def pedir(url):
+    """Una petición GET por el proxy; devuelve los bytes de la respuesta completa."""
+    with socket.create_connection((proxy.HOST, proxy.PORT)) as s:
+        s.sendall(f"GET {url} HTTP/1.1\r\nHost: {url.split('/')[2]}\r\n\r\n".encode())
+        partes = []
+        while True:
+            data = s.recv(65536)
+            if not data:
+                return b"".join(partes)
+            partes.append(data)
+
+
+def carga(urls, total, concurrencia):
+    """
+    Hace 'total' peticiones repartidas en 'concurrencia' hilos, cada uno
+    recorriendo 'urls' en orden desde un punto distinto; devuelve (segundos, latencias ms).
+    """
+    latencias = []
+    errores = []
+
+    def trabajador(n, inicio):
+        for i in range(n):
+            t = time.perf_counter()
+            respuesta = pedir(urls[(inicio + i) % len(urls)])
+            latencias.append((time.perf_counter() - t) * 1000)
+            if not respuesta.startswith(b"HTTP/1.1 200"):
+                errores.append(respuesta[:60])
+
+    hilos = [threading.Thread(target=trabajador, args=(total // concurrencia, i * len(urls) // concurrencia))
+             for i in range(concurrencia)]
+    t0 = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    if errores:
+        raise RuntimeError(f"{len(errores)} respuestas inesperadas, p. ej. {errores[0]!r}")
+    return time.perf_counter() - t0, sorted(latencias)
+
+
+# -------------------- POOL --------------------
+
+def bench_pool(args):
+    """
+    Peticiones por segundo, latencia y conexiones abiertas al origen sin pool
+    (POOL_MAX = 0, un handshake por petición) y con el pool de keep-alive.
+    """
+    port = levantar()
+    url = f"http://localhost:{port}/{args.size}" + ("?chunked" if args.chunked else "")
+    print(f"{args.requests} GET de {args.size} bytes ({'chunked' if args.chunked else 'Content-Length'}), "
+          f"{args.concurrency} clientes concurrentes")
+    print("  modo        req/s    p50 ms   p99 ms   conexiones al origen")
+    for modo, pool_max in (("sin pool", 0), ("con pool", args.pool_max)):
+        proxy.POOL_MAX = pool_max
+        proxy.pool.clear()
+        Origen.conexiones = 0
+        segundos, latencias = carga([url], args.requests, args.concurrency)
+        p50 = latencias[len(latencias) // 2]
+        p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+        print(f"  {modo:9s} {len(latencias) / segundos:8.0f} {p50:9.2f} {p99:8.2f} {Origen.conexiones:12d}")
+
+
+# -------------------- CACHÉ --------------------
+
+def bench_cache(args):
+    """
+    GET repetidos sobre un conjunto de URLs cacheables, sin caché
+    (CACHE_MAX_BYTES = 0) y con ella: req/s, peticiones que llegan al origen y
+    qué parte de los bytes sale de la caché. Con --max-age 0 cada petición se
+    revalida (304 del origen, el cuerpo sale de la caché).
+    """
+    port = levantar()
+    Origen.cache_control = f"max-age={args.max_age}"
+    urls = [f"http://localhost:{port}/{args.size}/{i}" for i in range(args.urls)]
+    print(f"{args.requests} GET sobre {args.urls} URLs de {args.size} bytes, Cache-Control: {Origen.cache_control}")
+    print("  modo          req/s    p50 ms   al origen   hits   revalid.   bytes de caché")
+    for modo, limite in (("sin caché", 0), ("con caché", args.cache_bytes)):
+        proxy.CACHE_MAX_BYTES = limite
+        proxy.cache.clear()
+        proxy.cache_memoria = proxy.cache_disco = 0
+        for nombre in proxy.cache_stats:
+            proxy.cache_stats[nombre] = 0
+        Origen.peticiones = 0
+        segundos, latencias = carga(urls, args.requests, args.concurrency)
+        stats = proxy.estadisticas_cache()
+        servidos = stats["bytes_cache"] + stats["bytes_origen"]
+        parte = stats["bytes_cache"] / servidos * 100 if servidos else 0.0
+        print(f"  {modo:10s} {len(latencias) / segundos:8.0f} {latencias[len(latencias) // 2]:9.2f} "
+              f"{Origen.peticiones:11d} {stats['hits']:6d} {stats['revalidaciones']:10d} {parte:15.1f}%")
+
+
+# -------------------- LOG --------------------
+
+def log_sincronico(msg):
+    """El log() anterior: print y abrir/escribir/cerrar proxy.log en cada llamada."""
+    line = f"[LOG] {msg}"
+    print(line)
+    with open("proxy.log", "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def medir_log(llamar, total, hilos):
+    """Segundos que tardan 'hilos' hilos en hacer 'total' llamadas a llamar(i)."""
+    def trabajador(inicio):
+        for i in range(inicio, total, hilos):
+            llamar(i)
+
+    ts = [threading.Thread(target=trabajador, args=(i,)) for i in range(hilos)]
+    t0 = time.perf_counter()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return time.perf_counter() - t0
+
+
+def bench_log(args):
+    """
+    Costo de un registro por trozo de respuesta (lo que hace el camino HTTP):
+    el log síncrono anterior contra el asíncrono con distintos niveles y
+    muestreo. 'llamadas' es el tiempo de los hilos que loguean; 'total' suma
+    el vaciado de la cola por el hilo escritor.
+    """
+    trozo = b"<html><body>" + b"x" * 100
+    modos = [
+        ("síncrono", None, None),
+        ("async DEBUG", "DEBUG", 1.0),
+        ("async DEBUG 10%", "DEBUG", 0.1),
+        ("async INFO", "INFO", 1.0),
+    ]
+    proxy.LOG_MAX_BYTES = 1 << 40  # sin rotar: se cuentan las líneas escritas
+    proxy.LOG_CONSOLE = True       # como el anterior, que también imprimía
+    proxy.LOG_QUEUE = args.records
+    print(f"{args.records} registros desde {args.threads} hilos (consola a /dev/null)")
+    print("  modo              llamadas/s   llamadas s   total s   líneas escritas")
+    for modo, nivel, muestreo in modos:
+        if os.path.exists("proxy.log"):
+            os.remove("proxy.log")
+        with open(os.devnull, "w") as nulo, redirect_stdout(nulo):
+            if nivel is None:
+                llamar = lambda i: log_sincronico(f"Respuesta de origen:80 → {trozo[:100].decode(errors='ignore')}")
+            else:
+                proxy.LOG_LEVEL, proxy.LOG_SAMPLE = nivel, muestreo
+                proxy.log_cola = queue.Queue(proxy.LOG_QUEUE)
+                proxy.log_hilo = None
+                llamar = lambda i: proxy.log("Respuesta de origen:80", nivel="DEBUG", datos=trozo[:100])
+            t0 = time.perf_counter()
+            segundos = medir_log(llamar, args.records, args.threads)
+            if nivel is not None:
+                proxy.cerrar_log(timeout=600)
+            total = time.perf_counter() - t0
+        lineas = 0
+        if os.path.exists("proxy.log"):
+            with open("proxy.log", encoding="utf-8") as f:
+                lineas = sum(1 for _ in f)
+        print(f"  {modo:16s} {args.records / segundos:12.0f} {segundos:12.2f} {total:9.2f} {lineas:17d}")
+
+
+# -------------------- TÚNELES --------------------
+
+def subir_limite_fds():
+    """Sube el límite de descriptores abiertos al máximo permitido (miles de sockets)."""
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def esperar_puerto(port):
+    """Espera a que algo acepte conexiones en el puerto."""
+    for _ in range(100):
+        try:
+            socket.create_connection(("localhost", port)).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Nada escucha en el puerto {port}")
+
+
+def proceso_proxy(port, modo, splice):
+    """Proceso hijo: el proxy con el modo de túneles pedido."""
+    subir_limite_fds()
+    proxy.PORT = port
+    proxy.TUNNEL_MODE = modo
+    proxy.TUNNEL_SPLICE = splice
+    proxy.main()
+
+
+def proceso_eco(port):
+    """Proceso hijo: servidor de eco con asyncio (miles de conexiones en un hilo)."""
+    async def eco(reader, writer):
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        writer.close()
+
+    async def servir():
+        server = await asyncio.start_server(eco, "localhost", port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+    subir_limite_fds()
+    asyncio.run(servir())
+
+
+def estado_proceso(pid):
+    """RSS en MB e hilos de un proceso, leídos de /proc (Linux)."""
+    stats = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            stats[key] = value.split()
+    return int(stats["VmRSS"][0]) / 1024, int(stats["Threads"][0])
+
+
+def abrir_tunel(proxy_port, eco_port):
+    """CONNECT por el proxy hasta el servidor de eco; devuelve el socket del túnel."""
+    s = socket.create_connection(("localhost", proxy_port))
+    s.sendall(f"CONNECT localhost:{eco_port} HTTP/1.1\r\nHost: localhost:{eco_port}\r\n\r\n".encode())
+    respuesta = b""
+    while b"\r\n\r\n" not in respuesta:
+        data = s.recv(1024)
+        if not data:
+            raise ConnectionError("El proxy cerró el túnel")
+        respuesta += data
+    if not respuesta.startswith(b"HTTP/1.1 200"):
+        raise ConnectionError(respuesta.split(b"\r\n")[0].decode())
+    return s
+
+
+def transferir(sock, total, bloque):
+    """Manda 'total' bytes por un túnel de eco, de a 'bloque', y lee cada vuelta."""
+    data = b"x" * bloque
+    vuelta = bytearray(bloque)
+    vista = memoryview(vuelta)
+    for _ in range(total // bloque):
+        sock.sendall(data)
+        recibido = 0
+        while recibido < bloque:
+            n = sock.recv_into(vista[recibido:])
+            if not n:
+                raise ConnectionError("Túnel cerrado en medio de la transferencia")
+            recibido += n
+
+
+def bench_tunnel(args):
+    """
+    Memoria e hilos del proxy con --tunnels túneles CONNECT abiertos y
+    throughput con --active de ellos transfiriendo a la vez (cada byte cruza
+    el proxy de ida y de vuelta), para los hilos por túnel, el relay con
+    selectors y el relay con splice (si el sistema lo tiene).
+    """
+    subir_limite_fds()
+    ctx = multiprocessing.get_context("fork")
+    modos = [("threads", False), ("relay", False)]
+    if hasattr(os, "splice"):
+        modos.append(("relay", True))
+    por_tunel = args.mb * 1024 * 1024 // args.active
+    print(f"{args.tunnels} túneles abiertos, {args.active} activos con {por_tunel // 1024} KB de eco cada uno")
+    print("  modo             RSS MB   KB/túnel   hilos      MB/s")
+    for modo, splice in modos:
+        port, eco_port = free_port(), free_port()
+        eco = ctx.Process(target=proceso_eco, args=(eco_port,))
+        prx = ctx.Process(target=proceso_proxy, args=(port, modo, splice))
+        eco.start()
+        prx.start()
+        tuneles = []
+        try:
+            esperar_puerto(eco_port)
+            esperar_puerto(port)
+            base, _ = estado_proceso(prx.pid)
+            tuneles = [abrir_tunel(port, eco_port) for _ in range(args.tunnels)]
+            time.sleep(0.5)
+            rss, hilos = estado_proceso(prx.pid)
+
+            trabajos = [threading.Thread(target=transferir, args=(t, por_tunel, args.block))
+                        for t in tuneles[:args.active]]
+            t0 = time.perf_counter()
+            for t in trabajos:
+                t.start()
+            for t in trabajos:
+                t.join()
+            segundos = time.perf_counter() - t0
+        finally:
+            for t in tuneles:
+                t.close()
+            prx.terminate()
+            eco.terminate()
+            prx.join()
+            eco.join()
+        nombre = modo + (" + splice" if splice else "")
+        mbps = por_tunel * len(trabajos) / segundos / 2**20
+        print(f"  {nombre:15s} {rss:8.1f} {(rss - base) * 1024 / args.tunnels:10.1f} {hilos:7d} {mbps:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("pool", help="conexiones nuevas al origen vs pool de keep-alive")
+    p.add_argument("--requests", type=int, default=2000)
+    p.add_argument("--size", type=int, default=1024, help="bytes del cuerpo de cada respuesta")
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--pool-max", type=int, default=proxy.POOL_MAX)
+    p.add_argument("--chunked", action="store_true", help="el origen responde con Transfer-Encoding chunked")
+    p.set_defaults(func=bench_pool)
+
+    p = sub.add_parser("cache", help="peticiones al origen y bytes servidos sin caché y con caché")
+    p.add_argument("--requests", type=int, default=2000)
+    p.add_argument("--urls", type=int, default=50, help="URLs distintas que se recorren en orden")
+    p.add_argument("--size", type=int, default=16384, help="bytes del cuerpo de cada respuesta")
+    p.add_argument("--max-age", type=int, default=60, help="max-age del origen (0 = revalidar siempre)")
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--cache-bytes", type=int, default=proxy.CACHE_MAX_BYTES)
+    p.set_defaults(func=bench_cache)
+
+    p = sub.add_parser("log", help="log síncrono por llamada vs escritor en lote con niveles y muestreo")
+    p.add_argument("--records", type=int, default=200000)
+    p.add_argument("--threads", type=int, default=4)
+    p.set_defaults(func=bench_log)
+
+    p = sub.add_parser("tunnel", help="memoria, hilos y throughput de túneles CONNECT: hilos vs relay")
+    p.add_argument("--tunnels", type=int, default=1000, help="túneles abiertos a la vez")
+    p.add_argument("--active", type=int, default=8, help="túneles que transfieren durante la medición")
+    p.add_argument("--mb", type=int, default=64, help="MB de eco en total entre los activos")
+    p.add_argument("--block", type=int, default=65536, help="bytes por envío")
+    p.set_defaults(func=bench_tunnel)
+
+    args = parser.parse_args()
+    proxy.LOG_CONSOLE = False  # los logs del proxy ensucian las tablas
+    # proxy.log se escribe en un directorio temporal, no en el del usuario
+    with tempfile.TemporaryDirectory() as base_dir:
+        os.chdir(base_dir)
+        args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,21 +4,187 @@ Proxy HTTP (soporta HTTP y HTTPS).
 Intercepta peticiones del cliente y las reenvía al servidor destino.
 """
 
+import atexit
+import json
+import os
+import queue
+import random
+import selectors
 import socket
+import sys
+import tempfile
 import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
 
 HOST = "localhost"
 PORT = 9400
 BUFFER = 4096
+MAX_HEADER = 64 * 1024  # bytes máximos de la cabecera de una petición o respuesta
+MAX_BODY = 16 * 1024 * 1024  # bytes máximos del cuerpo de una petición (si no, 413)
+
+# Pool de conexiones persistentes al origen: hasta POOL_MAX conexiones ociosas
+# por (host, puerto), descartadas tras POOL_IDLE segundos sin uso. 0 = sin pool.
+POOL_MAX = 8
+POOL_IDLE = 30
+
+# Headers hop-by-hop: valen para un solo tramo y no se reenvían. Transfer-Encoding
+# también lo es, pero el cuerpo chunked se reenvía tal cual, así que se conserva.
+HOP_BY_HOP = {"connection", "keep-alive", "proxy-connection", "proxy-authenticate",
+              "proxy-authorization", "te", "trailer", "upgrade"}
+
+# Métodos que se pueden repetir sin efectos extra: si el origen falla después
+# de recibir la petición por una conexión reusada, solo estos se reintentan
+IDEMPOTENTES = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# Caché LRU de respuestas a GET: hasta CACHE_MAX_BYTES de cuerpos en memoria
+# (0 = sin caché) y respuestas de hasta CACHE_MAX_OBJECT bytes. Con CACHE_DIR,
+# los cuerpos de CACHE_DISK_MIN bytes o más se guardan en disco, hasta
+# CACHE_DISK_MAX_BYTES entre todos. Estadísticas: GET /cache-stats al proxy.
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_MAX_OBJECT = 16 * 1024 * 1024
+CACHE_DIR = None
+CACHE_DISK_MIN = 256 * 1024
+CACHE_DISK_MAX_BYTES = 1024 * 1024 * 1024
+# Headers que un 304 puede traer para renovar la copia guardada
+ACTUALIZABLES = {"cache-control", "expires", "date", "etag", "last-modified"}
+
+# Logging asíncrono: log() solo encola el registro y un hilo lo escribe en lotes
+# en LOG_FILE (y en consola si LOG_CONSOLE), rotándolo al pasar LOG_MAX_BYTES
+# (se guardan LOG_BACKUPS archivos viejos: proxy.log.1, proxy.log.2, ...).
+# Se descartan los registros de nivel menor a LOG_LEVEL; de los DEBUG (uno por
+# trozo de respuesta) se guarda solo la fracción LOG_SAMPLE. Si hay más de
+# LOG_QUEUE registros pendientes, los nuevos se descartan y se cuentan.
+LOG_FILE = "proxy.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 3
+LOG_LEVEL = "INFO"
+LOG_SAMPLE = 1.0
+LOG_QUEUE = 10000
+LOG_BATCH = 1000  # registros como máximo por escritura
+LOG_CONSOLE = True
+NIVELES = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+# Túneles CONNECT: con "relay" un solo hilo los atiende a todos con selectors,
+# con un buffer de hasta TUNNEL_BUFFER bytes por sentido; con "threads", dos
+# hilos por túnel. TUNNEL_SPLICE (Linux, os.splice) pasa los bytes de socket a
+# socket por un pipe, sin copiarlos a Python.
+TUNNEL_MODE = "relay"
+TUNNEL_BUFFER = 64 * 1024
+TUNNEL_SPLICE = False
+
+# ----------------- ESTADO GLOBAL -----------------
+pool = {}  # {(host, port): deque([(sock, ociosa_desde), ...])}  la más reciente a la derecha
+pool_lock = threading.Lock()
+cache = OrderedDict()  # {(host, port, ruta): entrada}  de la menos a la más recientemente usada
+cache_memoria = 0      # bytes de cuerpos guardados en memoria
+cache_disco = 0        # bytes de cuerpos guardados en CACHE_DIR
+cache_stats = {"hits": 0, "misses": 0, "revalidaciones": 0, "bytes_cache": 0, "bytes_origen": 0}
+cache_lock = threading.Lock()
+log_cola = queue.Queue(LOG_QUEUE)  # registros (momento, nivel, mensaje, campos); None = terminar
+log_hilo = None                    # hilo escritor, se arranca con el primer registro
+log_descartados = 0                # registros perdidos por cola llena (protegido por log_lock)
+log_lock = threading.Lock()
+relay_sel = None   # selector del hilo relay, se crea con el primer túnel
+relay_aviso = None # extremo del socketpair que despierta al relay
+relay_nuevos = []  # túneles (cliente, servidor) a registrar por el relay
+relay_lock = threading.Lock()
 
 # ----------------- FUNCIONES AUXILIARES -----------------
 
-def log(msg):
-    """Guarda logs en consola y en archivo proxy.log"""
-    line = f"[LOG] {msg}"
-    print(line)
-    with open("proxy.log", "a", encoding="utf-8") as f:
-        f.write(line + "\n")
+def log(msg, nivel="INFO", **campos):
+    """
+    Encola un registro para el hilo escritor (consola y LOG_FILE). Los campos
+    extra se formatean recién al escribir, fuera del camino de la petición.
+    """
+    global log_descartados
+    if NIVELES[nivel] < NIVELES[LOG_LEVEL]:
+        return
+    if nivel == "DEBUG" and LOG_SAMPLE < 1.0 and random.random() >= LOG_SAMPLE:
+        return
+    if log_hilo is None:
+        iniciar_log()
+    try:
+        log_cola.put_nowait((time.time(), nivel, msg, campos))
+    except queue.Full:
+        with log_lock:
+            log_descartados += 1
+
+def iniciar_log():
+    """Arranca el hilo escritor del log (una sola vez)"""
+    global log_hilo
+    with log_lock:
+        if log_hilo is None:
+            log_hilo = threading.Thread(target=escritor_log, daemon=True)
+            log_hilo.start()
+            atexit.register(cerrar_log)
+
+def cerrar_log(timeout=2.0):
+    """Pide al escritor que vacíe la cola y termine (se llama al salir)"""
+    if log_hilo is not None and log_hilo.is_alive():
+        log_cola.put(None)
+        log_hilo.join(timeout)
+
+def formatear_registro(registro):
+    """Una línea de texto por registro: fecha, nivel, mensaje y campos"""
+    momento, nivel, msg, campos = registro
+    fecha = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(momento))
+    linea = f"[LOG] {fecha}.{int(momento % 1 * 1000):03d} {nivel} {msg}"
+    for nombre, valor in campos.items():
+        if isinstance(valor, bytes):
+            valor = valor.decode(errors="ignore")
+        linea += f" {nombre}={valor!r}"
+    return linea + "\n"
+
+def rotar_log():
+    """proxy.log → proxy.log.1 → ... → proxy.log.LOG_BACKUPS (el más viejo se pierde)"""
+    if LOG_BACKUPS <= 0:
+        open(LOG_FILE, "w").close()
+        return
+    for i in range(LOG_BACKUPS - 1, 0, -1):
+        if os.path.exists(f"{LOG_FILE}.{i}"):
+            os.replace(f"{LOG_FILE}.{i}", f"{LOG_FILE}.{i + 1}")
+    os.replace(LOG_FILE, f"{LOG_FILE}.1")
+
+def escritor_log():
+    """
+    Hilo escritor: espera un registro, junta todos los que ya estén en la
+    cola y los escribe con una sola escritura por destino.
+    """
+    global log_descartados
+    f = open(LOG_FILE, "a", encoding="utf-8")
+    try:
+        while True:
+            registros = [log_cola.get()]
+            while len(registros) < LOG_BATCH:
+                try:
+                    registros.append(log_cola.get_nowait())
+                except queue.Empty:
+                    break
+            fin = None in registros
+            lineas = [formatear_registro(r) for r in registros if r is not None]
+            with log_lock:
+                perdidos, log_descartados = log_descartados, 0
+            if perdidos:
+                lineas.append(formatear_registro((time.time(), "WARNING",
+                                                  f"{perdidos} registros descartados (cola llena)", {})))
+            texto = "".join(lineas)
+            if LOG_CONSOLE:
+                sys.stdout.write(texto)
+                sys.stdout.flush()
+            f.write(texto)
+            f.flush()
+            if f.tell() >= LOG_MAX_BYTES:
+                f.close()
+                rotar_log()
+                f = open(LOG_FILE, "a", encoding="utf-8")
+            if fin:
+                return
+    finally:
+        f.close()
 
 def forward(src, dst):  
     """
@@ -38,6 +204,662 @@ def forward(src, dst):
         src.close()
         dst.close()
 
+# ----------------- POOL DE CONEXIONES -----------------
+
+def conexion_viva(sock):
+    """
+    Una conexión ociosa sirve si no tiene nada para leer: si el origen la
+    cerró (EOF) o mandó datos inesperados, se descarta.
+    """
+    try:
+        sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+    return False
+
+def tomar_conexion(host, port):
+    """Devuelve (socket, reusada): una conexión ociosa y viva del pool, o una nueva"""
+    ahora = time.monotonic()
+    with pool_lock:
+        ociosas = pool.get((host, port))
+        while ociosas:
+            sock, desde = ociosas.pop()
+            if ahora - desde < POOL_IDLE and conexion_viva(sock):
+                return sock, True
+            sock.close()
+    return socket.create_connection((host, port)), False
+
+def devolver_conexion(host, port, sock):
+    """Deja una conexión al origen en el pool para la próxima petición (o la cierra si está lleno)"""
+    ahora = time.monotonic()
+    with pool_lock:
+        ociosas = pool.setdefault((host, port), deque())
+        # Las más viejas quedan a la izquierda: se descartan las vencidas
+        while ociosas and ahora - ociosas[0][1] >= POOL_IDLE:
+            ociosas.popleft()[0].close()
+        if len(ociosas) < POOL_MAX:
+            ociosas.append((sock, ahora))
+            return
+    sock.close()
+
+# ----------------- MENSAJES HTTP -----------------
+
+def leer_hasta(sock, buf, separador, limite):
+    """
+    Lee de 'sock' hasta encontrar 'separador' (consumiendo primero 'buf').
+    Devuelve los bytes hasta el separador inclusive y deja el resto en 'buf'.
+    """
+    while True:
+        fin = buf.find(separador)
+        if fin >= 0:
+            fin += len(separador)
+            data = bytes(buf[:fin])
+            del buf[:fin]
+            return data
+        if len(buf) > limite:
+            raise ValueError("Cabecera o línea demasiado grande")
+        data = sock.recv(BUFFER)
+        if not data:
+            raise ConnectionError("Conexión cerrada en medio del mensaje")
+        buf += data
+
+def leer_cabecera(sock, buf):
+    """Lee la cabecera de un mensaje HTTP hasta la línea vacía"""
+    return leer_hasta(sock, buf, b"\r\n\r\n", MAX_HEADER)
+
+def parsear_cabecera(head):
+    """Separa la primera línea y los headers [(nombre, valor), ...] de una cabecera"""
+    lineas = head.decode("iso-8859-1").split("\r\n")
+    headers = []
+    for linea in lineas[1:]:
+        if ":" in linea:
+            nombre, valor = linea.split(":", 1)
+            headers.append((nombre.strip(), valor.strip()))
+    return lineas[0], headers
+
+def armar_cabecera(primera, headers):
+    """Arma la cabecera HTTP a partir de la primera línea y los headers"""
+    lineas = [primera] + [f"{nombre}: {valor}" for nombre, valor in headers]
+    return ("\r\n".join(lineas) + "\r\n\r\n").encode("iso-8859-1")
+
+def responder_error(conn, status, razon):
+    """Responde al cliente un error generado por el propio proxy (sin cuerpo)"""
+    conn.sendall(armar_cabecera(f"HTTP/1.1 {status} {razon}", [("Content-Length", "0"),
+                                                               ("Connection", "close")]))
+
+def header(headers, nombre, defecto=None):
+    """Valor del primer header 'nombre' (sin distinguir mayúsculas)"""
+    nombre = nombre.lower()
+    return next((v for n, v in headers if n.lower() == nombre), defecto)
+
+def sin_hop_by_hop(headers):
+    """Quita los headers hop-by-hop y los que liste el header Connection"""
+    nombrados = {t.strip().lower() for t in (header(headers, "connection") or "").split(",")}
+    return [(n, v) for n, v in headers if n.lower() not in HOP_BY_HOP and n.lower() not in nombrados]
+
+def leer_exacto(sock, buf, n):
+    """Genera exactamente n bytes de cuerpo, primero los que ya estaban en 'buf'"""
+    if buf and n:
+        parte = bytes(buf[:n])
+        del buf[:n]
+        n -= len(parte)
+        yield parte
+    while n > 0:
+        data = sock.recv(min(BUFFER, n))
+        if not data:
+            raise ConnectionError("Conexión cerrada en medio del cuerpo")
+        n -= len(data)
+        yield data
+
+def leer_chunked(sock, buf):
+    """
+    Genera un cuerpo chunked tal como viene (tamaños, datos y trailers) hasta
+    el chunk final, para reenviarlo sin recodificar.
+    """
+    while True:
+        linea = leer_hasta(sock, buf, b"\r\n", MAX_HEADER)
+        yield linea
+        tam = int(linea.split(b";", 1)[0].strip(), 16)
+        if tam == 0:
+            break
+        yield from leer_exacto(sock, buf, tam + 2)  # datos + CRLF
+    # Trailers opcionales hasta la línea vacía
+    while True:
+        linea = leer_hasta(sock, buf, b"\r\n", MAX_HEADER)
+        yield linea
+        if linea == b"\r\n":
+            return
+
+def leer_hasta_cierre(sock, buf):
+    """Genera el cuerpo de una respuesta sin largo: todo hasta que el origen cierre"""
+    if buf:
+        yield bytes(buf)
+        buf.clear()
+    while True:
+        data = sock.recv(BUFFER)
+        if not data:
+            return
+        yield data
+
+def cuerpo(sock, buf, headers, es_respuesta=False):
+    """
+    Devuelve (generador del cuerpo, delimitado). El cuerpo se delimita con
+    Transfer-Encoding chunked o Content-Length; sin ninguno, una petición no
+    tiene cuerpo y una respuesta llega hasta el cierre (delimitado=False).
+    """
+    if "chunked" in (header(headers, "transfer-encoding") or "").lower():
+        return leer_chunked(sock, buf), True
+    largo = header(headers, "content-length")
+    if largo is not None:
+        return leer_exacto(sock, buf, int(largo)), True
+    if es_respuesta:
+        return leer_hasta_cierre(sock, buf), False
+    return iter(()), True
+
+def destino(url, headers):
+    """(host, puerto, ruta) de la petición: de la URL absoluta o del header Host"""
+    partes = urlsplit(url)
+    if partes.hostname:
+        host, port = partes.hostname, partes.port or 80
+    else:
+        host_line = header(headers, "host")
+        if not host_line:
+            return None
+        host, _, port = host_line.partition(":")
+        port = int(port) if port else 80  # HTTP por defecto
+    ruta = partes.path or "/"
+    if partes.query:
+        ruta += "?" + partes.query
+    return host, port, ruta
+
+# ----------------- CACHÉ DE RESPUESTAS -----------------
+
+def entero(valor, defecto=0):
+    """Convierte a int un valor de header, con 'defecto' si no es un número"""
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return defecto
+
+def directivas(valor):
+    """Parsea Cache-Control: "max-age=60, no-cache" → {"max-age": "60", "no-cache": ""}"""
+    resultado = {}
+    for parte in (valor or "").split(","):
+        nombre, _, arg = parte.strip().partition("=")
+        if nombre:
+            resultado[nombre.lower()] = arg.strip('"')
+    return resultado
+
+def vencimiento(rheaders, ahora):
+    """
+    Momento (time.monotonic) hasta el que una respuesta está fresca, según
+    Cache-Control (s-maxage, max-age) o Expires. None si no se puede guardar:
+    no-store, private, o vencida y sin ETag/Last-Modified para revalidarla.
+    """
+    cc = directivas(header(rheaders, "cache-control"))
+    if "no-store" in cc or "private" in cc:
+        return None
+    validable = header(rheaders, "etag") or header(rheaders, "last-modified")
+    expira = ahora
+    if "no-cache" not in cc:
+        edad = entero(header(rheaders, "age"))
+        if "s-maxage" in cc or "max-age" in cc:
+            expira = ahora + entero(cc.get("s-maxage", cc.get("max-age"))) - edad
+        elif header(rheaders, "expires"):
+            # Expires es una fecha absoluta: se mide contra el Date del origen
+            try:
+                limite = parsedate_to_datetime(header(rheaders, "expires"))
+                fecha = parsedate_to_datetime(header(rheaders, "date")) if header(rheaders, "date") \
+                    else datetime.now(timezone.utc)
+                expira = ahora + (limite - fecha).total_seconds() - edad
+            except (TypeError, ValueError):
+                pass  # Expires inválido cuenta como vencido
+    if expira <= ahora and not validable:
+        return None
+    return expira
+
+def buscar_cache(clave, headers):
+    """Entrada guardada para 'clave' (y los headers de Vary de esta petición), o None"""
+    with cache_lock:
+        entrada = cache.get(clave)
+        if entrada is None or any(header(headers, n) != v for n, v in entrada["vary"].items()):
+            return None
+        cache.move_to_end(clave)  # la más recientemente usada queda al final
+        return entrada
+
+def entrada_fresca(entrada, headers):
+    """Si la copia se puede servir sin preguntar al origen (el cliente puede pedir revalidar)"""
+    cc = directivas(header(headers, "cache-control"))
+    if "no-cache" in cc or "no-cache" in (header(headers, "pragma") or ""):
+        return False
+    ahora = time.monotonic()
+    if "max-age" in cc and ahora - entrada["guardada"] + entrada["edad"] > entero(cc["max-age"]):
+        return False
+    return ahora < entrada["expira"]
+
+def responder_desde_cache(conn, entrada, headers):
+    """
+    Responde con la copia guardada, o con 304 si el cliente ya tiene esa
+    versión (If-None-Match). Devuelve False si el cuerpo en disco ya no está.
+    """
+    edad = int(time.monotonic() - entrada["guardada"]) + entrada["edad"]
+    rheaders = [(n, v) for n, v in entrada["headers"] if n.lower() != "age"] + \
+        [("Age", str(edad)), ("Connection", "close")]
+    etags = [t.strip() for t in (header(headers, "if-none-match") or "").split(",")]
+    if entrada["etag"] and (entrada["etag"] in etags or "*" in etags):
+        version = entrada["primera"].split()[0]
+        sin_cuerpo = [(n, v) for n, v in rheaders if n.lower() not in ("content-length", "transfer-encoding")]
+        conn.sendall(armar_cabecera(f"{version} 304 Not Modified", sin_cuerpo))
+        return True
+
+    if entrada["archivo"] is None:
+        conn.sendall(armar_cabecera(entrada["primera"], rheaders) + entrada["cuerpo"])
+    else:
+        try:
+            f = open(entrada["archivo"], "rb")
+        except OSError:
+            return False  # desalojada mientras tanto
+        with f:
+            conn.sendall(armar_cabecera(entrada["primera"], rheaders))
+            conn.sendfile(f)  # sin copiar el cuerpo por espacio de usuario
+    contar(bytes_cache=entrada["largo"])
+    return True
+
+def condicionales(entrada):
+    """Headers para revalidar una entrada vencida con una petición condicional"""
+    pedidos = []
+    if entrada["etag"]:
+        pedidos.append(("If-None-Match", entrada["etag"]))
+    if entrada["last_modified"]:
+        pedidos.append(("If-Modified-Since", entrada["last_modified"]))
+    return pedidos
+
+def guardar_cache(clave, headers, primera, rheaders, body):
+    """
+    Guarda (o reemplaza) una respuesta 200 si se puede cachear; si no (o si
+    body es None), descarta la copia anterior de esa clave.
+    """
+    ahora = time.monotonic()
+    expira = vencimiento(rheaders, ahora) if body is not None else None
+    vary = header(rheaders, "vary") or ""
+    if expira is None or vary.strip() == "*":
+        with cache_lock:
+            quitar_entrada(clave)
+        return
+
+    entrada = {
+        "primera": primera,
+        "headers": sin_hop_by_hop(rheaders),
+        "vary": {n.strip(): header(headers, n.strip()) for n in vary.split(",") if n.strip()},
+        "etag": header(rheaders, "etag"),
+        "last_modified": header(rheaders, "last-modified"),
+        "expira": expira,
+        "guardada": ahora,
+        "edad": entero(header(rheaders, "age")),
+        "largo": len(body),
+        "cuerpo": body,
+        "archivo": None,
+    }
+    # Los cuerpos grandes van al disco (si está configurado) y no ocupan memoria
+    if CACHE_DIR and len(body) >= CACHE_DISK_MIN:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, entrada["archivo"] = tempfile.mkstemp(dir=CACHE_DIR, suffix=".cuerpo")
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        entrada["cuerpo"] = None
+
+    global cache_memoria, cache_disco
+    with cache_lock:
+        quitar_entrada(clave)
+        cache[clave] = entrada
+        if entrada["archivo"] is None:
+            cache_memoria += entrada["largo"]
+        else:
+            cache_disco += entrada["largo"]
+        desalojar()
+
+def revalidar_cache(clave, entrada, rheaders):
+    """Un 304 del origen renueva la entrada: headers de validación y frescura nuevos"""
+    nuevos = {n.lower(): (n, v) for n, v in rheaders if n.lower() in ACTUALIZABLES}
+    headers = [(n, v) for n, v in entrada["headers"] if n.lower() not in nuevos] + list(nuevos.values())
+    ahora = time.monotonic()
+    expira = vencimiento(headers, ahora)
+    renovada = dict(entrada, headers=headers, etag=header(headers, "etag"),
+                    last_modified=header(headers, "last-modified"),
+                    expira=ahora if expira is None else expira, guardada=ahora,
+                    edad=entero(header(rheaders, "age")))
+    with cache_lock:
+        if cache.get(clave) is entrada:
+            if expira is None:
+                quitar_entrada(clave)
+            else:
+                cache[clave] = renovada
+    return renovada
+
+def quitar_entrada(clave):
+    """Saca una entrada de la caché (con cache_lock tomado) y borra su archivo si tiene"""
+    global cache_memoria, cache_disco
+    entrada = cache.pop(clave, None)
+    if entrada is None:
+        return
+    if entrada["archivo"] is None:
+        cache_memoria -= entrada["largo"]
+    else:
+        cache_disco -= entrada["largo"]
+        try:
+            os.remove(entrada["archivo"])
+        except OSError:
+            pass
+
+def desalojar():
+    """Saca las entradas menos usadas hasta volver a los límites de cada nivel (con cache_lock tomado)"""
+    if cache_memoria <= CACHE_MAX_BYTES and cache_disco <= CACHE_DISK_MAX_BYTES:
+        return
+    memoria, disco = cache_memoria, cache_disco
+    victimas = []
+    for clave, entrada in cache.items():  # de la menos a la más recientemente usada
+        if memoria <= CACHE_MAX_BYTES and disco <= CACHE_DISK_MAX_BYTES:
+            break
+        if entrada["archivo"] is None and memoria > CACHE_MAX_BYTES:
+            memoria -= entrada["largo"]
+            victimas.append(clave)
+        elif entrada["archivo"] is not None and disco > CACHE_DISK_MAX_BYTES:
+            disco -= entrada["largo"]
+            victimas.append(clave)
+    for clave in victimas:
+        quitar_entrada(clave)
+
+def contar(**cantidades):
+    """Suma a los contadores de la caché"""
+    with cache_lock:
+        for nombre, cantidad in cantidades.items():
+            cache_stats[nombre] += cantidad
+
+def estadisticas_cache():
+    """Contadores de la caché más su ocupación actual"""
+    with cache_lock:
+        return dict(cache_stats, entradas=len(cache), bytes_memoria=cache_memoria, bytes_disco=cache_disco)
+
+def responder_estadisticas(conn):
+    """Responde GET /cache-stats hecho al propio proxy con los contadores en JSON"""
+    body = json.dumps(estadisticas_cache()).encode()
+    conn.sendall(armar_cabecera("HTTP/1.1 200 OK", [("Content-Type", "application/json"),
+                                                    ("Content-Length", str(len(body))),
+                                                    ("Connection", "close")]) + body)
+
+# ----------------- REENVÍO HTTP -----------------
+
+def pedir_origen(host, port, solicitud, idempotente):
+    """
+    Envía la petición por una conexión del pool y lee la cabecera de la
+    respuesta definitiva. Devuelve (sock, buf, primera línea, headers, status).
+    """
+    for intento in range(2):
+        sock, reusada = tomar_conexion(host, port)
+        enviada = False
+        try:
+            sock.sendall(solicitud)
+            enviada = True
+            buf = bytearray()
+            head = leer_cabecera(sock, buf)
+            break
+        except OSError:
+            sock.close()
+            # Se reintenta una sola vez, con una conexión nueva, si falló una
+            # reusada (el origen la cerró justo antes de usarla) y la petición
+            # no llegó a enviarse o se puede repetir sin efectos extra
+            if intento or not reusada or (enviada and not idempotente):
+                raise
+
+    try:
+        primera, rheaders = parsear_cabecera(head)
+        status = int(primera.split()[1])
+        # Respuestas informativas (100 Continue) antes de la definitiva
+        while 100 <= status < 200:
+            primera, rheaders = parsear_cabecera(leer_cabecera(sock, buf))
+            status = int(primera.split()[1])
+    except BaseException:
+        sock.close()
+        raise
+    return sock, buf, primera, rheaders, status
+
+def liberar_conexion(host, port, sock, buf, primera, rheaders, delimitado):
+    """La conexión vuelve al pool si la respuesta terminó limpia y el origen no pidió cerrar"""
+    conexion = (header(rheaders, "connection") or "").lower()
+    if delimitado and not buf and "close" not in conexion and \
+            (primera.startswith("HTTP/1.1") or "keep-alive" in conexion):
+        devolver_conexion(host, port, sock)
+    else:
+        sock.close()
+
+def reenviar_http(conn, metodo, url, version, headers, body):
+    """
+    Reenvía una petición HTTP al origen por una conexión del pool y devuelve
+    la respuesta al cliente. Los GET cacheables se sirven de la caché mientras
+    estén frescos; vencidos, se revalidan con una petición condicional.
+    """
+    dest = destino(url, headers)
+    if dest is None:
+        log("No se encontró header Host.", nivel="WARNING")
+        return
+    host, port, ruta = dest
+    if ruta == "/cache-stats" and port == PORT and host in (HOST, "localhost", "127.0.0.1"):
+        responder_estadisticas(conn)
+        return
+
+    clave = (host, port, ruta)
+    cc = directivas(header(headers, "cache-control"))
+    usar_cache = metodo == "GET" and CACHE_MAX_BYTES > 0 and "no-store" not in cc and \
+        header(headers, "authorization") is None and header(headers, "range") is None
+    entrada = buscar_cache(clave, headers) if usar_cache else None
+    if entrada is not None and entrada_fresca(entrada, headers):
+        if responder_desde_cache(conn, entrada, headers):
+            contar(hits=1)
+            log(f"Caché: HIT {host}:{port}{ruta}", nivel="DEBUG")
+            return
+        entrada = None
+
+    pedidos = [(n, v) for n, v in sin_hop_by_hop(headers) if n.lower() != "expect"]
+    if entrada is not None:
+        # Las condiciones del cliente las responde la caché; al origen van las de la copia
+        pedidos = [(n, v) for n, v in pedidos if n.lower() not in ("if-none-match", "if-modified-since")]
+        pedidos += condicionales(entrada)
+    solicitud = armar_cabecera(f"{metodo} {ruta} {version}", pedidos + [("Connection", "keep-alive")]) + body
+
+    try:
+        sock, buf, primera, rheaders, status = pedir_origen(host, port, solicitud, metodo in IDEMPOTENTES)
+    except (OSError, ValueError) as e:
+        log(f"Sin respuesta de {host}:{port}: {e}", nivel="ERROR")
+        responder_error(conn, 502, "Bad Gateway")
+        return
+
+    if entrada is not None and status == 304:
+        # La copia sigue valiendo: se renueva y se responde con ella
+        liberar_conexion(host, port, sock, buf, primera, rheaders, True)
+        contar(revalidaciones=1)
+        if not responder_desde_cache(conn, revalidar_cache(clave, entrada, rheaders), headers):
+            log(f"Caché: se perdió el cuerpo de {host}:{port}{ruta}", nivel="WARNING")
+        return
+
+    try:
+        if metodo == "HEAD" or status in (204, 304):
+            datos, delimitado = iter(()), True
+        else:
+            datos, delimitado = cuerpo(sock, buf, rheaders, es_respuesta=True)
+
+        # Con el cliente se usa una petición por conexión
+        conn.sendall(armar_cabecera(primera, sin_hop_by_hop(rheaders) + [("Connection", "close")]))
+        guardar = usar_cache and status == 200
+        partes, total = [], 0
+        origen = f"Respuesta de {host}:{port}"
+        for data in datos:
+            log(origen, nivel="DEBUG", datos=data[:100])
+            conn.sendall(data)
+            total += len(data)
+            if guardar:
+                partes.append(data)
+                if total > CACHE_MAX_OBJECT:
+                    guardar, partes = False, []
+    except BaseException:
+        sock.close()
+        raise
+
+    liberar_conexion(host, port, sock, buf, primera, rheaders, delimitado)
+    contar(bytes_origen=total)
+    if usar_cache and status != 304:
+        contar(misses=1)
+        guardar_cache(clave, headers, primera, rheaders, b"".join(partes) if guardar else None)
+
+# ----------------- TÚNELES CONNECT -----------------
+
+def iniciar_relay():
+    """Crea el selector y el hilo relay que atiende todos los túneles (una sola vez)"""
+    global relay_sel, relay_aviso
+    with relay_lock:
+        if relay_aviso is None:
+            relay_sel = selectors.DefaultSelector()
+            despertador, relay_aviso = socket.socketpair()
+            despertador.setblocking(False)
+            relay_aviso.setblocking(False)
+            relay_sel.register(despertador, selectors.EVENT_READ)
+            threading.Thread(target=bucle_relay, args=(despertador,), daemon=True).start()
+
+def agregar_tunel(cliente, servidor):
+    """Entrega un túnel ya establecido al hilo relay y lo despierta"""
+    if relay_aviso is None:
+        iniciar_relay()
+    cliente.setblocking(False)
+    servidor.setblocking(False)
+    with relay_lock:
+        relay_nuevos.append((cliente, servidor))
+    try:
+        relay_aviso.send(b"\0")
+    except BlockingIOError:
+        pass  # ya hay avisos sin leer: el relay va a tomar este túnel igual
+
+def nuevo_sentido(src, dst):
+    """Estado de un sentido del túnel (src → dst): buffer o pipe, y si src ya cerró"""
+    sentido = {"src": src, "dst": dst, "buf": bytearray(), "pendiente": 0,
+               "eof": False, "fin": False, "pipe": None}
+    if TUNNEL_SPLICE and hasattr(os, "splice"):
+        sentido["pipe"] = os.pipe()
+    return sentido
+
+def leer_sentido(sentido):
+    """Lee de src lo que entre en el buffer (o el pipe) del sentido y trata de pasarlo a dst"""
+    libre = TUNNEL_BUFFER - sentido["pendiente"]
+    try:
+        if sentido["pipe"] is None:
+            data = sentido["src"].recv(libre)
+            sentido["buf"] += data
+            sentido["pendiente"] = len(sentido["buf"])
+            leido = len(data)
+        else:
+            # splice: socket → pipe dentro del kernel, sin pasar por Python
+            leido = os.splice(sentido["src"].fileno(), sentido["pipe"][1], libre,
+                              flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+            sentido["pendiente"] += leido
+    except BlockingIOError:
+        return
+    if not leido:
+        sentido["eof"] = True
+    escribir_sentido(sentido)
+
+def escribir_sentido(sentido):
+    """
+    Pasa a dst lo pendiente del sentido. Cuando src ya cerró y no queda nada,
+    cierra solo la escritura de dst (medio cierre): el otro sentido sigue.
+    """
+    if sentido["pendiente"]:
+        try:
+            if sentido["pipe"] is None:
+                enviado = sentido["dst"].send(sentido["buf"])
+                del sentido["buf"][:enviado]
+            else:
+                enviado = os.splice(sentido["pipe"][0], sentido["dst"].fileno(), sentido["pendiente"],
+                                    flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+            sentido["pendiente"] -= enviado
+        except BlockingIOError:
+            return
+    if sentido["eof"] and not sentido["pendiente"] and not sentido["fin"]:
+        sentido["dst"].shutdown(socket.SHUT_WR)
+        sentido["fin"] = True
+
+def actualizar_tunel(tunel):
+    """
+    Registra en el selector solo lo que cada socket puede hacer: leer si su
+    sentido de salida tiene lugar en el buffer, escribir si el de entrada
+    tiene datos pendientes. Con los dos sentidos terminados, cierra el túnel.
+    """
+    if all(s["fin"] for s in tunel["sentidos"]):
+        cerrar_tunel(tunel)
+        return
+    for sock in tunel["sockets"]:
+        eventos = 0
+        for s in tunel["sentidos"]:
+            if s["src"] is sock and not s["eof"] and s["pendiente"] < TUNNEL_BUFFER:
+                eventos |= selectors.EVENT_READ
+            if s["dst"] is sock and s["pendiente"]:
+                eventos |= selectors.EVENT_WRITE
+        anteriores = tunel["eventos"].get(sock, 0)
+        if eventos == anteriores:
+            continue
+        if not anteriores:
+            relay_sel.register(sock, eventos, tunel)
+        elif not eventos:
+            relay_sel.unregister(sock)
+        else:
+            relay_sel.modify(sock, eventos, tunel)
+        tunel["eventos"][sock] = eventos
+
+def cerrar_tunel(tunel):
+    """Saca el túnel del selector y cierra sus sockets (y pipes)"""
+    tunel["cerrado"] = True
+    for sock, eventos in tunel["eventos"].items():
+        if eventos:
+            relay_sel.unregister(sock)
+    for sock in tunel["sockets"]:
+        sock.close()
+    for s in tunel["sentidos"]:
+        if s["pipe"] is not None:
+            os.close(s["pipe"][0])
+            os.close(s["pipe"][1])
+
+def bucle_relay(despertador):
+    """Hilo relay: un solo bucle de eventos para todos los túneles CONNECT"""
+    while True:
+        for key, mask in relay_sel.select():
+            if key.fileobj is despertador:
+                try:
+                    despertador.recv(BUFFER)
+                except BlockingIOError:
+                    pass
+                with relay_lock:
+                    nuevos = relay_nuevos[:]
+                    relay_nuevos.clear()
+                for cliente, servidor in nuevos:
+                    tunel = {"sockets": (cliente, servidor), "eventos": {}, "cerrado": False,
+                             "sentidos": (nuevo_sentido(cliente, servidor), nuevo_sentido(servidor, cliente))}
+                    actualizar_tunel(tunel)
+                continue
+
+            tunel = key.data
+            if tunel["cerrado"]:
+                continue  # cerrado por un evento anterior de esta misma vuelta
+            try:
+                for sentido in tunel["sentidos"]:
+                    if mask & selectors.EVENT_READ and sentido["src"] is key.fileobj:
+                        leer_sentido(sentido)
+                    if mask & selectors.EVENT_WRITE and sentido["dst"] is key.fileobj:
+                        escribir_sentido(sentido)
+            except OSError:
+                # Conexión reseteada o rota de cualquiera de los dos lados
+                cerrar_tunel(tunel)
+                continue
+            actualizar_tunel(tunel)
+
 # ----------------- HILO POR CLIENTE -----------------
 
 def handle_client(conn, addr):
@@ -64,7 +886,19 @@ def handle_client(conn, addr):
             port = int(port)
 
             # Conectar al destino
-            with socket.create_connection((host, port)) as server_sock:
+            server_sock = socket.create_connection((host, port))
+            if TUNNEL_MODE == "relay":
+                try:
+                    conn.sendall(b"HTTP/1.1 200 Connection Established\r\n\r\n")
+                except BaseException:
+                    server_sock.close()
+                    raise
+                # El túnel queda a cargo del hilo relay: este hilo termina sin cerrar nada
+                agregar_tunel(conn, server_sock)
+                conn = None
+                return
+
+            with server_sock:
                 conn.sendall(b"HTTP/1.1 200 Connection Established\r\n\r\n")
 
                 # Crear hilos para transmitir datos en ambas direcciones
@@ -83,39 +917,37 @@ def handle_client(conn, addr):
                 return
 
             method, url = parts[0], parts[1]
+            version = parts[2] if len(parts) > 2 else "HTTP/1.0"
 
-            # Extraer host de los headers
-            headers = request.decode(errors="ignore").split("\r\n")
-            host_line = next((h for h in headers if h.lower().startswith("host:")), None)
-
-            if not host_line:
-                log("No se encontró header Host.")
-                conn.close()
+            # Cabecera completa y cuerpo entero de la petición (Content-Length o chunked)
+            buf = bytearray(request)
+            _, headers = parsear_cabecera(leer_cabecera(conn, buf))
+            largo = header(headers, "content-length")
+            if largo is not None and int(largo) > MAX_BODY:
+                log(f"Cuerpo de {largo} bytes de {addr}: se rechaza", nivel="WARNING")
+                responder_error(conn, 413, "Payload Too Large")
                 return
+            if "100-continue" in (header(headers, "expect") or "").lower():
+                conn.sendall(b"HTTP/1.1 100 Continue\r\n\r\n")
+            # El cuerpo se junta en memoria (para poder reintentar), hasta MAX_BODY bytes
+            datos, _ = cuerpo(conn, buf, headers)
+            partes, total = [], 0
+            for data in datos:
+                total += len(data)
+                if total > MAX_BODY:
+                    log(f"Cuerpo chunked de más de {MAX_BODY} bytes de {addr}: se rechaza", nivel="WARNING")
+                    responder_error(conn, 413, "Payload Too Large")
+                    return
+                partes.append(data)
+            body = b"".join(partes)
 
-            host = host_line.split(":", 1)[1].strip()
-            if ":" in host:
-                host, port = host.split(":")
-                port = int(port)
-            else:
-                port = 80  # HTTP por defecto
-
-            # Conectar al servidor destino
-            with socket.create_connection((host, port)) as server_sock:
-                server_sock.sendall(request)
-
-                # Reenviar respuesta al cliente y loguear
-                while True:
-                    data = server_sock.recv(BUFFER)
-                    if not data:
-                        break
-                    log(f"Respuesta de {host}:{port} → {data[:100].decode(errors='ignore')}")
-                    conn.sendall(data)
+            reenviar_http(conn, method, url, version, headers, body)
 
     except Exception as e:
-        log(f"Error con {addr}: {e}")
+        log(f"Error con {addr}: {e}", nivel="ERROR")
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
 
 # ----------------- MAIN -----------------
 